@@ -1,11 +1,15 @@
+import os
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from backend.config import Config
+from backend.app.database import RoutingSession, configure_engines, init_database
 
-db = SQLAlchemy()
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 jwt = JWTManager()
 
@@ -14,10 +18,37 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
 
     # Initialize extensions
+    configure_engines(app)
     db.init_app(app)
-    migrate.init_app(app, db)
+    init_database(app, db)
+    from backend.app.serialization import init_json
+    init_json(app)
+    from backend.app.instrumentation import init_instrumentation
+    init_instrumentation(app)
+    migrate.init_app(app, db, directory=MIGRATIONS_DIR)
     jwt.init_app(app)
 
+    from backend.app.cache import init_cache
+    init_cache(app)
+
+    from backend.app.identity import init_identity
+    init_identity(app)
+
+    from backend.app.passwords import init_passwords
+    init_passwords(app)
+
+    from backend.app.jobs import init_jobs
+    init_jobs(app)
+
+    from backend.app.suggest import init_suggest
+    init_suggest(app)
+
+    from backend.app.analytics import init_analytics
+    init_analytics(app)
+
+    from backend.app.badges import init_badges
+    init_badges(app)
+
     # Only enable CORS for non-testing environments
     if not app.config.get('TESTING', False):
         CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True)
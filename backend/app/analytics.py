@@ -0,0 +1,323 @@
+"""Precomputed learning analytics.
+
+Admin dashboards read three tables that the completion path keeps up to
+date in the same transaction as the progress rows, so no report scans
+``user_topic_progress`` or ``user_badge_association``:
+
+* ``analytics_rollups``: counters keyed by ``(metric, scope, scope_id,
+  period, start)``; completions per topic, module, course and site-wide,
+  and distinct active learners site-wide, per day and per month.
+* ``active_learners``: who was active in each day and month, so a learner
+  completing ten topics in a day counts once.
+* ``learner_stats``: completions and badges per user, indexed for the
+  top-N leaderboards.
+
+Completions are counted in day buckets. The ``analytics.compact`` job,
+enqueued by the first activity of each day, merges day buckets older than
+``ANALYTICS_DAILY_DAYS`` into month buckets. Distinct learners can't be
+summed, so their month buckets are counted as activity happens and
+compaction only drops the old days.
+
+Rollups are history: deleting a topic keeps its past completions counted,
+while ``learner_stats`` drops them. ``flask analytics rebuild`` recomputes
+everything from the raw rows, e.g. after progress was edited by hand (the
+migration adding these tables fills them the same way).
+"""
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from sqlalchemy import bindparam, delete, exists, func, insert, literal, or_, select, tuple_, update
+
+from backend.app import db, jobs
+from backend.app.models import (AnalyticsRollup, Course, LearnerStats, Module, Topic, User, active_learners,
+                                user_badge_association, user_topic_progress)
+
+ROLLUP_KEY = ('metric', 'scope', 'scope_id', 'period', 'start')
+SCOPES = {'topic': Topic, 'module': Module, 'course': Course}
+LEADERBOARDS = ('completions', 'badges')
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+
+def _day(completed_at):
+    if completed_at is None:
+        return datetime.now(timezone.utc).date()
+    if completed_at.tzinfo is not None:
+        completed_at = completed_at.astimezone(timezone.utc)
+    return completed_at.date()
+
+
+def _month(day):
+    return day.replace(day=1)
+
+
+def _increment(table, keys, amounts, column='value'):
+    """
+    Add ``{key tuple: amount}`` to the `column` counters of `table`, whose rows are keyed by the `keys` columns.
+
+    Missing rows are created. Three statements whatever the number of
+    counters; returns the keys of the created rows.
+    """
+    amounts = {key: amount for key, amount in amounts.items() if amount}
+    if not amounts:
+        return set()
+    key_columns = [table.c[name] for name in keys]
+    existing = {tuple(row) for row in db.session.execute(
+        select(*key_columns).where(tuple_(*key_columns).in_(list(amounts)))
+    )}
+    if existing:
+        db.session.execute(
+            update(table).where(*(c == bindparam(f'b_{c.name}') for c in key_columns))
+            .values({column: table.c[column] + bindparam('b_amount')}),
+            [{**{f'b_{name}': value for name, value in zip(keys, key)}, 'b_amount': amounts[key]} for key in existing],
+        )
+    created = [key for key in amounts if key not in existing]
+    if created:
+        db.session.execute(insert(table), [{**dict(zip(keys, key)), column: amounts[key]} for key in created])
+    return set(created)
+
+
+def _mark_active(user_id, days):
+    """Record `user_id` as active on `days` and in their months; returns the new site-wide learner counts."""
+    buckets = {('day', day) for day in days} | {('month', _month(day)) for day in days}
+    known = {tuple(row) for row in db.session.execute(
+        select(active_learners.c.period, active_learners.c.start)
+        .where(active_learners.c.user_id == user_id,
+               tuple_(active_learners.c.period, active_learners.c.start).in_(list(buckets)))
+    )}
+    new = sorted(buckets - known)
+    if new:
+        db.session.execute(insert(active_learners), [
+            {'period': period, 'start': start, 'user_id': user_id} for period, start in new
+        ])
+    return {('active_learners', 'site', 0, period, start): 1 for period, start in new}
+
+
+def record_completions(user_id, completions):
+    """
+    Count new completions in the current transaction.
+
+    `completions` lists ``(topic_id, module_id, course_id, completed_at)``
+    for topics `user_id` just completed; a `completed_at` of None is now.
+    """
+    counts = Counter()
+    days = set()
+    for topic_id, module_id, course_id, completed_at in completions:
+        day = _day(completed_at)
+        days.add(day)
+        for scope, scope_id in (('topic', topic_id), ('module', module_id), ('course', course_id), ('site', 0)):
+            counts[('completions', scope, scope_id, 'day', day)] += 1
+    if not counts:
+        return
+    counts.update(_mark_active(user_id, days))
+    created = _increment(AnalyticsRollup.__table__, ROLLUP_KEY, counts)
+    _increment(LearnerStats.__table__, ('user_id',), {(user_id,): len(completions)}, column='completions')
+
+    today = datetime.now(timezone.utc).date()
+    if ('completions', 'site', 0, 'day', today) in created:
+        # First activity of the day: time to fold old days into months
+        jobs.enqueue('analytics.compact')
+
+
+def record_badge(user_id):
+    """Count a badge newly awarded to `user_id` in the current transaction."""
+    _increment(LearnerStats.__table__, ('user_id',), {(user_id,): 1}, column='badges')
+
+
+def topics_removed(topic_ids):
+    """Take the completions of topics about to be deleted off the learners' totals; `topic_ids` is a list or SELECT."""
+    stats = LearnerStats.__table__
+    removed = (
+        select(func.count())
+        .where(user_topic_progress.c.user_id == stats.c.user_id, user_topic_progress.c.topic_id.in_(topic_ids))
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(stats)
+        .where(stats.c.user_id.in_(select(user_topic_progress.c.user_id)
+                                   .where(user_topic_progress.c.topic_id.in_(topic_ids))))
+        .values(completions=stats.c.completions - removed)
+    )
+
+
+def compact(before=None):
+    """
+    Merge completion day buckets that start before `before` into month buckets and drop old learner days.
+
+    `before` defaults to ``ANALYTICS_DAILY_DAYS`` ago. Returns how many days
+    and months were touched.
+    """
+    if before is None:
+        before = datetime.now(timezone.utc).date() - timedelta(days=current_app.config.get('ANALYTICS_DAILY_DAYS', 90))
+    rollups = AnalyticsRollup.__table__
+    days = db.session.execute(
+        select(rollups.c.start).distinct()
+        .where(rollups.c.metric == 'completions', rollups.c.scope == 'site', rollups.c.scope_id == 0,
+               rollups.c.period == 'day', rollups.c.start < before)
+    ).scalars().all()
+
+    by_month = defaultdict(list)
+    for day in days:
+        by_month[_month(day)].append(day)
+    for month, month_days in sorted(by_month.items()):
+        totals = db.session.execute(
+            select(rollups.c.scope, rollups.c.scope_id, func.sum(rollups.c.value))
+            .where(rollups.c.metric == 'completions', rollups.c.period == 'day', rollups.c.start.in_(month_days))
+            .group_by(rollups.c.scope, rollups.c.scope_id)
+        ).all()
+        _increment(rollups, ROLLUP_KEY, {
+            ('completions', scope, scope_id, 'month', month): total for scope, scope_id, total in totals
+        })
+
+    db.session.execute(delete(rollups).where(rollups.c.period == 'day', rollups.c.start < before))
+    db.session.execute(delete(active_learners).where(active_learners.c.period == 'day',
+                                                     active_learners.c.start < before))
+    return {'days': len(days), 'months': len(by_month)}
+
+
+@jobs.handler('analytics.compact')
+def _compact_job(payload):
+    return compact()
+
+
+def rebuild():
+    """Recompute the rollups, active learners and learner totals from the raw progress and badge rows."""
+    rollups = AnalyticsRollup.__table__
+    stats = LearnerStats.__table__
+    progress = user_topic_progress
+    for table in (rollups, active_learners, stats):
+        db.session.execute(delete(table))
+
+    day = func.date(progress.c.completed_at)
+    per_scope = {
+        'topic': (progress.c.topic_id, progress),
+        'module': (Topic.module_id, progress.join(Topic, Topic.id == progress.c.topic_id)),
+        'course': (Module.course_id, progress.join(Topic, Topic.id == progress.c.topic_id)
+                   .join(Module, Module.id == Topic.module_id)),
+        'site': (literal(0), progress),
+    }
+    for scope, (scope_id, source) in per_scope.items():
+        group = [day] if scope == 'site' else [scope_id, day]
+        db.session.execute(insert(rollups).from_select(list(ROLLUP_KEY) + ['value'], (
+            select(literal('completions'), literal(scope), scope_id, literal('day'), day, func.count())
+            .select_from(source).where(progress.c.completed_at.is_not(None)).group_by(*group)
+        )))
+
+    db.session.execute(insert(active_learners).from_select(['period', 'start', 'user_id'], (
+        select(literal('day'), day, progress.c.user_id).distinct().where(progress.c.completed_at.is_not(None))
+    )))
+    days = db.session.execute(select(active_learners.c.start).distinct()).scalars().all()
+    by_month = defaultdict(list)
+    for active_day in days:
+        by_month[_month(active_day)].append(active_day)
+    for month, month_days in by_month.items():
+        db.session.execute(insert(active_learners).from_select(['period', 'start', 'user_id'], (
+            select(literal('month'), literal(month, active_learners.c.start.type), active_learners.c.user_id)
+            .distinct().where(active_learners.c.period == 'day', active_learners.c.start.in_(month_days))
+        )))
+    db.session.execute(insert(rollups).from_select(list(ROLLUP_KEY) + ['value'], (
+        select(literal('active_learners'), literal('site'), literal(0), active_learners.c.period,
+               active_learners.c.start, func.count())
+        .group_by(active_learners.c.period, active_learners.c.start)
+    )))
+
+    completed = select(func.count()).where(progress.c.user_id == User.id).scalar_subquery()
+    awarded = select(func.count()).where(user_badge_association.c.user_id == User.id).scalar_subquery()
+    db.session.execute(insert(stats).from_select(['user_id', 'completions', 'badges'], (
+        select(User.id, completed, awarded).where(or_(
+            exists().where(progress.c.user_id == User.id),
+            exists().where(user_badge_association.c.user_id == User.id),
+        ))
+    )))
+    return compact()
+
+
+def top_items(scope, since=None, until=None, limit=DEFAULT_LIMIT):
+    """The most completed topics, modules or courses in ``[since, until)``; compacted months count whole."""
+    rollups = AnalyticsRollup.__table__
+    model = SCOPES[scope]
+    total = func.sum(rollups.c.value).label('completions')
+    stmt = (
+        select(rollups.c.scope_id, total)
+        .where(rollups.c.metric == 'completions', rollups.c.scope == scope)
+        .group_by(rollups.c.scope_id).order_by(total.desc(), rollups.c.scope_id).limit(limit)
+    )
+    if since is not None:
+        stmt = stmt.where(rollups.c.start >= since)
+    if until is not None:
+        stmt = stmt.where(rollups.c.start < until)
+    ranked = stmt.subquery()
+    rows = db.session.execute(
+        select(ranked.c.scope_id, model.name, ranked.c.completions)
+        .outerjoin(model, model.id == ranked.c.scope_id)
+        .order_by(ranked.c.completions.desc(), ranked.c.scope_id)
+    )
+    # Deleted records keep their history, without a name
+    return [{'id': row.scope_id, 'name': row.name, 'completions': row.completions} for row in rows]
+
+
+def activity(period='day', since=None, until=None):
+    """Site-wide completions and distinct active learners per day or month in ``[since, until)``."""
+    rollups = AnalyticsRollup.__table__
+    stmt = (
+        select(rollups.c.metric, rollups.c.period, rollups.c.start, rollups.c.value)
+        .where(rollups.c.scope == 'site', rollups.c.scope_id == 0)
+        .where(or_(rollups.c.period == period, rollups.c.metric == 'completions'))
+    )
+    if since is not None:
+        stmt = stmt.where(rollups.c.start >= (_month(since) if period == 'month' else since))
+    if until is not None:
+        stmt = stmt.where(rollups.c.start < until)
+
+    series = defaultdict(lambda: {'completions': 0, 'active_learners': 0})
+    for row in db.session.execute(stmt):
+        if period == 'day' and row.period == 'month':
+            continue  # compacted days only have month totals left
+        # Month totals add up the compacted days and the recent day buckets
+        start = _month(row.start) if period == 'month' else row.start
+        series[start][row.metric] += row.value
+    return [{'start': start.isoformat(), **counts} for start, counts in sorted(series.items())]
+
+
+def leaderboard(by='completions', limit=DEFAULT_LIMIT):
+    """The top `limit` learners by completions or badges, read off the ``learner_stats`` index."""
+    stats = LearnerStats.__table__
+    rows = db.session.execute(
+        select(stats.c.user_id, User.username, stats.c.completions, stats.c.badges)
+        .join(User, User.id == stats.c.user_id)
+        .order_by(stats.c[by].desc(), stats.c.user_id.desc()).limit(limit)
+    )
+    return [{'user_id': row.user_id, 'username': row.username, 'completions': row.completions,
+             'badges': row.badges} for row in rows]
+
+
+def parse_day(value):
+    """An ISO 8601 date from a query string, or None when missing; raises ValueError when malformed."""
+    return date.fromisoformat(value) if value else None
+
+
+@click.group('analytics')
+def analytics_cli():
+    """Learning analytics commands."""
+
+
+@analytics_cli.command('rebuild')
+def rebuild_command():
+    """Recompute every rollup from the raw progress and badge rows."""
+    result = rebuild()
+    db.session.commit()
+    click.echo(f"Rebuilt analytics ({result['days']} day(s) compacted into {result['months']} month(s))")
+
+
+@analytics_cli.command('compact')
+def compact_command():
+    """Merge day buckets older than ANALYTICS_DAILY_DAYS into months now."""
+    result = compact()
+    db.session.commit()
+    click.echo(f"Compacted {result['days']} day(s) into {result['months']} month(s)")
+
+
+def init_analytics(app):
+    app.cli.add_command(analytics_cli)
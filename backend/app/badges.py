@@ -0,0 +1,203 @@
+"""Set-based recomputation of "Module Master" badges.
+
+Completing a topic awards its module's badge on the spot (completion.py),
+but adding or deleting topics changes what "every topic in the module"
+means for everyone who already made progress. The ``badges.recompute``
+job, queued by the admin topic routes and imports, brings the badges of
+the affected modules (or of the whole catalog) back in line with the
+``user_module_progress`` counters:
+
+* counters are seeded for users whose completions predate them;
+* the badge goes to every user whose counter reaches the module's
+  ``topic_count`` and is taken from holders whose counter no longer does;
+* the ``learner_stats`` badge totals follow.
+
+Edits made while a recompute is still queued widen that job rather than
+queueing another. Users are processed in id ranges of
+``BADGE_RECOMPUTE_BATCH_SIZE``, each a few grouped INSERT ... SELECT /
+DELETE statements committed on their own,
+so memory use does not grow with the number of users and a crash only
+repeats the current batch (recomputing is idempotent). After each batch
+the running totals are published as the job's progress.
+"""
+import math
+from datetime import datetime, timezone
+
+import click
+from flask import current_app
+from sqlalchemy import delete, exists, func, insert, literal, select, true, update
+
+from backend.app import db, jobs
+from backend.app.completion import module_badge
+from backend.app.models import (Badge, Job, LearnerStats, Module, Topic, User, UserModuleProgress,
+                                user_badge_association, user_topic_progress)
+
+progress_counters = UserModuleProgress.__table__
+
+
+def schedule_recompute(module_ids=None):
+    """
+    Queue a recompute of the given modules' badges (every module for None) in the current transaction.
+
+    A recompute that is still queued is widened to cover them instead, so a
+    burst of topic edits costs one pass over the users rather than one each.
+    """
+    queued = db.session.execute(
+        select(Job).where(Job.kind == 'badges.recompute', Job.status == 'queued').order_by(Job.id).limit(1)
+    ).scalar()
+    if queued is not None:
+        pending = queued.payload.get('module_ids')
+        payload = {} if pending is None or module_ids is None else {'module_ids': sorted({*pending, *module_ids})}
+        # Rewriting the row also waits out a worker claiming it; if one did, queue a new job after all.
+        job_rows = Job.__table__
+        widened = db.session.execute(
+            update(job_rows).where(job_rows.c.id == queued.id, job_rows.c.status == 'queued').values(payload=payload)
+        ).rowcount
+        if widened:
+            db.session.expire(queued)
+            return queued
+    return jobs.enqueue('badges.recompute', {} if module_ids is None else {'module_ids': sorted(set(module_ids))})
+
+
+def _in_scope(column, module_ids):
+    return true() if module_ids is None else column.in_(module_ids)
+
+
+def _earned():
+    """The counter reaches a non-empty module's topic total."""
+    return (Module.topic_count > 0) & (progress_counters.c.completed_count >= Module.topic_count)
+
+
+def _seed_counters(users, module_ids):
+    counted = (
+        select(user_topic_progress.c.user_id, Topic.module_id, func.count())
+        .join(Topic, Topic.id == user_topic_progress.c.topic_id)
+        .where(user_topic_progress.c.user_id.between(*users), _in_scope(Topic.module_id, module_ids),
+               ~exists().where(progress_counters.c.user_id == user_topic_progress.c.user_id,
+                               progress_counters.c.module_id == Topic.module_id))
+        .group_by(user_topic_progress.c.user_id, Topic.module_id)
+    )
+    return db.session.execute(
+        insert(progress_counters).from_select(['user_id', 'module_id', 'completed_count'], counted)
+    ).rowcount
+
+
+def _create_missing_badges(users, module_ids):
+    """Create the badge of every module in scope that a user in range has earned but that has none yet."""
+    modules = db.session.execute(
+        select(Module).where(
+            _in_scope(Module.id, module_ids),
+            ~exists().where(Badge.module_id == Module.id),
+            exists().where(progress_counters.c.module_id == Module.id,
+                           progress_counters.c.user_id.between(*users), _earned()),
+        )
+    ).scalars().all()
+    for module in modules:
+        module_badge(module)
+    return len(modules)
+
+
+def _award(users, module_ids, now):
+    held = exists().where(user_badge_association.c.user_id == progress_counters.c.user_id,
+                          user_badge_association.c.badge_id == Badge.id)
+    earned = (
+        select(progress_counters.c.user_id, Badge.id, literal(now, user_badge_association.c.awarded_at.type))
+        .select_from(progress_counters)
+        .join(Module, Module.id == progress_counters.c.module_id)
+        .join(Badge, Badge.module_id == progress_counters.c.module_id)
+        .where(progress_counters.c.user_id.between(*users), _in_scope(progress_counters.c.module_id, module_ids),
+               _earned(), ~held)
+    )
+    return db.session.execute(
+        insert(user_badge_association).from_select(['user_id', 'badge_id', 'awarded_at'], earned)
+    ).rowcount
+
+
+def _revoke(users, module_ids):
+    still_earned = (
+        select(1).select_from(Badge)
+        .join(progress_counters, progress_counters.c.module_id == Badge.module_id)
+        .join(Module, Module.id == Badge.module_id)
+        .where(Badge.id == user_badge_association.c.badge_id,
+               progress_counters.c.user_id == user_badge_association.c.user_id, _earned())
+    )
+    module_badges = select(Badge.id).where(Badge.module_id.is_not(None), _in_scope(Badge.module_id, module_ids))
+    return db.session.execute(
+        delete(user_badge_association).where(
+            user_badge_association.c.user_id.between(*users),
+            user_badge_association.c.badge_id.in_(module_badges),
+            ~exists(still_earned),
+        )
+    ).rowcount
+
+
+def _refresh_learner_stats(users):
+    stats = LearnerStats.__table__
+    held = select(func.count()).where(user_badge_association.c.user_id == stats.c.user_id).scalar_subquery()
+    db.session.execute(update(stats).where(stats.c.user_id.between(*users)).values(badges=held))
+    completed = select(func.count()).where(user_topic_progress.c.user_id == User.id).scalar_subquery()
+    awarded = select(func.count()).where(user_badge_association.c.user_id == User.id).scalar_subquery()
+    db.session.execute(insert(stats).from_select(['user_id', 'completions', 'badges'], (
+        select(User.id, completed, awarded).where(
+            User.id.between(*users),
+            exists().where(user_badge_association.c.user_id == User.id),
+            ~exists().where(stats.c.user_id == User.id),
+        )
+    )))
+
+
+def recompute(module_ids=None, batch_size=None, progress=None):
+    """
+    Bring the badges of `module_ids` (every module for None) in line with the progress counters.
+
+    Commits after every batch of users, calling `progress` with the running
+    totals first; returns the final totals.
+    """
+    batch_size = batch_size or current_app.config.get('BADGE_RECOMPUTE_BATCH_SIZE', 5000)
+    low, high = db.session.execute(select(func.min(User.id), func.max(User.id))).one()
+    totals = {'module_ids': module_ids, 'batches': 0,
+              'total_batches': 0 if low is None else math.ceil((high - low + 1) / batch_size),
+              'counters_seeded': 0, 'badges_created': 0, 'awarded': 0, 'revoked': 0}
+    now = datetime.now(timezone.utc)
+    for start in range(low or 0, (high or -1) + 1, batch_size):
+        users = (start, start + batch_size - 1)
+        totals['counters_seeded'] += _seed_counters(users, module_ids)
+        totals['badges_created'] += _create_missing_badges(users, module_ids)
+        awarded, revoked = _award(users, module_ids, now), _revoke(users, module_ids)
+        if awarded or revoked:
+            _refresh_learner_stats(users)
+        totals['awarded'] += awarded
+        totals['revoked'] += revoked
+        totals['batches'] += 1
+        if progress is not None:
+            progress(dict(totals))
+        db.session.commit()
+    return totals
+
+
+@jobs.handler('badges.recompute')
+def _recompute_job(payload):
+    return recompute(payload.get('module_ids'), progress=jobs.report_progress)
+
+
+@click.group('badges')
+def badges_cli():
+    """Badge commands."""
+
+
+@badges_cli.command('recompute')
+@click.option('--module', 'module_ids', type=int, multiple=True, help='Only this module; repeat for more. Default: all.')
+@click.option('--batch-size', type=int, default=None, help='Users per batch (BADGE_RECOMPUTE_BATCH_SIZE).')
+def recompute_command(module_ids, batch_size):
+    """Recompute "Module Master" badges now, in this process."""
+    def report(totals):
+        click.echo(f"Batch {totals['batches']}/{totals['total_batches']}: "
+                   f"{totals['awarded']} awarded, {totals['revoked']} revoked")
+
+    totals = recompute(list(module_ids) or None, batch_size=batch_size, progress=report)
+    click.echo(f"Done: {totals['awarded']} badge(s) awarded, {totals['revoked']} revoked, "
+               f"{totals['badges_created']} badge(s) created")
+
+
+def init_badges(app):
+    app.cli.add_command(badges_cli)
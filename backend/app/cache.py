@@ -0,0 +1,254 @@
+"""Server-side cache for serialized read responses.
+
+Views opt in with :func:`cached`, which stores the response body and its
+validators under a logical key such as ``topic:5`` or ``module:3:topics``.
+The admin routes evict exactly the keys a mutation affects through
+:func:`invalidate`, so a hit is served without touching the database.
+
+The backend is pluggable: ``CACHE_BACKEND`` is either one of the built-in
+names below or an ``'module:Class'`` path to any :class:`CacheBackend`.
+Entries in other worker processes expire after ``CACHE_DEFAULT_TTL``.
+"""
+import importlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy import event
+from werkzeug.http import is_resource_modified
+
+from backend.app import db
+
+# `headers` are the REPLAYED_HEADERS the view set; `variant` is the view's `vary()` value when stored.
+CachedResponse = namedtuple('CachedResponse', 'body etag last_modified mimetype headers variant',
+                            defaults=((), None))
+
+# Response headers served again on a hit, e.g. the next-page cursor of a paginated list.
+REPLAYED_HEADERS = ('X-Next-Cursor', 'Link')
+
+# Cache keys that depend on a whole table rather than a single admin route.
+TABLE_KEYS = {
+    'news_articles': ('news',),
+    'events': ('events',),
+}
+
+
+class CacheBackend:
+    """Interface every response cache backend implements."""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+
+def _sizeof(value):
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(_sizeof(v) for v in value)
+    return 64
+
+
+class LRUCache(CacheBackend):
+    """Thread-safe in-process LRU cache with per-entry TTL and entry/byte limits."""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, default_ttl=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expirations': 0}
+
+    def _pop(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= self._clock():
+                self._pop(key)
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        size = _sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            expires_at = self._clock() + ttl if ttl else None
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            self._stats['sets'] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(self._stats, entries=len(self._entries), bytes=self._bytes,
+                        hit_ratio=round(self._stats['hits'] / lookups, 4) if lookups else 0.0)
+
+
+class FakeCache(CacheBackend):
+    """Dictionary-backed cache without expiry that records deletions; meant for tests."""
+
+    def __init__(self, **options):
+        self.data = {}
+        self.deleted = []
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        self.deleted.extend(keys)
+        for key in keys:
+            self.data.pop(key, None)
+
+    def clear(self):
+        self.data.clear()
+
+    def stats(self):
+        return {'entries': len(self.data)}
+
+
+BACKENDS = {
+    'memory': LRUCache,
+    'fake': FakeCache,
+}
+
+
+def init_cache(app):
+    backend = app.config.get('CACHE_BACKEND', 'memory')
+    if backend in BACKENDS:
+        cls = BACKENDS[backend]
+    else:
+        module_name, _, class_name = backend.partition(':')
+        cls = getattr(importlib.import_module(module_name), class_name)
+    app.extensions['response_cache'] = cls(
+        max_entries=app.config.get('CACHE_MAX_ENTRIES', 1024),
+        max_bytes=app.config.get('CACHE_MAX_BYTES', 64 * 1024 * 1024),
+        default_ttl=app.config.get('CACHE_DEFAULT_TTL', 300),
+    )
+
+
+def get_cache():
+    return current_app.extensions['response_cache']
+
+
+def invalidate(*keys):
+    """Evict the given logical keys. Call after the mutation has been committed."""
+    get_cache().delete(*keys)
+
+
+def invalidate_on_commit(*keys):
+    """Evict the given logical keys once the current transaction commits, for code that does not commit itself."""
+    db.session.info.setdefault('evicted_keys', set()).update(keys)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _evict_changed_tables(session):
+    if session.get_nested_transaction() is not None:
+        return  # a savepoint was released; wait for the real commit
+    tables = session.info.pop('changed_tables', set())
+    keys = [key for table in tables for key in TABLE_KEYS.get(table, ())]
+    keys.extend(session.info.pop('evicted_keys', ()))
+    if keys and current_app and 'response_cache' in current_app.extensions:
+        invalidate(*keys)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _keep_evicted_keys(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('evicted_keys', None)
+
+
+def _from_cache(entry):
+    if not is_resource_modified(request.environ, etag=entry.etag, last_modified=entry.last_modified):
+        response = make_response('', 304)
+    else:
+        response = make_response(entry.body)
+        response.mimetype = entry.mimetype
+    if entry.etag:
+        response.set_etag(entry.etag)
+    if entry.last_modified:
+        response.headers['Last-Modified'] = entry.last_modified
+    response.headers.extend(entry.headers)
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+
+def cached(key_template, vary=None):
+    """
+    Caches a view's successful response under ``key_template.format(**view_args)``.
+
+    Only the canonical URL (no query string) is cached, so every entry has
+    exactly one key that the admin routes can evict. `vary`, like
+    :func:`~backend.app.catalog.conditional`'s, returns a value the response
+    also depends on (e.g. today's date); an entry stored under another value
+    is a miss and gets replaced.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.query_string:
+                return fn(*args, **kwargs)
+            key = key_template.format(**kwargs)
+            variant = vary() if vary is not None else None
+            cache = get_cache()
+            entry = cache.get(key)
+            if entry is not None and entry.variant == variant:
+                return _from_cache(entry)
+
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                headers = tuple((name, response.headers[name]) for name in REPLAYED_HEADERS if name in response.headers)
+                cache.set(key, CachedResponse(response.get_data(), response.get_etag()[0],
+                                              response.headers.get('Last-Modified'), response.mimetype,
+                                              headers, variant))
+                response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
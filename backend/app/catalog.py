@@ -0,0 +1,115 @@
+"""Catalog version tracking and conditional GET support.
+
+Every ORM flush that touches a catalog table bumps that table's row in
+``catalog_versions``; Core statements call :func:`touch` instead. Read
+endpoints wrapped in :func:`conditional` build a strong ETag from the
+versions they depend on, so a matching ``If-None-Match`` is answered with
+304 after a single primary-key lookup and without running the view.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request
+from sqlalchemy import event, select, update
+from werkzeug.http import is_resource_modified
+
+from backend.app import db
+from backend.app.models import catalog_versions
+
+CATALOG_TABLES = frozenset({'courses', 'modules', 'topics', 'resources', 'news_articles', 'events'})
+
+
+def _bump(session_or_connection, tables):
+    now = datetime.now(timezone.utc)
+    result = session_or_connection.execute(
+        update(catalog_versions)
+        .where(catalog_versions.c.name.in_(tables))
+        .values(version=catalog_versions.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == len(tables):
+        return
+    existing = set(session_or_connection.execute(
+        select(catalog_versions.c.name).where(catalog_versions.c.name.in_(tables))
+    ).scalars())
+    session_or_connection.execute(catalog_versions.insert(), [
+        {'name': name, 'version': 1, 'updated_at': now} for name in tables if name not in existing
+    ])
+
+
+def _record(session, session_or_connection, tables):
+    tables = sorted(set(tables))
+    if tables:
+        _bump(session_or_connection, tables)
+        # Consumed after commit, e.g. by the response cache.
+        session.info.setdefault('changed_tables', set()).update(tables)
+
+
+def touch(*tables):
+    """Mark catalog tables as changed; call this after Core statements that bypass the ORM."""
+    _record(db.session, db.session, tables)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _bump_changed_tables(session, flush_context, instances):
+    tables = {
+        getattr(obj, '__tablename__', None)
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if obj in session.new or obj in session.deleted or session.is_modified(obj)
+    }
+    _record(session, session.connection(), tables & CATALOG_TABLES)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_changed_tables(session, previous_transaction):
+    # Only the outermost rollback discards the changes; savepoints do not.
+    if previous_transaction.parent is None:
+        session.info.pop('changed_tables', None)
+
+
+def current_versions(tables):
+    """Return ``{table: (version, updated_at)}`` for the given tables."""
+    rows = db.session.execute(
+        select(catalog_versions.c.name, catalog_versions.c.version, catalog_versions.c.updated_at)
+        .where(catalog_versions.c.name.in_(tables))
+    )
+    versions = {name: (0, None) for name in tables}
+    versions.update({row.name: (row.version, row.updated_at) for row in rows})
+    return versions
+
+
+def make_etag(key, versions):
+    parts = [key] + [f'{name}:{versions[name][0]}' for name in sorted(versions)]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def conditional(*tables, vary=None):
+    """
+    Decorates a read view whose response depends only on the given catalog tables.
+
+    Adds ETag and Last-Modified headers to successful responses and answers
+    matching If-None-Match / If-Modified-Since requests with 304. `vary` is
+    an optional callable returning whatever else the response depends on
+    (e.g. the current date); it is mixed into the ETag.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            versions = current_versions(tables)
+            key = request.full_path if vary is None else f'{request.full_path}|{vary()}'
+            etag = make_etag(key, versions)
+            stamps = [updated_at for _, updated_at in versions.values() if updated_at]
+            last_modified = max(stamps) if stamps else None
+
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,258 @@
+"""Topic completion bookkeeping.
+
+Completing a topic inserts a ``user_topic_progress`` row and bumps the
+matching ``user_module_progress`` counter in the same transaction, so
+deciding whether a module badge is earned is a single comparison against
+``Module.topic_count`` instead of a scan over the user's completions.
+"""
+from collections import Counter
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func, select, update
+
+from backend.app import analytics, db
+from backend.app.models import (Badge, Course, Module, Topic, UserModuleProgress,
+                                user_badge_association, user_topic_progress)
+
+
+def is_completed(user_id, topic_id):
+    return db.session.execute(
+        select(user_topic_progress.c.topic_id)
+        .where(user_topic_progress.c.user_id == user_id, user_topic_progress.c.topic_id == topic_id)
+    ).first() is not None
+
+
+def module_badge(module):
+    """Return the "Module Master" badge for a module, creating it if needed."""
+    badge = Badge.query.filter_by(module_id=module.id).first()
+    if badge is None:
+        badge_name = f"Module Master - {module.name}"
+        # Badges created before module_id existed are matched by name.
+        badge = Badge.query.filter_by(name=badge_name, module_id=None).first()
+        if badge is None:
+            badge = Badge(name=badge_name, description=f"Completed all topics in the {module.name} module.", icon="🏆")
+            db.session.add(badge)
+        badge.module_id = module.id
+        db.session.flush()
+    return badge
+
+
+def award_badge(user_id, badge):
+    """Give a badge to a user. Returns False if they already had it."""
+    has_badge = db.session.execute(
+        select(user_badge_association.c.badge_id)
+        .where(user_badge_association.c.user_id == user_id, user_badge_association.c.badge_id == badge.id)
+    ).first()
+    if has_badge:
+        return False
+    db.session.execute(user_badge_association.insert().values(user_id=user_id, badge_id=badge.id))
+    analytics.record_badge(user_id)
+    return True
+
+
+def _bump_module_progress(user_id, module_id, amount):
+    """Add `amount` to a user's completed count for a module and return the new count."""
+    updated = db.session.execute(
+        update(UserModuleProgress)
+        .where(UserModuleProgress.user_id == user_id, UserModuleProgress.module_id == module_id)
+        .values(completed_count=UserModuleProgress.completed_count + amount)
+        .returning(UserModuleProgress.completed_count)
+    ).scalar()
+    if updated is not None:
+        return updated
+
+    # First completion we track for this user and module: seed the counter
+    # from existing completions (this also covers rows that predate it).
+    count = db.session.execute(
+        select(func.count())
+        .select_from(user_topic_progress.join(Topic, Topic.id == user_topic_progress.c.topic_id))
+        .where(user_topic_progress.c.user_id == user_id, Topic.module_id == module_id)
+    ).scalar()
+    db.session.add(UserModuleProgress(user_id=user_id, module_id=module_id, completed_count=count))
+    return count
+
+
+def check_and_award_badge(user_id, module, completed_count):
+    """Awards the module's badge if every topic in it is complete. Returns the badge or None."""
+    if not module.topic_count or completed_count < module.topic_count:
+        return None
+    badge = module_badge(module)
+    return badge if award_badge(user_id, badge) else None
+
+
+def complete_topic(user_id, topic):
+    """
+    Records that a user completed a topic.
+
+    Returns ``(created, badge)`` where `badge` is the badge newly earned by
+    this completion, if any.
+    """
+    if is_completed(user_id, topic.id):
+        return False, None
+    db.session.execute(user_topic_progress.insert().values(user_id=user_id, topic_id=topic.id))
+    analytics.record_completions(user_id, [(topic.id, topic.module_id, topic.module.course_id, None)])
+    completed_count = _bump_module_progress(user_id, topic.module_id, 1)
+    return True, check_and_award_badge(user_id, topic.module, completed_count)
+
+
+def complete_topics(user_id, completions):
+    """
+    Records many completions for one user with set-based statements.
+
+    `completions` maps topic id to a client-supplied completion time (or
+    None for now). Returns ``(created_ids, existing_ids, unknown_ids, badges)``
+    where `badges` lists every badge newly earned; each affected module is
+    checked once.
+    """
+    requested = list(completions)
+    modules_by_topic = dict(db.session.execute(
+        select(Topic.id, Topic.module_id).where(Topic.id.in_(requested))
+    ).all())
+    existing = set(db.session.execute(
+        select(user_topic_progress.c.topic_id)
+        .where(user_topic_progress.c.user_id == user_id, user_topic_progress.c.topic_id.in_(modules_by_topic))
+    ).scalars())
+    created = [topic_id for topic_id in requested if topic_id in modules_by_topic and topic_id not in existing]
+    unknown = [topic_id for topic_id in requested if topic_id not in modules_by_topic]
+    if not created:
+        return [], sorted(existing), unknown, []
+
+    now = datetime.now(timezone.utc)
+    db.session.execute(user_topic_progress.insert(), [
+        {'user_id': user_id, 'topic_id': topic_id, 'completed_at': completions[topic_id] or now}
+        for topic_id in created
+    ])
+
+    per_module = Counter(modules_by_topic[topic_id] for topic_id in created)
+    modules = {m.id: m for m in Module.query.filter(Module.id.in_(per_module))}
+    analytics.record_completions(user_id, [
+        (topic_id, modules_by_topic[topic_id], modules[modules_by_topic[topic_id]].course_id,
+         completions[topic_id] or now)
+        for topic_id in created
+    ])
+    badges = []
+    for module_id, count in sorted(per_module.items()):
+        completed_count = _bump_module_progress(user_id, module_id, count)
+        badge = check_and_award_badge(user_id, modules[module_id], completed_count)
+        if badge:
+            badges.append(badge)
+    return created, sorted(existing), unknown, badges
+
+
+def topic_added(module):
+    """Keeps the module total in step with a newly created topic."""
+    module.topic_count = Module.topic_count + 1
+
+
+def topics_removed(topic_ids):
+    """
+    Keeps totals and per-user counters in step with topics about to be deleted.
+
+    `topic_ids` is a list or a SELECT of ids; each table is updated with a single statement.
+    """
+    completed_in_module = (
+        select(func.count())
+        .select_from(user_topic_progress.join(Topic, Topic.id == user_topic_progress.c.topic_id))
+        .where(user_topic_progress.c.user_id == UserModuleProgress.user_id,
+               Topic.module_id == UserModuleProgress.module_id, Topic.id.in_(topic_ids))
+        .scalar_subquery()
+    )
+    modules = select(Topic.module_id).where(Topic.id.in_(topic_ids))
+    db.session.execute(
+        update(UserModuleProgress)
+        .where(UserModuleProgress.module_id.in_(modules))
+        .values(completed_count=UserModuleProgress.completed_count - completed_in_module)
+        .execution_options(synchronize_session=False)
+    )
+    topics_in_module = (
+        select(func.count()).where(Topic.module_id == Module.id, Topic.id.in_(topic_ids)).scalar_subquery()
+    )
+    db.session.execute(
+        update(Module).where(Module.id.in_(modules))
+        .values(topic_count=Module.topic_count - topics_in_module)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def modules_removed(module_ids):
+    """Drops counters for modules about to be deleted; their badges stay with their holders."""
+    db.session.execute(delete(UserModuleProgress).where(UserModuleProgress.module_id.in_(module_ids)))
+    db.session.execute(update(Badge).where(Badge.module_id.in_(module_ids)).values(module_id=None))
+
+
+def _percent(completed, total):
+    return func.coalesce(func.round(100.0 * completed / func.nullif(total, 0), 1), 0.0)
+
+
+def _completed_by(level, user_ids):
+    """Grouped completion counts per user and module (or course) for the given users."""
+    group = Topic.module_id if level == 'module' else Module.course_id
+    stmt = (
+        select(user_topic_progress.c.user_id, group.label('group_id'), func.count().label('completed'))
+        .select_from(user_topic_progress)
+        .join(Topic, Topic.id == user_topic_progress.c.topic_id)
+    )
+    if level == 'course':
+        stmt = stmt.join(Module, Module.id == Topic.module_id)
+    if user_ids is not None:
+        stmt = stmt.where(user_topic_progress.c.user_id.in_(user_ids))
+    return stmt.group_by(user_topic_progress.c.user_id, group).subquery()
+
+
+def _totals(level):
+    """Topic totals per module (or course), read from the ``Module.topic_count`` counters."""
+    if level == 'module':
+        return select(Module.id.label('group_id'), Module.name, Module.course_id,
+                      Module.topic_count.label('total')).subquery()
+    return (select(Course.id.label('group_id'), Course.name,
+                   func.coalesce(func.sum(Module.topic_count), 0).label('total'))
+            .outerjoin(Module, Module.course_id == Course.id)
+            .group_by(Course.id).subquery())
+
+
+def _summary_row(row, level):
+    item = {'id': row.group_id, 'name': row.name, 'completed': row.completed,
+            'total': row.total, 'percent': row.percent}
+    if level == 'module':
+        item['course_id'] = row.course_id
+    return item
+
+
+def progress_summary(user_id):
+    """Completion counts and percentages for every course and module, for one user."""
+    summary = {}
+    for level in ('course', 'module'):
+        totals = _totals(level)
+        done = _completed_by(level, [user_id])
+        completed = func.coalesce(done.c.completed, 0)
+        rows = db.session.execute(
+            select(totals, completed.label('completed'), _percent(completed, totals.c.total).label('percent'))
+            .outerjoin(done, done.c.group_id == totals.c.group_id)
+            .order_by(totals.c.group_id)
+        )
+        summary[f'{level}s'] = [_summary_row(row, level) for row in rows]
+    return summary
+
+
+def cohort_progress_summary(user_ids=None):
+    """
+    Per-user completion counts for many users at once.
+
+    Only courses and modules a user has made progress in are listed, keyed
+    by user id; `user_ids` of None covers everyone, so callers serving
+    requests pass a page of ids.
+    """
+    summary = {}
+    for level in ('course', 'module'):
+        totals = _totals(level)
+        done = _completed_by(level, user_ids)
+        rows = db.session.execute(
+            select(done.c.user_id, totals, done.c.completed,
+                   _percent(done.c.completed, totals.c.total).label('percent'))
+            .join(totals, totals.c.group_id == done.c.group_id)
+            .order_by(done.c.user_id, totals.c.group_id)
+        )
+        for row in rows:
+            user = summary.setdefault(row.user_id, {'user_id': row.user_id, 'courses': [], 'modules': []})
+            user[f'{level}s'].append(_summary_row(row, level))
+    return summary
@@ -0,0 +1,158 @@
+"""Engine profiles and read-replica routing.
+
+``DATABASE_PROFILE`` names an entry of :data:`backend.config.ENGINE_PROFILES`:
+its ``pragmas`` are run on every new SQLite connection and the remaining
+keys become SQLAlchemy engine options (``SQLALCHEMY_ENGINE_OPTIONS`` still
+wins key by key). SQLite connections always get ``foreign_keys=ON``, whatever
+the profile, because catalog deletes rely on ``ON DELETE CASCADE``.
+
+With ``DATABASE_REPLICA_URL`` set, views wrapped in :func:`use_replica` send
+their SELECTs to the ``replica`` bind, along with textual statements marked
+``execution_options(readonly=True)``. Everything else stays on the primary:
+writes, any read in a transaction that has already written, and every
+request from a client that wrote less than ``DATABASE_REPLICA_STICKY_SECONDS``
+ago (tracked with the ``db_primary_until`` cookie), so clients read their
+own writes. Views behind the response cache stay on the primary too: the
+cache is refilled right after an admin write evicts it, and must not store
+what a lagging replica still returns.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from backend.config import ENGINE_PROFILES
+
+REPLICA_BIND = 'replica'
+STICKY_COOKIE = 'db_primary_until'
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle')
+# SQLite leaves foreign keys unenforced per connection unless asked.
+REQUIRED_SQLITE_PRAGMAS = {'foreign_keys': 'ON'}
+
+
+def is_read(clause):
+    """A SELECT, or a statement (such as a ``text()`` query) marked ``readonly`` in its execution options."""
+    if clause is None:
+        return False
+    if getattr(clause, 'is_select', False):
+        return True
+    get_options = getattr(clause, 'get_execution_options', None)
+    return get_options is not None and get_options().get('readonly', False)
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica bind while replica reads are enabled."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if not is_read(clause):
+                # Flushes, DML and raw connections: remember the transaction wrote.
+                self.info['wrote'] = True
+            elif self.info.get('use_replica') and not self.info.get('wrote'):
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_memory_sqlite(url):
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def configure_engines(app):
+    """Fill in engine options and the replica bind from the profile; call before ``db.init_app``."""
+    profile = dict(ENGINE_PROFILES[app.config.get('DATABASE_PROFILE', 'default')])
+    app.extensions['database_pragmas'] = profile.pop('pragmas', {})
+    if _is_memory_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        # In-memory SQLite uses a single static connection, which takes no pool options.
+        for option in POOL_OPTIONS:
+            profile.pop(option, None)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**profile, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+
+    replica_url = app.config.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        app.config['SQLALCHEMY_BINDS'] = {**app.config.get('SQLALCHEMY_BINDS', {}), REPLICA_BIND: replica_url}
+
+
+def init_database(app, db):
+    """Install the profile's connection pragmas and the read-your-writes cookie; call after ``db.init_app``."""
+    pragmas = {**REQUIRED_SQLITE_PRAGMAS, **app.extensions['database_pragmas']}
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', _pragma_setter(pragmas))
+
+    if REPLICA_BIND in app.config.get('SQLALCHEMY_BINDS', {}):
+        # The replica mirrors the primary's schema and owns no tables, so create_all/drop_all skip it.
+        db.metadatas.pop(REPLICA_BIND, None)
+
+        @app.after_request
+        def _stick_to_primary(response):
+            wrote_at = db.session.info.pop('wrote_at', None)
+            if wrote_at is not None:
+                until = int(wrote_at + app.config.get('DATABASE_REPLICA_STICKY_SECONDS', 5)) + 1
+                response.set_cookie(STICKY_COOKIE, str(until), max_age=until - int(time.time()), httponly=True)
+            return response
+
+
+def _pragma_setter(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+def _recently_wrote():
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+@contextmanager
+def replica_reads():
+    """Route the session's SELECTs to the replica (if one is configured) inside the block."""
+    from backend.app import db
+
+    session = db.session()
+    previous = session.info.get('use_replica', False)
+    session.info['use_replica'] = True
+    try:
+        yield
+    finally:
+        session.info['use_replica'] = previous
+
+
+def use_replica(fn):
+    """Serve a read-only view from the replica unless the client wrote recently."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if REPLICA_BIND not in current_app.config.get('SQLALCHEMY_BINDS', {}) or _recently_wrote():
+            return fn(*args, **kwargs)
+        with replica_reads():
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _record_write(session):
+    if session.get_nested_transaction() is not None:
+        return  # a savepoint was released; wait for the real commit
+    if session.info.pop('wrote', False):
+        session.info['wrote_at'] = time.time()
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _forget_writes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('wrote', None)
@@ -0,0 +1,82 @@
+"""Set-based deletion of catalog subtrees.
+
+Deleting a course, module or topic never loads its descendants into the
+session. The ids in scope are read once (the caller needs them for search
+and cache invalidation), then each table is cleared bottom-up with one
+DELETE whose scope is a subquery, so a course with ten thousand topics
+takes the same handful of statements as an empty one. The foreign keys
+also carry ``ON DELETE CASCADE``; the explicit deletes keep the result the
+same on databases whose constraints predate that migration.
+
+Blob references of the deleted resources are released in one batch and
+files that end up unreferenced, including legacy uploads outside the blob
+store, are removed from disk after the transaction commits.
+"""
+from sqlalchemy import delete, select
+
+from backend.app import analytics, catalog, completion, db, search, storage, suggest, sync
+from backend.app.models import Course, Module, Resource, Topic, user_topic_progress
+
+
+def _delete_topic_contents(topics, modules_deleted):
+    """Delete the resources and completions of `topics` (a list or SELECT of ids); returns the resource count."""
+    files = db.session.execute(
+        select(Resource.id, Resource.sha256, Resource.path_or_url).where(Resource.topic_id.in_(topics))
+    ).all()
+    if not modules_deleted:
+        completion.topics_removed(topics)
+    analytics.topics_removed(topics)
+    db.session.execute(delete(user_topic_progress).where(user_topic_progress.c.topic_id.in_(topics)))
+    db.session.execute(delete(Resource).where(Resource.topic_id.in_(topics))
+                       .execution_options(synchronize_session=False))
+    storage.release(sha256 for _, sha256, _ in files)
+    storage.discard_files(path for _, sha256, path in files if not sha256)
+    sync.record('resource', (resource_id for resource_id, _, _ in files), deleted=True)
+    suggest.removed('resource', (resource_id for resource_id, _, _ in files))
+    return len(files)
+
+
+def delete_topics(topic_ids):
+    """Delete topics by id with everything below them; returns ``{'topics': [...], 'resources': n}``."""
+    topic_ids = list(topic_ids)
+    search.remove_topics(topic_ids)
+    resources = _delete_topic_contents(topic_ids, modules_deleted=False)
+    db.session.execute(delete(Topic).where(Topic.id.in_(topic_ids)).execution_options(synchronize_session=False))
+    sync.record('topic', topic_ids, deleted=True)
+    suggest.removed('topic', topic_ids)
+    catalog.touch('topics', 'resources')
+    return {'topics': topic_ids, 'resources': resources}
+
+
+def _delete_modules_where(condition):
+    module_ids = db.session.execute(select(Module.id).where(condition)).scalars().all()
+    in_modules = Topic.module_id.in_(select(Module.id).where(condition))
+    topic_ids = db.session.execute(select(Topic.id).where(in_modules)).scalars().all()
+    search.remove_topics(topic_ids)
+    completion.modules_removed(select(Module.id).where(condition))
+    resources = _delete_topic_contents(select(Topic.id).where(in_modules), modules_deleted=True)
+    db.session.execute(delete(Topic).where(in_modules).execution_options(synchronize_session=False))
+    db.session.execute(delete(Module).where(condition).execution_options(synchronize_session=False))
+    sync.record('topic', topic_ids, deleted=True)
+    sync.record('module', module_ids, deleted=True)
+    suggest.removed('topic', topic_ids)
+    suggest.removed('module', module_ids)
+    return {'modules': module_ids, 'topics': topic_ids, 'resources': resources}
+
+
+def delete_modules(module_ids):
+    """Delete modules by id with everything below them; returns the ids of what was removed."""
+    deleted = _delete_modules_where(Module.id.in_(list(module_ids)))
+    catalog.touch('modules', 'topics', 'resources')
+    return deleted
+
+
+def delete_courses(course_ids):
+    """Delete courses by id with everything below them; returns the ids of what was removed."""
+    course_ids = list(course_ids)
+    deleted = _delete_modules_where(Module.course_id.in_(course_ids))
+    db.session.execute(delete(Course).where(Course.id.in_(course_ids)).execution_options(synchronize_session=False))
+    sync.record('course', course_ids, deleted=True)
+    suggest.removed('course', course_ids)
+    catalog.touch('courses', 'modules', 'topics', 'resources')
+    return {'courses': course_ids, **deleted}
@@ -0,0 +1,105 @@
+"""Authenticated identity without a user query per request.
+
+Access tokens carry the user's id as the subject plus ``role``,
+``username`` and ``tv`` (token version) claims. Every protected request
+checks the token version against a small TTL cache of user snapshots, so
+authentication usually costs no SQL at all; views that need the user call
+:func:`current_user_id` or use ``flask_jwt_extended.current_user``.
+
+Changing a user's role or token version bumps ``User.token_version`` and
+evicts the cached snapshot, which revokes every token issued before.
+Eviction only reaches the current process, so other workers may accept a
+revoked token until their snapshot expires (``IDENTITY_CACHE_TTL``);
+admin routes therefore check the token against the database instead.
+"""
+from collections import namedtuple
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, get_jwt_identity
+from sqlalchemy import select
+
+from backend.app import db, jwt
+from backend.app.cache import LRUCache
+from backend.app.models import User
+
+Identity = namedtuple('Identity', 'id username role token_version')
+
+
+def init_identity(app):
+    app.extensions['identity_cache'] = LRUCache(
+        max_entries=app.config.get('IDENTITY_CACHE_SIZE', 10000),
+        default_ttl=app.config.get('IDENTITY_CACHE_TTL', 60),
+    )
+
+
+def _cache():
+    return current_app.extensions['identity_cache']
+
+
+def issue_token(user):
+    # Warm the cache: the client's next request will check this token.
+    _cache().set(user.id, Identity(user.id, user.username, user.role, user.token_version))
+    return create_access_token(identity=str(user.id), additional_claims={
+        'username': user.username,
+        'role': user.role,
+        'tv': user.token_version,
+    })
+
+
+def load_identity(user_id, fresh=False):
+    """
+    Return the cached :class:`Identity` for a user id, or None if the user no longer exists.
+
+    `fresh` reads it from the database whatever the cache holds, and re-caches it.
+    """
+    identity = None if fresh else _cache().get(user_id)
+    if identity is None:
+        row = db.session.execute(
+            select(User.id, User.username, User.role, User.token_version).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        identity = Identity(*row)
+        _cache().set(user_id, identity)
+    return identity
+
+
+def forget_identity(user_id):
+    """Evict a user's cached identity; call after committing a role or token version change."""
+    _cache().delete(user_id)
+
+
+def revoke_tokens(user):
+    """Invalidates every token issued to `user` so far (takes effect on commit)."""
+    user.token_version = User.token_version + 1
+
+
+def current_user_id():
+    return int(get_jwt_identity())
+
+
+def _subject_id(jwt_data):
+    try:
+        return int(jwt_data['sub'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def is_revoked(jwt_data, fresh=False):
+    """Whether a token's user is gone or its token version or role is outdated (`fresh` as for :func:`load_identity`)."""
+    # Tokens from before ids were used as the subject have no 'tv' claim.
+    user_id = _subject_id(jwt_data)
+    if user_id is None or 'tv' not in jwt_data:
+        return True
+    identity = load_identity(user_id, fresh=fresh)
+    return identity is None or identity.token_version != jwt_data['tv'] or identity.role != jwt_data.get('role')
+
+
+@jwt.token_in_blocklist_loader
+def _is_token_revoked(jwt_header, jwt_data):
+    return is_revoked(jwt_data)
+
+
+@jwt.user_lookup_loader
+def _lookup_user(jwt_header, jwt_data):
+    return load_identity(_subject_id(jwt_data))
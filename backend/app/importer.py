@@ -0,0 +1,203 @@
+"""Bulk catalog import.
+
+A document is a list of courses, each with nested modules and topics::
+
+    {"courses": [{"name": "...", "description": "...",
+                  "modules": [{"name": "...", "topics": [{"name": "...", "content": "..."}]}]}]}
+
+or the same course objects as NDJSON, one per line. The whole document is
+validated before anything is written, then each level is upserted by name
+(courses globally, modules within their course, topics within their module)
+with one lookup and one executemany INSERT/UPDATE per level, all inside the
+caller's transaction.
+"""
+import json
+import time
+
+from sqlalchemy import bindparam, func, insert, select, update
+
+from backend.app import catalog, db, search, suggest, sync
+from backend.app.models import Course, Module, Topic
+
+NAME_LENGTH = 128
+
+# Nested key and the optional text fields allowed at each level.
+LEVELS = {
+    'course': ('modules', ('description',)),
+    'module': ('topics', ('description',)),
+    'topic': (None, ('content',)),
+}
+CHILD_LEVEL = {'course': 'module', 'module': 'topic'}
+
+
+class ImportValidationError(ValueError):
+    """Raised with every problem found in an import document."""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)} validation error(s)')
+        self.errors = errors
+
+
+def parse_ndjson(lines):
+    """Yield course objects from an iterable of NDJSON lines (bytes or str)."""
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ImportValidationError([f'line {number}: invalid JSON ({e})'])
+
+
+def _validate(item, level, path, errors):
+    if not isinstance(item, dict):
+        errors.append(f'{path}: expected an object')
+        return
+    name = item.get('name')
+    if not isinstance(name, str) or not name.strip():
+        errors.append(f'{path}.name: required')
+    elif len(name) > NAME_LENGTH:
+        errors.append(f'{path}.name: longer than {NAME_LENGTH} characters')
+    children_key, text_fields = LEVELS[level]
+    for field in text_fields:
+        if item.get(field) is not None and not isinstance(item[field], str):
+            errors.append(f'{path}.{field}: expected a string')
+    if children_key is None:
+        return
+    children = item.get(children_key, [])
+    if not isinstance(children, list):
+        errors.append(f'{path}.{children_key}: expected a list')
+        return
+    seen = set()
+    for i, child in enumerate(children):
+        child_path = f'{path}.{children_key}[{i}]'
+        _validate(child, CHILD_LEVEL[level], child_path, errors)
+        if isinstance(child, dict) and isinstance(child.get('name'), str):
+            if child['name'] in seen:
+                errors.append(f'{child_path}.name: duplicate "{child["name"]}"')
+            seen.add(child['name'])
+
+
+def validate(courses):
+    """Return the list of courses if valid, else raise :class:`ImportValidationError` listing every problem."""
+    errors = []
+    if not isinstance(courses, list):
+        raise ImportValidationError(['courses: expected a list'])
+    seen = set()
+    for i, course in enumerate(courses):
+        _validate(course, 'course', f'courses[{i}]', errors)
+        if isinstance(course, dict) and isinstance(course.get('name'), str):
+            if course['name'] in seen:
+                errors.append(f'courses[{i}].name: duplicate "{course["name"]}"')
+            seen.add(course['name'])
+    if errors:
+        raise ImportValidationError(errors)
+    return courses
+
+
+def _upsert(model, parent_column, items, text_field):
+    """
+    Upsert `items` (dicts with ``parent_id``, ``name`` and `text_field`) by (parent, name).
+
+    Returns ``({(parent_id, name): id}, created, updated)``.
+    """
+    if not items:
+        return {}, 0, 0
+    table = model.__table__
+    columns = [table.c.id, table.c.name]
+    if parent_column is None:
+        query = select(*columns).where(table.c.name.in_({item['name'] for item in items}))
+    else:
+        columns.append(parent_column)
+        query = select(*columns).where(parent_column.in_({item['parent_id'] for item in items}))
+
+    def key_of(row):
+        return (row[2] if parent_column is not None else None, row[1])
+
+    existing = {}
+    for row in db.session.execute(query.order_by(table.c.id)):
+        existing.setdefault(key_of(row), row[0])
+
+    ids = {}
+    new_rows, changed_rows = [], []
+    for item in items:
+        key = (item['parent_id'], item['name'])
+        if key in existing:
+            ids[key] = existing[key]
+            if item.get(text_field) is not None:
+                changed_rows.append({'b_id': existing[key], 'b_text': item[text_field]})
+        else:
+            row = {'name': item['name'], text_field: item.get(text_field) or ''}
+            if parent_column is not None:
+                row[parent_column.key] = item['parent_id']
+            new_rows.append(row)
+
+    if new_rows:
+        # One executemany; SQLAlchemy batches it with RETURNING ("insertmanyvalues")
+        for row in db.session.execute(insert(table).returning(*columns), new_rows):
+            ids[key_of(row)] = row[0]
+    if changed_rows:
+        db.session.execute(
+            update(table).where(table.c.id == bindparam('b_id')).values({text_field: bindparam('b_text')}),
+            changed_rows,
+        )
+    return ids, len(new_rows), len(changed_rows)
+
+
+def import_catalog(courses, dry_run=False):
+    """
+    Upsert a validated list of courses into the current transaction.
+
+    With `dry_run` the caller is expected to roll back, so the in-process
+    search index is left untouched. Returns a report with per-level created/updated counts and the affected
+    ids, which callers use to evict cached responses.
+    """
+    started = time.perf_counter()
+    report = {}
+
+    course_ids, report['courses_created'], report['courses_updated'] = _upsert(
+        Course, None, [{'parent_id': None, 'name': c['name'], 'description': c.get('description')}
+                       for c in courses], 'description')
+
+    module_items = [
+        {'parent_id': course_ids[(None, c['name'])], 'name': m['name'], 'description': m.get('description')}
+        for c in courses for m in c.get('modules', [])
+    ]
+    module_ids, report['modules_created'], report['modules_updated'] = _upsert(
+        Module, Module.__table__.c.course_id, module_items, 'description')
+
+    topic_items = [
+        {'parent_id': module_ids[(course_ids[(None, c['name'])], m['name'])], 'name': t['name'],
+         'content': t.get('content')}
+        for c in courses for m in c.get('modules', []) for t in m.get('topics', [])
+    ]
+    topic_ids, report['topics_created'], report['topics_updated'] = _upsert(
+        Topic, Topic.__table__.c.module_id, topic_items, 'content')
+
+    affected_modules = sorted(set(module_ids.values()))
+    if topic_ids:
+        # Keep the badge totals (see completion.py) in step with the new topics.
+        db.session.execute(
+            update(Module.__table__).where(Module.__table__.c.id.in_(affected_modules)).values(
+                topic_count=select(func.count(Topic.id)).where(Topic.module_id == Module.__table__.c.id)
+                .scalar_subquery()
+            )
+        )
+        if not dry_run:
+            search.index_topics(db.session.execute(
+                select(Topic.id, Topic.name, Topic.content).where(Topic.id.in_(topic_ids.values()))
+            ))
+    catalog.touch('courses', 'modules', 'topics')
+    sync.record('course', course_ids.values())
+    sync.record('module', module_ids.values())
+    sync.record('topic', topic_ids.values())
+    suggest.changed('course', [(ref_id, name, None) for (_, name), ref_id in course_ids.items()])
+    suggest.changed('module', [(ref_id, name, parent) for (parent, name), ref_id in module_ids.items()])
+    suggest.changed('topic', [(ref_id, name, parent) for (parent, name), ref_id in topic_ids.items()])
+
+    report['course_ids'] = sorted(set(course_ids.values()))
+    report['module_ids'] = affected_modules
+    report['topic_ids'] = sorted(set(topic_ids.values()))
+    report['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return report
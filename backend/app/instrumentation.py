@@ -0,0 +1,253 @@
+"""Per-request SQL and timing instrumentation.
+
+For every request we record the number of SQL statements, time spent in
+the database, time spent serializing JSON and the remaining handler time.
+They are returned in a ``Server-Timing`` header, logged as one JSON line on
+the ``medlib.requests`` logger, and aggregated per endpoint into the
+histograms served by ``/admin/metrics``.
+
+A request that runs the same statement shape (the SQL with parameter lists
+collapsed) more than ``INSTRUMENTATION_N_PLUS_ONE_THRESHOLD`` times is
+logged as an N+1 suspect. Tests can use :func:`query_budget` to fail when an
+endpoint runs more statements than expected.
+"""
+import json
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+from backend.app import db
+
+logger = logging.getLogger('medlib.requests')
+
+# Upper bounds of the histogram buckets; the last bucket is unbounded.
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+_PARAMETER_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|\$\d+|:\w+))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """The statement with whitespace normalized and ``IN (?, ?, ...)`` lists collapsed."""
+    return _PARAMETER_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+
+class RequestMetrics:
+    """What one request spent its time on."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.shapes = Counter()
+
+    def add_statement(self, statement, seconds):
+        self.statements += 1
+        self.db_seconds += seconds
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated_shapes(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+    def to_dict(self):
+        buckets = {str(bound): count for bound, count in zip(self.bounds, self.counts)}
+        buckets['+Inf'] = self.counts[-1]
+        return {'buckets': buckets, 'sum': round(self.total, 3)}
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.n_plus_one = 0
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.db_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+
+    def to_dict(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'n_plus_one_suspects': self.n_plus_one,
+            'latency_ms': self.latency_ms.to_dict(),
+            'db_ms': self.db_ms.to_dict(),
+            'sql_statements': self.statements.to_dict(),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe per-endpoint aggregates for the lifetime of the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, status_code, total_ms, metrics, n_plus_one):
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = EndpointMetrics()
+            entry.requests += 1
+            entry.errors += status_code >= 500
+            entry.n_plus_one += bool(n_plus_one)
+            entry.latency_ms.observe(total_ms)
+            entry.db_ms.observe(metrics.db_seconds * 1000)
+            entry.statements.observe(metrics.statements)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: entry.to_dict() for endpoint, entry in sorted(self._endpoints.items())}
+
+
+def _current_metrics():
+    return g.get('request_metrics') if has_app_context() else None
+
+
+class TimedJSONMixin:
+    """Adds the time spent in ``dumps`` to the current request's metrics."""
+
+    def dumps(self, obj, **kwargs):
+        metrics = _current_metrics()
+        if metrics is None:
+            return super().dumps(obj, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            metrics.serialize_seconds += time.perf_counter() - started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    metrics = _current_metrics()
+    if metrics is not None:
+        metrics.add_statement(statement, time.perf_counter() - conn.info['query_started'])
+
+
+def init_instrumentation(app):
+    if not app.config.get('INSTRUMENTATION_ENABLED', True):
+        return
+    app.extensions['metrics'] = MetricsRegistry()
+    provider_class = type(app.json)
+    app.json = type(f'Timed{provider_class.__name__}', (TimedJSONMixin, provider_class), {})(app)
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def _start_request_metrics():
+        g.request_metrics = RequestMetrics()
+
+    @app.after_request
+    def _finish_request_metrics(response):
+        metrics = g.pop('request_metrics', None)
+        if metrics is None:
+            return response
+        total_ms = (time.perf_counter() - metrics.started) * 1000
+        db_ms = metrics.db_seconds * 1000
+        serialize_ms = metrics.serialize_seconds * 1000
+        handler_ms = max(total_ms - db_ms - serialize_ms, 0.0)
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.2f};desc="{metrics.statements} queries"',
+            f'serialize;dur={serialize_ms:.2f}',
+            f'handler;dur={handler_ms:.2f}',
+            f'total;dur={total_ms:.2f}',
+        ])
+
+        repeated = metrics.repeated_shapes(app.config.get('INSTRUMENTATION_N_PLUS_ONE_THRESHOLD', 10))
+        endpoint = request.endpoint or 'unmatched'
+        app.extensions['metrics'].record(endpoint, response.status_code, total_ms, metrics, repeated)
+        if repeated:
+            logger.warning('Possible N+1 queries in %s %s: %s', request.method, request.path,
+                           '; '.join(f'{count}x {shape}' for shape, count in repeated))
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'handler_ms': round(handler_ms, 2),
+                'db_ms': round(db_ms, 2),
+                'serialize_ms': round(serialize_ms, 2),
+                'sql_statements': metrics.statements,
+                'n_plus_one': [shape for shape, _ in repeated],
+            }))
+        return response
+
+    @app.teardown_request
+    def _discard_request_metrics(exc):
+        # Set only when the request failed before after_request ran.
+        g.pop('request_metrics', None)
+
+
+def get_metrics():
+    return current_app.extensions['metrics'].snapshot() if 'metrics' in current_app.extensions else {}
+
+
+class QueryRecorder:
+    """Collects the SQL statements run on every engine of the current app."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __len__(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries():
+    """Yield a :class:`QueryRecorder` listening for the duration of the block."""
+    recorder = QueryRecorder()
+    engines = list(db.engines.values())
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', recorder._record)
+    try:
+        yield recorder
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', recorder._record)
+
+
+@contextmanager
+def query_budget(max_statements):
+    """
+    Fail with an AssertionError listing the statements if the block runs more than `max_statements`.
+
+        with query_budget(2):
+            test_client.get('/api/progress', headers=headers)
+    """
+    with count_queries() as recorder:
+        yield recorder
+    if len(recorder) > max_statements:
+        listing = '\n'.join(f'  {i}. {statement_shape(s)}' for i, s in enumerate(recorder.statements, start=1))
+        raise AssertionError(f'Expected at most {max_statements} SQL statements, got {len(recorder)}:\n{listing}')
@@ -0,0 +1,252 @@
+"""Durable background jobs, run in-process.
+
+Jobs are rows in the ``jobs`` table, so they are enqueued in the same
+transaction as the change that needs them and survive restarts. Workers
+claim one job at a time with a conditional UPDATE and hold it for
+``JOBS_LEASE_SECONDS``; a job whose worker died is claimed again once its
+lease expires. A failing job is retried with exponential backoff until
+``max_attempts`` is reached, then marked ``failed`` with the error.
+
+``JOBS_MODE`` selects how jobs run:
+
+* ``'thread'``: a pool of ``JOBS_WORKERS`` daemon threads, started on the
+  first request or enqueue and woken whenever a commit enqueues work.
+* ``'manual'``: nothing runs until :func:`run_pending` is called (tests,
+  cron-style ``flask jobs run``).
+
+Handlers are registered with :func:`handler` and receive the job payload
+inside an application context; their database writes are committed with
+the job's status. Long handlers may commit as they go and publish how far
+they got with :func:`report_progress`, which also renews the job's lease.
+"""
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app, g
+from sqlalchemy import and_, event, or_, select, update
+
+from backend.app import db
+from backend.app.models import Job
+
+logger = logging.getLogger('medlib.jobs')
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register a function taking the job payload as the handler for `kind`; its return value is stored as the result."""
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def enqueue(kind, payload=None, max_attempts=None, delay=0):
+    """Add a job to the current transaction; it becomes runnable once committed."""
+    job = Job(kind=kind, payload=payload or {},
+              max_attempts=max_attempts or current_app.config.get('JOBS_MAX_ATTEMPTS', 3),
+              run_after=datetime.now(timezone.utc) + timedelta(seconds=delay))
+    db.session.add(job)
+    db.session.info['jobs_enqueued'] = True
+    return job
+
+
+def report_progress(progress):
+    """
+    Store `progress` as the running job's result and renew its lease, once the caller commits.
+
+    Long handlers must report at least every ``JOBS_LEASE_SECONDS``, or the
+    job is claimed again as if its worker had died. A no-op outside a job.
+    """
+    job_id = g.get('job_id')
+    if job_id is not None:
+        jobs = Job.__table__
+        db.session.execute(update(jobs).where(jobs.c.id == job_id)
+                           .values(result=progress, locked_at=datetime.now(timezone.utc)))
+
+
+def to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'payload': job.payload,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': job.result,
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'run_after': job.run_after.isoformat() if job.run_after else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def _claimable(jobs, now, lease_seconds):
+    return or_(
+        and_(jobs.c.status == 'queued', jobs.c.run_after <= now),
+        and_(jobs.c.status == 'running', jobs.c.locked_at < now - timedelta(seconds=lease_seconds)),
+    )
+
+
+def claim_next(worker_id, now=None):
+    """Atomically take the oldest runnable job for `worker_id` and commit; returns the row or None."""
+    now = now or datetime.now(timezone.utc)
+    lease = current_app.config.get('JOBS_LEASE_SECONDS', 300)
+    jobs = Job.__table__
+    candidate = (select(jobs.c.id).where(_claimable(jobs, now, lease)).order_by(jobs.c.id).limit(1)
+                 .with_for_update(skip_locked=True).scalar_subquery())
+    # Re-checking the condition makes the UPDATE a no-op if another worker won the race.
+    row = db.session.execute(
+        update(jobs).where(jobs.c.id == candidate, _claimable(jobs, now, lease))
+        .values(status='running', locked_by=worker_id, locked_at=now, attempts=jobs.c.attempts + 1)
+        .returning(jobs.c.id, jobs.c.kind, jobs.c.payload, jobs.c.attempts, jobs.c.max_attempts)
+    ).first()
+    db.session.commit()
+    return row
+
+
+def _finish(job_id, **values):
+    jobs = Job.__table__
+    db.session.execute(update(jobs).where(jobs.c.id == job_id).values(locked_by=None, locked_at=None, **values))
+    db.session.commit()
+
+
+def run_job(row, now=None):
+    """Run a claimed job and record the outcome; returns the new status."""
+    now = now or datetime.now(timezone.utc)
+    try:
+        if row.attempts > row.max_attempts:
+            raise RuntimeError('Worker lost while running the job too many times')
+        fn = HANDLERS.get(row.kind)
+        if fn is None:
+            raise LookupError(f'No handler registered for job kind {row.kind!r}')
+        g.job_id = row.id
+        try:
+            result = fn(row.payload)
+        finally:
+            g.pop('job_id', None)
+    except Exception as e:
+        db.session.rollback()
+        error = f'{type(e).__name__}: {e}'
+        if row.attempts < row.max_attempts:
+            backoff = current_app.config.get('JOBS_RETRY_BACKOFF', 5) * 2 ** (row.attempts - 1)
+            logger.warning('Job %s (%s) failed, retrying in %ss: %s', row.id, row.kind, backoff, error)
+            _finish(row.id, status='queued', error=error, run_after=now + timedelta(seconds=backoff))
+            return 'queued'
+        logger.error('Job %s (%s) failed after %s attempts: %s', row.id, row.kind, row.attempts, error)
+        _finish(row.id, status='failed', error=error, finished_at=datetime.now(timezone.utc))
+        return 'failed'
+    # The handler's own writes are committed together with the status.
+    _finish(row.id, status='succeeded', result=result, error=None, finished_at=datetime.now(timezone.utc))
+    return 'succeeded'
+
+
+def _worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+
+
+def run_pending(limit=None, now=None):
+    """Run runnable jobs in the calling thread until none is left (or `limit` ran); returns how many ran."""
+    ran = 0
+    while limit is None or ran < limit:
+        row = claim_next(_worker_id(), now=now)
+        if row is None:
+            break
+        run_job(row, now=now)
+        ran += 1
+    return ran
+
+
+class JobRunner:
+    """Daemon worker threads polling the jobs table, each in its own application context."""
+
+    def __init__(self, app, workers=2, poll_interval=5.0):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self):
+        while not self._stop.is_set():
+            ran = 0
+            try:
+                with self.app.app_context():
+                    ran = run_pending(limit=1)
+            except Exception:
+                logger.exception('Job worker crashed; restarting the loop')
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+
+@event.listens_for(db.session, 'after_commit')
+def _wake_runner(session):
+    if session.get_nested_transaction() is not None:
+        return  # a savepoint was released; wait for the real commit
+    if session.info.pop('jobs_enqueued', False):
+        runner = current_app.extensions.get('job_runner')
+        if runner is not None:
+            runner.ensure_started()
+            runner.wake()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_enqueued(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('jobs_enqueued', None)
+
+
+@click.group('jobs')
+def jobs_cli():
+    """Background job commands."""
+
+
+@jobs_cli.command('run')
+@click.option('--limit', type=int, default=None, help='Stop after this many jobs.')
+def run_command(limit):
+    """Run every runnable job in this process, then exit."""
+    click.echo(f'Ran {run_pending(limit=limit)} job(s)')
+
+
+def init_jobs(app):
+    from backend.app import processing  # noqa: F401 -- registers the upload handlers
+
+    app.cli.add_command(jobs_cli)
+    if app.config.get('JOBS_MODE', 'thread') != 'thread':
+        return
+    runner = JobRunner(app, workers=app.config.get('JOBS_WORKERS', 2),
+                       poll_interval=app.config.get('JOBS_POLL_INTERVAL', 5.0))
+    app.extensions['job_runner'] = runner
+
+    @app.before_request
+    def _start_job_runner():
+        # Started lazily so CLI commands and forking servers don't inherit stray threads.
+        runner.ensure_started()
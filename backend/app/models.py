@@ -1,36 +1,64 @@
+from sqlalchemy import DDL, event
 from backend.app import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from backend.app.passwords import get_hasher
 from datetime import datetime, timezone
 
 # Association table for the many-to-many relationship between users and topics
 user_topic_progress = db.Table('user_topic_progress',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
-    db.Column('topic_id', db.Integer, db.ForeignKey('topics.id'), primary_key=True),
-    db.Column('completed_at', db.DateTime, default=lambda: datetime.now(timezone.utc))
+    db.Column('topic_id', db.Integer, db.ForeignKey('topics.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('completed_at', db.DateTime, default=lambda: datetime.now(timezone.utc)),
+    # The primary key serves per-user lookups; this one serves "who completed this topic"
+    db.Index('ix_user_topic_progress_topic_id_user_id', 'topic_id', 'user_id'),
+    # Incremental exports pull completions by time
+    db.Index('ix_user_topic_progress_completed_at', 'completed_at')
 )
 
 user_badge_association = db.Table('user_badge_association',
     db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True),
-    db.Column('badge_id', db.Integer, db.ForeignKey('badges.id'), primary_key=True)
+    db.Column('badge_id', db.Integer, db.ForeignKey('badges.id'), primary_key=True),
+    db.Column('awarded_at', db.DateTime, default=lambda: datetime.now(timezone.utc)),
+    db.Index('ix_user_badge_association_badge_id', 'badge_id')
+)
+
+# Who was active in each analytics bucket, so a learner is counted once per day or month (see analytics.py)
+active_learners = db.Table('active_learners',
+    db.Column('period', db.String(8), primary_key=True),
+    db.Column('start', db.Date, primary_key=True),
+    db.Column('user_id', db.Integer, db.ForeignKey('users.id'), primary_key=True)
+)
+
+# One row per catalog table, bumped whenever a row in that table changes.
+# Read endpoints derive their ETag / Last-Modified validators from it.
+catalog_versions = db.Table('catalog_versions',
+    db.Column('name', db.String(64), primary_key=True),
+    db.Column('version', db.Integer, nullable=False, default=0),
+    db.Column('updated_at', db.DateTime, default=lambda: datetime.now(timezone.utc))
 )
 
 class NewsArticle(db.Model):
     __tablename__ = 'news_articles'
+    # The /news keyset, newest first
+    __table_args__ = (db.Index('ix_news_articles_created_at_id', 'created_at', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
     def __repr__(self):
         return f'<NewsArticle {self.title}>'
 
 class Event(db.Model):
     __tablename__ = 'events'
+    # The /events keyset, soonest first
+    __table_args__ = (db.Index('ix_events_event_date_id', 'event_date', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
     event_date = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
     def __repr__(self):
         return f'<Event {self.title}>'
@@ -41,6 +69,7 @@ class Badge(db.Model):
     name = db.Column(db.String(128), nullable=False, unique=True)
     description = db.Column(db.String(256))
     icon = db.Column(db.String(128)) # e.g., a unicode emoji or a path to an image
+    module_id = db.Column(db.Integer, db.ForeignKey('modules.id', ondelete='SET NULL'), nullable=True, unique=True) # set for "Module Master" badges
 
     def __repr__(self):
         return f'<Badge {self.name}>'
@@ -52,19 +81,23 @@ class User(db.Model):
     email = db.Column(db.String(120), index=True, unique=True, nullable=False)
     password_hash = db.Column(db.String(256))
     role = db.Column(db.String(20), default='student', nullable=False) # 'student' or 'admin'
+    token_version = db.Column(db.Integer, default=0, server_default='0', nullable=False) # bump to revoke issued tokens
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
     completed_topics = db.relationship('Topic', secondary=user_topic_progress, lazy='dynamic',
-                                     backref=db.backref('completed_by_users', lazy='dynamic'))
+                                     backref=db.backref('completed_by_users', lazy='dynamic', passive_deletes=True))
 
     badges = db.relationship('Badge', secondary=user_badge_association, lazy='dynamic',
                              backref=db.backref('users', lazy='dynamic'))
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = get_hasher().hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return get_hasher().verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return get_hasher().needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -74,8 +107,11 @@ class Course(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False, unique=True)
     description = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
-    modules = db.relationship('Module', backref='course', lazy='dynamic', cascade="all, delete-orphan")
+    # Children are removed by ON DELETE CASCADE (see deletion.py), never loaded to be deleted one by one
+    modules = db.relationship('Module', backref='course', lazy='dynamic', cascade="all, delete-orphan",
+                              passive_deletes=True)
 
     def __repr__(self):
         return f'<Course {self.name}>'
@@ -85,9 +121,12 @@ class Module(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id', ondelete='CASCADE'), nullable=False, index=True)
+    topic_count = db.Column(db.Integer, default=0, server_default='0', nullable=False) # maintained by the admin topic routes
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
-    topics = db.relationship('Topic', backref='module', lazy='dynamic', cascade="all, delete-orphan")
+    topics = db.relationship('Topic', backref='module', lazy='dynamic', cascade="all, delete-orphan",
+                             passive_deletes=True)
 
     def __repr__(self):
         return f'<Module {self.name}>'
@@ -97,9 +136,11 @@ class Topic(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
     content = db.Column(db.Text, nullable=True) # For articles, notes, etc.
-    module_id = db.Column(db.Integer, db.ForeignKey('modules.id'), nullable=False)
+    module_id = db.Column(db.Integer, db.ForeignKey('modules.id', ondelete='CASCADE'), nullable=False, index=True)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
-    resources = db.relationship('Resource', backref='topic', lazy='dynamic', cascade="all, delete-orphan")
+    resources = db.relationship('Resource', backref='topic', lazy='dynamic', cascade="all, delete-orphan",
+                                passive_deletes=True)
 
     def __repr__(self):
         return f'<Topic {self.name}>'
@@ -111,8 +152,111 @@ class Resource(db.Model):
     # Type can be 'pdf', 'video', 'link', 'quiz', etc.
     resource_type = db.Column(db.String(50), nullable=False)
     path_or_url = db.Column(db.String(256), nullable=False)
-    topic_id = db.Column(db.Integer, db.ForeignKey('topics.id'), nullable=False)
+    topic_id = db.Column(db.Integer, db.ForeignKey('topics.id', ondelete='CASCADE'), nullable=False, index=True)
     uploaded_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Set for uploaded files, which live in the content-addressed blob store
+    sha256 = db.Column(db.String(64), db.ForeignKey('blobs.sha256'), nullable=True, index=True)
+    size = db.Column(db.BigInteger, nullable=True)
+    mime_type = db.Column(db.String(128), nullable=True)
+    text_content = db.Column(db.Text, nullable=True) # extracted from the file by a background job, for search
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
     def __repr__(self):
         return f'<Resource {self.name}>'
+
+class Blob(db.Model):
+    """A stored file, shared by every resource whose upload had the same content."""
+    __tablename__ = 'blobs'
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    mime_type = db.Column(db.String(128), nullable=True)
+    ref_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<Blob {self.sha256[:12]} refs={self.ref_count}>'
+
+class UserModuleProgress(db.Model):
+    """Number of topics a user has completed in a module, kept up to date incrementally."""
+    __tablename__ = 'user_module_progress'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    module_id = db.Column(db.Integer, db.ForeignKey('modules.id', ondelete='CASCADE'), primary_key=True, index=True)
+    completed_count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<UserModuleProgress user={self.user_id} module={self.module_id} {self.completed_count}>'
+
+class Job(db.Model):
+    """A unit of background work, claimed and run by the job runner in jobs.py."""
+    __tablename__ = 'jobs'
+    __table_args__ = (db.Index('ix_jobs_status_run_after', 'status', 'run_after'),)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(16), nullable=False, default='queued') # 'queued', 'running', 'succeeded' or 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    locked_by = db.Column(db.String(128), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+class SyncChange(db.Model):
+    """The latest change to one synced record; ``seq`` orders the /sync feed (see sync.py)."""
+    __tablename__ = 'sync_changes'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'record_id', name='uq_sync_changes_kind_record_id'),
+        # Never reuse a seq, or a client holding it as its cursor would skip the change
+        {'sqlite_autoincrement': True},
+    )
+    seq = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(32), nullable=False) # 'course', 'module', 'topic', 'resource', 'news' or 'event'
+    record_id = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f'<SyncChange {self.seq} {self.kind} {self.record_id}{" deleted" if self.deleted else ""}>'
+
+class SyncSequence(db.Model):
+    """The last ``sync_changes.seq`` handed out; one row, locked by each writer until it commits (see sync.py)."""
+    __tablename__ = 'sync_sequence'
+    id = db.Column(db.Integer, primary_key=True)
+    last_seq = db.Column(db.Integer, nullable=False, default=0)
+
+event.listen(SyncSequence.__table__, 'after_create', DDL('INSERT INTO sync_sequence (id, last_seq) VALUES (1, 0)'))
+
+class AnalyticsRollup(db.Model):
+    """A counter of learning activity in one day or month, kept up to date by analytics.py."""
+    __tablename__ = 'analytics_rollups'
+    # Rankings read one metric and scope over a window of buckets
+    __table_args__ = (db.Index('ix_analytics_rollups_metric_scope_start', 'metric', 'scope', 'start'),)
+    metric = db.Column(db.String(32), primary_key=True) # 'completions' or 'active_learners'
+    scope = db.Column(db.String(16), primary_key=True) # 'topic', 'module', 'course' or 'site'
+    scope_id = db.Column(db.Integer, primary_key=True) # 0 for 'site'
+    period = db.Column(db.String(8), primary_key=True) # 'day', or 'month' once compacted
+    start = db.Column(db.Date, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<AnalyticsRollup {self.metric} {self.scope}:{self.scope_id} {self.period} {self.start} {self.value}>'
+
+class LearnerStats(db.Model):
+    """Completion and badge totals of one user, indexed for the leaderboards."""
+    __tablename__ = 'learner_stats'
+    __table_args__ = (
+        db.Index('ix_learner_stats_completions', 'completions', 'user_id'),
+        db.Index('ix_learner_stats_badges', 'badges', 'user_id'),
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    completions = db.Column(db.Integer, nullable=False, default=0)
+    badges = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<LearnerStats user={self.user_id} completions={self.completions} badges={self.badges}>'
@@ -0,0 +1,97 @@
+"""Keyset pagination for list endpoints.
+
+A :class:`Keyset` is the ordering of a list: one or more columns of its
+:class:`~backend.app.serialization.FieldSet`, ending in the primary key so
+it is total. A page is read with ``WHERE (key columns) > (last row's keys)
+ORDER BY key columns LIMIT n + 1``, so every page is one index range scan
+whose cost does not depend on how deep the client has paged.
+
+Responses stay plain JSON arrays. When there is more, the opaque cursor
+for the next page is sent in ``X-Next-Cursor`` and as a ``Link: <...>;
+rel="next"`` URL. Clients pass it back as ``?cursor=``, with ``?limit=``
+capped per endpoint.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from flask import jsonify, request, url_for
+from sqlalchemy import DateTime, literal, tuple_
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Keyset:
+    """A total ordering of `fields` by the named fields, all ascending or all descending."""
+
+    def __init__(self, fields, *names, descending=False):
+        self.names = names
+        self.columns = [fields.columns[name] for name in names]
+        self.descending = descending
+
+    def order_by(self):
+        return [column.desc() if self.descending else column.asc() for column in self.columns]
+
+    def after(self, values):
+        """The condition selecting the rows that sort after the row whose keys are `values`."""
+        keys = tuple_(*self.columns)
+        bound = tuple_(*(literal(value, column.type) for value, column in zip(values, self.columns)))
+        return keys < bound if self.descending else keys > bound
+
+    def encode(self, item):
+        values = [item[name].isoformat() if isinstance(item[name], datetime) else item[name] for name in self.names]
+        return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if not isinstance(values, list) or len(values) != len(self.columns):
+                raise ValueError
+            return [datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+                    for value, column in zip(values, self.columns)]
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            raise InvalidCursor(f'Invalid cursor {cursor!r}')
+
+
+def read_page(fields, keyset, *criteria, default_limit=DEFAULT_LIMIT, max_limit=MAX_LIMIT):
+    """
+    Read the page of `fields` matching `criteria` that the request asks for.
+
+    Returns ``(items, next_cursor)``, the cursor being None on the last
+    page; raises :class:`InvalidCursor` for a bad ``cursor`` argument.
+    """
+    limit = min(max(request.args.get('limit', default_limit, type=int), 1), max_limit)
+    criteria = list(criteria)
+    if request.args.get('cursor'):
+        criteria.append(keyset.after(keyset.decode(request.args['cursor'])))
+    items = fields.all(*criteria, order_by=keyset.order_by(), limit=limit + 1)
+    return items[:limit], keyset.encode(items[limit - 1]) if len(items) > limit else None
+
+
+def link_next_page(response, cursor):
+    """Add the next-page headers for `cursor` (if any) to `response`."""
+    if cursor is not None:
+        args = {**request.args.to_dict(), 'cursor': cursor}
+        response.headers['X-Next-Cursor'] = cursor
+        response.headers['Link'] = f'<{url_for(request.endpoint, **request.view_args, **args)}>; rel="next"'
+    return response
+
+
+def paginate(fields, keyset, *criteria, default_limit=DEFAULT_LIMIT, max_limit=MAX_LIMIT):
+    """
+    Respond with the page of `fields` matching `criteria` that the request asks for.
+
+    Reads ``cursor`` and ``limit`` from the query string and returns the
+    JSON response with the next-page headers, or a 400 for a bad cursor.
+    """
+    try:
+        items, cursor = read_page(fields, keyset, *criteria, default_limit=default_limit, max_limit=max_limit)
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    return link_next_page(jsonify(items), cursor)
@@ -0,0 +1,120 @@
+"""Password hashing on a bounded worker pool.
+
+Hashing is deliberately slow, so login and registration storms can pin
+every web worker on CPU. The hasher runs at most ``PASSWORD_HASH_WORKERS``
+hashes at a time and lets at most ``PASSWORD_HASH_QUEUE`` more wait; any
+request beyond that fails fast with :class:`HasherBusy`, answered as 503
+with ``Retry-After`` instead of queueing without bound.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, has_app_context, jsonify
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'pbkdf2:sha256:600000'
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing queue is full')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    def __init__(self, method=DEFAULT_METHOD, salt_length=16, max_workers=None, max_queue=None, retry_after=1):
+        self.method = method
+        self.salt_length = salt_length
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = self.max_workers * 4 if max_queue is None else max_queue
+        self.retry_after = retry_after
+        self._prefix = None
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {'hashes': 0, 'rejected': 0, 'hash_seconds_total': 0.0, 'hash_seconds_max': 0.0}
+
+    def _timed(self, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._stats['hashes'] += 1
+                self._stats['hash_seconds_total'] += elapsed
+                self._stats['hash_seconds_max'] = max(self._stats['hash_seconds_max'], elapsed)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HasherBusy(self.retry_after)
+        with self._lock:
+            self._in_flight += 1
+        try:
+            return self._executor.submit(self._timed, fn, *args).result()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if `pwhash` was made with a different method or cost than the configured one."""
+        if not pwhash:
+            return False
+        if self._prefix is None:
+            # Werkzeug fills in defaults ('scrypt' -> 'scrypt:32768:8:1'), so learn the full prefix once.
+            self._prefix = self._run(generate_password_hash, '', self.method, 1).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._prefix
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            in_flight = self._in_flight
+        stats['hash_ms_avg'] = round(1000 * stats['hash_seconds_total'] / stats['hashes'], 2) if stats['hashes'] else 0.0
+        stats['hash_ms_max'] = round(1000 * stats.pop('hash_seconds_max'), 2)
+        stats.pop('hash_seconds_total')
+        stats.update(in_flight=in_flight, queue_depth=max(in_flight - self.max_workers, 0),
+                     workers=self.max_workers, max_queue=self.max_queue, method=self.method)
+        return stats
+
+
+def init_passwords(app):
+    app.extensions['password_hasher'] = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        salt_length=app.config.get('PASSWORD_SALT_LENGTH', 16),
+        max_workers=app.config.get('PASSWORD_HASH_WORKERS'),
+        max_queue=app.config.get('PASSWORD_HASH_QUEUE'),
+        retry_after=app.config.get('PASSWORD_HASH_RETRY_AFTER', 1),
+    )
+
+    @app.errorhandler(HasherBusy)
+    def hasher_busy(e):
+        response = jsonify({'message': 'Server busy, please retry shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+
+
+def get_hasher():
+    """The current app's hasher, or a default one outside an application context."""
+    if has_app_context() and 'password_hasher' in current_app.extensions:
+        return current_app.extensions['password_hasher']
+    return _fallback_hasher
+
+
+_fallback_hasher = PasswordHasher()
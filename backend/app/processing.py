@@ -0,0 +1,208 @@
+"""Post-upload processing jobs for resource files.
+
+After an upload is stored the request only enqueues these jobs:
+
+* ``resource.verify_checksum`` re-reads the blob and checks it still hashes to its name;
+* ``resource.probe_metadata`` sniffs the real content type from the file's
+  magic bytes (and counts PDF pages, scanning the file chunk by chunk);
+* ``resource.extract_text`` pulls text out of plain-text and PDF files into
+  ``Resource.text_content`` and the search index.
+
+The jobs may run in any order, so ``extract_text`` sniffs a generic declared
+type itself rather than relying on ``probe_metadata`` having corrected it.
+
+PDF text uses ``pypdf`` when it is installed and otherwise a small built-in
+reader that handles the common case of (optionally Flate-compressed) content
+streams with literal strings. Neither reads a file into memory whole: pypdf
+reads from the open file, and the built-in reader only looks at the first
+``MAX_PDF_TEXT_BYTES``.
+"""
+import hashlib
+import re
+import zlib
+
+from backend.app import cache, db, jobs, search, storage
+from backend.app.models import Resource
+
+try:
+    import pypdf
+except ImportError:  # optional dependency
+    pypdf = None
+
+MAX_TEXT_CHARS = 200_000 # stored per resource
+SNIFF_BYTES = 8192 # read to detect the content type
+MAX_PDF_TEXT_BYTES = 32 * 1024 * 1024 # read by the built-in PDF text reader
+PAGE_SCAN_OVERLAP = 1024 # bytes carried between chunks so page markers split across them still match
+
+# (offset, signature, mime type)
+MAGIC_NUMBERS = (
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'ID3', 'audio/mpeg'),
+    (4, b'ftyp', 'video/mp4'),
+)
+
+UPLOAD_JOBS = ('resource.verify_checksum', 'resource.probe_metadata', 'resource.extract_text')
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+def enqueue_upload_jobs(resource):
+    """Queue the processing jobs for a newly stored resource in the current transaction."""
+    return [jobs.enqueue(kind, {'resource_id': resource.id}) for kind in UPLOAD_JOBS]
+
+
+def _stored_resource(payload):
+    resource = db.session.get(Resource, payload['resource_id'])
+    if resource is None or not resource.sha256:
+        return None
+    return resource
+
+
+def _open(resource):
+    return open(storage.get_store().path_for(resource.sha256), 'rb')
+
+
+def _read(resource, limit):
+    with _open(resource) as f:
+        return f.read(limit)
+
+
+def sniff_mime_type(head):
+    for offset, signature, mime_type in MAGIC_NUMBERS:
+        if head[offset:offset + len(signature)] == signature:
+            return mime_type
+    if not head:
+        return None
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        if e.start < len(head) - 3:  # not just a multi-byte character cut off at the end
+            return None
+    return None if b'\x00' in head else 'text/plain'
+
+
+@jobs.handler('resource.verify_checksum')
+def verify_checksum(payload):
+    resource = _stored_resource(payload)
+    if resource is None:
+        return {'skipped': 'resource deleted or not a stored file'}
+    store = storage.get_store()
+    digest = hashlib.sha256()
+    size = 0
+    with open(store.path_for(resource.sha256), 'rb') as f:
+        for chunk in iter(lambda: f.read(store.chunk_size), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    if digest.hexdigest() != resource.sha256:
+        raise ChecksumMismatch(f'{store.key_for(resource.sha256)} hashes to {digest.hexdigest()}')
+    return {'sha256': resource.sha256, 'size': size}
+
+
+@jobs.handler('resource.probe_metadata')
+def probe_metadata(payload):
+    resource = _stored_resource(payload)
+    if resource is None:
+        return {'skipped': 'resource deleted or not a stored file'}
+    detected = sniff_mime_type(_read(resource, SNIFF_BYTES))
+    result = {'declared_mime_type': resource.mime_type, 'detected_mime_type': detected}
+    if detected and resource.mime_type in (None, storage.DEFAULT_MIME_TYPE):
+        resource.mime_type = detected
+        cache.invalidate_on_commit(f'topic:{resource.topic_id}')
+    if detected == 'application/pdf':
+        with _open(resource) as f:
+            result['pages'] = count_pdf_pages(f, storage.get_store().chunk_size)
+    return result
+
+
+_PAGE_MARKER = re.compile(rb'/Type\s*/Page(?![s\w])')
+
+
+def count_pdf_pages(f, chunk_size):
+    """Count the page objects in the PDF file `f`, holding at most one chunk (plus overlap) in memory."""
+    pages = 0
+    carried = b''
+    for chunk in iter(lambda: f.read(chunk_size), b''):
+        data = carried + chunk
+        # Markers starting in the last PAGE_SCAN_OVERLAP bytes may be incomplete; count them with the next chunk.
+        end = max(len(data) - PAGE_SCAN_OVERLAP, 0)
+        pages += sum(1 for match in _PAGE_MARKER.finditer(data) if match.start() < end)
+        carried = data[end:]
+    return pages + len(_PAGE_MARKER.findall(carried))
+
+
+def _unescape_pdf_string(raw):
+    escapes = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f', b'(': b'(', b')': b')', b'\\': b'\\'}
+
+    def replace(match):
+        value = match.group(1)
+        if value[:1].isdigit():
+            return bytes([int(value, 8) & 0xFF])
+        return escapes.get(value, value)
+    return re.sub(rb'\\([0-7]{1,3}|.)', replace, raw, flags=re.S)
+
+
+_TEXT_OPERATOR = re.compile(rb'\(((?:\\.|[^\\)])*)\)\s*(?:Tj|\'|")|\[((?:\\.|[^\]])*)\]\s*TJ', re.S)
+_ARRAY_STRING = re.compile(rb'\(((?:\\.|[^\\)])*)\)', re.S)
+
+
+def _builtin_pdf_text(data):
+    lines = []
+    for stream in re.finditer(rb'stream\r?\n(.*?)\r?\nendstream', data, re.S):
+        content = stream.group(1)
+        try:
+            content = zlib.decompress(content)
+        except zlib.error:
+            pass
+        for match in _TEXT_OPERATOR.finditer(content):
+            if match.group(1) is not None:
+                parts = [match.group(1)]
+            else:
+                parts = _ARRAY_STRING.findall(match.group(2))
+            text = b''.join(_unescape_pdf_string(part) for part in parts)
+            lines.append(text.decode('latin-1'))
+    return '\n'.join(lines)
+
+
+def pdf_text(f):
+    """Text of the PDF file `f`, stopping once ``MAX_TEXT_CHARS`` are collected."""
+    if pypdf is None:
+        return _builtin_pdf_text(f.read(MAX_PDF_TEXT_BYTES))
+    pages = []
+    length = 0
+    for page in pypdf.PdfReader(f).pages:
+        pages.append(page.extract_text() or '')
+        length += len(pages[-1])
+        if length >= MAX_TEXT_CHARS:
+            break
+    return '\n'.join(pages)
+
+
+@jobs.handler('resource.extract_text')
+def extract_text(payload):
+    resource = _stored_resource(payload)
+    if resource is None:
+        return {'skipped': 'resource deleted or not a stored file'}
+    mime_type = resource.mime_type
+    if mime_type in (None, storage.DEFAULT_MIME_TYPE):
+        mime_type = sniff_mime_type(_read(resource, SNIFF_BYTES)) or mime_type
+    mime_type = mime_type or ''
+    if mime_type == 'application/pdf':
+        with _open(resource) as f:
+            text = pdf_text(f)
+    elif mime_type.startswith('text/') or mime_type in ('application/json', 'application/xml'):
+        text = _read(resource, MAX_TEXT_CHARS * 4).decode('utf-8', errors='replace')
+    else:
+        return {'skipped': f'no text extractor for {mime_type or "unknown type"}'}
+
+    text = ' '.join(text.split())[:MAX_TEXT_CHARS]
+    resource.text_content = text
+    db.session.flush()
+    search.index_resource(resource)
+    return {'characters': len(text)}
@@ -1,20 +1,37 @@
-import os
+from datetime import datetime, timezone
 from functools import wraps
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, abort, current_app, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt
+from sqlalchemy import exists, select
 from werkzeug.utils import secure_filename
-from backend.app import db
-from backend.app.models import Course, Module, Topic, Resource
+from backend.app import analytics, badges, cache, completion, db, deletion, exports, importer, instrumentation, jobs, processing, search, storage
+from backend.app.identity import forget_identity, is_revoked, revoke_tokens
+from backend.app.passwords import get_hasher
+from backend.app.cache import cached
+from backend.app.catalog import conditional
+from backend.app.serialization import FieldSet
+from backend.app.pagination import MAX_LIMIT, InvalidCursor, Keyset, link_next_page, paginate, read_page
+from backend.app.models import Course, Module, Topic, Resource, User, Job, user_topic_progress
 
 bp = Blueprint('admin', __name__)
 
+COURSE_LIST_FIELDS = FieldSet(id=Course.id, name=Course.name, description=Course.description)
+USER_LIST_FIELDS = FieldSet(id=User.id, username=User.username, email=User.email, role=User.role)
+COURSE_KEYSET = Keyset(COURSE_LIST_FIELDS, 'id')
+USER_KEYSET = Keyset(USER_LIST_FIELDS, 'id')
+PROGRESS_USER_FIELDS = FieldSet(id=User.id)
+PROGRESS_USER_KEYSET = Keyset(PROGRESS_USER_FIELDS, 'id')
+
 def admin_required(fn):
     @wraps(fn)
     @jwt_required()
     def wrapper(*args, **kwargs):
-        identity = get_jwt_identity()
-        if identity.get('role') != 'admin':
+        # The role claim is trusted because role changes revoke older tokens
+        if get_jwt().get('role') != 'admin':
             return jsonify({'message': 'Admins only!'}), 403
+        # ...but another worker may have revoked it after this one cached the user
+        if is_revoked(get_jwt(), fresh=True):
+            return jsonify({'msg': 'Token has been revoked'}), 401
         return fn(*args, **kwargs)
     return wrapper
 
@@ -33,16 +50,24 @@ def create_course():
     course = Course(name=data['name'], description=data.get('description', ''))
     db.session.add(course)
     db.session.commit()
+    cache.invalidate('courses')
     return jsonify({'message': 'Course created successfully', 'id': course.id}), 201
 
 @bp.route('/courses', methods=['GET'])
 @jwt_required() # Any logged in user can see courses
+@cached('courses')
+@conditional('courses')
 def get_courses():
-    courses = Course.query.all()
-    return jsonify([{'id': c.id, 'name': c.name, 'description': c.description} for c in courses])
+    """Courses by id, `limit` per page; `?name=` keeps those whose name starts with it."""
+    criteria = []
+    if request.args.get('name'):
+        criteria.append(Course.name.startswith(request.args['name'], autoescape=True))
+    return paginate(COURSE_LIST_FIELDS, COURSE_KEYSET, *criteria)
 
 @bp.route('/courses/<int:id>', methods=['GET'])
 @jwt_required() # Any logged in user can see a course
+@cached('course:{id}')
+@conditional('courses')
 def get_course(id):
     course = Course.query.get_or_404(id)
     return jsonify({'id': course.id, 'name': course.name, 'description': course.description})
@@ -57,14 +82,18 @@ def update_course(id):
     if 'description' in data:
         course.description = data['description']
     db.session.commit()
+    cache.invalidate('courses', f'course:{id}')
     return jsonify({'message': 'Course updated successfully'})
 
 @bp.route('/courses/<int:id>', methods=['DELETE'])
 @admin_required
 def delete_course(id):
-    course = Course.query.get_or_404(id)
-    db.session.delete(course)
+    Course.query.get_or_404(id)
+    # Set-based: nothing below the course is loaded, and files go after commit
+    deleted = deletion.delete_courses([id])
     db.session.commit()
+    cache.invalidate('courses', f'course:{id}', f'course:{id}:modules',
+                     *(f'module:{m}:topics' for m in deleted['modules']), *(f'topic:{t}' for t in deleted['topics']))
     return jsonify({'message': 'Course deleted successfully'})
 
 # -- Module Management --
@@ -80,6 +109,7 @@ def create_module(course_id):
     module = Module(name=data['name'], description=data.get('description', ''), course_id=course.id)
     db.session.add(module)
     db.session.commit()
+    cache.invalidate(f'course:{course.id}:modules')
     return jsonify({'message': 'Module created successfully', 'id': module.id}), 201
 
 @bp.route('/modules/<int:id>', methods=['PUT'])
@@ -92,14 +122,17 @@ def update_module(id):
     if 'description' in data:
         module.description = data['description']
     db.session.commit()
+    cache.invalidate(f'course:{module.course_id}:modules')
     return jsonify({'message': 'Module updated successfully'})
 
 @bp.route('/modules/<int:id>', methods=['DELETE'])
 @admin_required
 def delete_module(id):
     module = Module.query.get_or_404(id)
-    db.session.delete(module)
+    course_id = module.course_id
+    deleted = deletion.delete_modules([id])
     db.session.commit()
+    cache.invalidate(f'course:{course_id}:modules', f'module:{id}:topics', *(f'topic:{t}' for t in deleted['topics']))
     return jsonify({'message': 'Module deleted successfully'})
 
 # -- Topic Management --
@@ -114,7 +147,12 @@ def create_topic(module_id):
 
     topic = Topic(name=data['name'], content=data.get('content', ''), module_id=module.id)
     db.session.add(topic)
+    completion.topic_added(module)
+    db.session.flush()
+    search.index_topic(topic)
+    badges.schedule_recompute([module.id])
     db.session.commit()
+    cache.invalidate(f'module:{module.id}:topics')
     return jsonify({'message': 'Topic created successfully', 'id': topic.id}), 201
 
 @bp.route('/topics/<int:id>', methods=['PUT'])
@@ -126,22 +164,64 @@ def update_topic(id):
         topic.name = data['name']
     if 'content' in data:
         topic.content = data['content']
+    search.index_topic(topic)
     db.session.commit()
+    cache.invalidate(f'topic:{id}', f'module:{topic.module_id}:topics')
     return jsonify({'message': 'Topic updated successfully'})
 
 @bp.route('/topics/<int:id>', methods=['DELETE'])
 @admin_required
 def delete_topic(id):
     topic = Topic.query.get_or_404(id)
-    db.session.delete(topic)
+    module_id = topic.module_id
+    deletion.delete_topics([id])
+    badges.schedule_recompute([module_id])
     db.session.commit()
+    cache.invalidate(f'topic:{id}', f'module:{module_id}:topics')
     return jsonify({'message': 'Topic deleted successfully'})
 
+# -- Bulk Import --
+
+@bp.route('/import', methods=['POST'])
+@admin_required
+def import_catalog():
+    """
+    Upserts a nested courses/modules/topics document in one transaction.
+
+    Accepts JSON (`{"courses": [...]}`) or NDJSON with one course per line
+    (`Content-Type: application/x-ndjson`). `?dry_run=1` validates and
+    reports counts without keeping any changes.
+    """
+    dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            courses = list(importer.parse_ndjson(iter(request.stream.readline, b'')))
+        else:
+            data = request.get_json(silent=True)
+            courses = data.get('courses') if isinstance(data, dict) else data
+        importer.validate(courses)
+    except importer.ImportValidationError as e:
+        return jsonify({'message': 'Invalid import document', 'errors': e.errors[:100]}), 400
+
+    report = importer.import_catalog(courses, dry_run=dry_run)
+    course_ids, module_ids, topic_ids = report.pop('course_ids'), report.pop('module_ids'), report.pop('topic_ids')
+    if report['topics_created']:
+        badges.schedule_recompute(module_ids)
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+        cache.invalidate('courses', *(f'course:{c}' for c in course_ids), *(f'course:{c}:modules' for c in course_ids),
+                         *(f'module:{m}:topics' for m in module_ids), *(f'topic:{t}' for t in topic_ids))
+    report['dry_run'] = dry_run
+    return jsonify(report), 200 if dry_run else 201
+
 # -- Resource Management --
 
 @bp.route('/topics/<int:topic_id>/resources', methods=['POST'])
 @admin_required
 def upload_resource(topic_id):
+    Topic.query.get_or_404(topic_id)
     if 'file' not in request.files:
         return jsonify({'message': 'No file part'}), 400
 
@@ -151,10 +231,8 @@ def upload_resource(topic_id):
 
     if file:
         filename = secure_filename(file.filename)
-        # Ensure the upload folder exists
-        os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(file_path)
+        # Streams the file into the content-addressed store
+        stored = storage.store_upload(file)
 
         # Get metadata from form
         name = request.form.get('name', filename)
@@ -163,13 +241,28 @@ def upload_resource(topic_id):
         new_resource = Resource(
             name=name,
             resource_type=resource_type,
-            path_or_url=file_path,
-            topic_id=topic_id
+            path_or_url=stored['path'],
+            topic_id=topic_id,
+            sha256=stored['sha256'],
+            size=stored['size'],
+            mime_type=stored['mime_type']
         )
         db.session.add(new_resource)
+        db.session.flush()
+        search.index_resource(new_resource)
+        # Checksum, metadata and text extraction run in the background
+        queued = processing.enqueue_upload_jobs(new_resource)
         db.session.commit()
+        cache.invalidate(f'topic:{topic_id}')
 
-        return jsonify({'message': 'Resource uploaded successfully', 'id': new_resource.id}), 201
+        return jsonify({
+            'message': 'Resource uploaded successfully',
+            'id': new_resource.id,
+            'sha256': new_resource.sha256,
+            'size': new_resource.size,
+            'mime_type': new_resource.mime_type,
+            'jobs': [job.id for job in queued]
+        }), 201
 
     return jsonify({'message': 'File upload failed'}), 400
 
@@ -178,16 +271,17 @@ def upload_resource(topic_id):
 def delete_resource(id):
     resource = Resource.query.get_or_404(id)
 
-    # Delete the physical file
-    try:
-        if os.path.exists(resource.path_or_url):
-            os.remove(resource.path_or_url)
-    except Exception as e:
-        # Log the error but proceed with DB deletion
-        print(f"Error deleting file {resource.path_or_url}: {e}")
-
+    topic_id, sha256, path = resource.topic_id, resource.sha256, resource.path_or_url
+    search.remove_resource(resource.id)
     db.session.delete(resource)
+    db.session.flush()
+    # The blob's file is removed after commit once no resource references it;
+    # files uploaded before the blob store existed go after commit as well
+    storage.release([sha256])
+    if not sha256:
+        storage.discard_files([path])
     db.session.commit()
+    cache.invalidate(f'topic:{topic_id}')
 
     return jsonify({'message': 'Resource deleted successfully'})
 
@@ -196,10 +290,187 @@ def delete_resource(id):
 @bp.route('/users', methods=['GET'])
 @admin_required
 def get_users():
-    users = User.query.all()
-    return jsonify([{
-        'id': user.id,
-        'username': user.username,
-        'email': user.email,
-        'role': user.role
-    } for user in users])
+    """Users by id, `limit` per page; `?role=student|admin` filters by role."""
+    criteria = []
+    if request.args.get('role'):
+        if request.args['role'] not in ('student', 'admin'):
+            return jsonify({'message': 'Invalid role'}), 400
+        criteria.append(User.role == request.args['role'])
+    return paginate(USER_LIST_FIELDS, USER_KEYSET, *criteria)
+
+@bp.route('/export/<name>', methods=['GET'])
+@admin_required
+def export(name):
+    """
+    Streams `users`, `completions` or `badges` as NDJSON (default) or `?format=csv`.
+
+    `since` (ISO 8601) limits the export to rows from that time on; pass the
+    previous response's `X-Export-Until` to pull only what is new.
+    """
+    if name not in exports.EXPORTS:
+        return jsonify({'message': f"Unknown export; choose one of {', '.join(exports.EXPORTS)}"}), 404
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in exports.FORMATS:
+        return jsonify({'message': 'format must be ndjson or csv'}), 400
+    since = None
+    if request.args.get('since'):
+        try:
+            since = exports.parse_since(request.args['since'])
+        except ValueError:
+            return jsonify({'message': 'since must be an ISO 8601 timestamp'}), 400
+
+    until = datetime.now(timezone.utc)
+    body = exports.stream_export(name, fmt, since=since, until=until)
+    response = current_app.response_class(stream_with_context(body), mimetype=exports.FORMATS[fmt])
+    response.headers['X-Export-Until'] = until.isoformat()
+    response.headers['Content-Disposition'] = f'attachment; filename={name}.{fmt}'
+    return response
+
+@bp.route('/users/<int:id>', methods=['PUT'])
+@admin_required
+def update_user(id):
+    """Changes a user's role; `revoke_tokens: true` logs them out everywhere without one."""
+    user = User.query.get_or_404(id)
+    data = request.get_json() or {}
+    if 'role' in data:
+        if data['role'] not in ('student', 'admin'):
+            return jsonify({'message': 'Role must be student or admin'}), 400
+        if data['role'] != user.role:
+            user.role = data['role']
+            revoke_tokens(user)
+    if data.get('revoke_tokens'):
+        revoke_tokens(user)
+    db.session.commit()
+    forget_identity(user.id)
+    return jsonify({'message': 'User updated successfully'})
+
+@bp.route('/progress/summary', methods=['GET'])
+@admin_required
+def get_cohort_progress_summary():
+    """
+    Per-user course and module completion for `user_ids` (comma separated, at most MAX_LIMIT).
+
+    Without `user_ids`, every user with progress, by id, `limit` per page.
+    """
+    cursor = None
+    if request.args.get('user_ids'):
+        try:
+            user_ids = [int(i) for i in request.args['user_ids'].split(',')]
+        except ValueError:
+            return jsonify({'message': 'user_ids must be a comma separated list of ids'}), 400
+        if len(user_ids) > MAX_LIMIT:
+            return jsonify({'message': f'At most {MAX_LIMIT} user_ids at a time'}), 400
+    else:
+        try:
+            page, cursor = read_page(PROGRESS_USER_FIELDS, PROGRESS_USER_KEYSET,
+                                     exists().where(user_topic_progress.c.user_id == User.id))
+        except InvalidCursor:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        user_ids = [user['id'] for user in page]
+    summary = completion.cohort_progress_summary(user_ids)
+    return link_next_page(jsonify(list(summary.values())), cursor)
+
+def _analytics_window():
+    """The `from`/`to` dates of an analytics request; raises ValueError when malformed."""
+    return analytics.parse_day(request.args.get('from')), analytics.parse_day(request.args.get('to'))
+
+def _analytics_limit():
+    return min(max(request.args.get('limit', analytics.DEFAULT_LIMIT, type=int), 1), analytics.MAX_LIMIT)
+
+@bp.route('/analytics/completions', methods=['GET'])
+@admin_required
+def get_completion_rankings():
+    """The most completed topics, modules or courses (`scope`) between `from` and `to`, read from the rollups."""
+    scope = request.args.get('scope', 'topic')
+    if scope not in analytics.SCOPES:
+        return jsonify({'message': f"scope must be one of {', '.join(analytics.SCOPES)}"}), 400
+    try:
+        since, until = _analytics_window()
+    except ValueError:
+        return jsonify({'message': 'from and to must be ISO 8601 dates'}), 400
+    return jsonify(analytics.top_items(scope, since=since, until=until, limit=_analytics_limit()))
+
+@bp.route('/analytics/activity', methods=['GET'])
+@admin_required
+def get_learning_activity():
+    """Completions and distinct active learners per `period` (day or month) between `from` and `to`."""
+    period = request.args.get('period', 'day')
+    if period not in ('day', 'month'):
+        return jsonify({'message': 'period must be day or month'}), 400
+    try:
+        since, until = _analytics_window()
+    except ValueError:
+        return jsonify({'message': 'from and to must be ISO 8601 dates'}), 400
+    return jsonify(analytics.activity(period, since=since, until=until))
+
+@bp.route('/analytics/leaderboard', methods=['GET'])
+@admin_required
+def get_leaderboard():
+    """The top learners `by` completions or badges."""
+    by = request.args.get('by', 'completions')
+    if by not in analytics.LEADERBOARDS:
+        return jsonify({'message': 'by must be completions or badges'}), 400
+    return jsonify(analytics.leaderboard(by, limit=_analytics_limit()))
+
+@bp.route('/badges/recompute', methods=['POST'])
+@admin_required
+def recompute_badges():
+    """Queue a badge recompute for `module_ids` (default: every module); poll the job for progress."""
+    data = request.get_json(silent=True) or {}
+    module_ids = data.get('module_ids')
+    if module_ids is not None and (not isinstance(module_ids, list)
+                                   or not all(isinstance(m, int) and not isinstance(m, bool) for m in module_ids)):
+        return jsonify({'message': 'module_ids must be a list of module ids'}), 400
+    job = badges.schedule_recompute(module_ids)
+    db.session.commit()
+    return jsonify(jobs.to_dict(job)), 202
+
+@bp.route('/cache/stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    return jsonify(cache.get_cache().stats())
+
+@bp.route('/passwords/stats', methods=['GET'])
+@admin_required
+def get_password_hasher_stats():
+    return jsonify(get_hasher().stats())
+
+# -- Background Jobs --
+
+@bp.route('/jobs', methods=['GET'])
+@admin_required
+def get_jobs():
+    """The 100 most recent jobs, optionally filtered by `status` and `kind`."""
+    query = select(Job).order_by(Job.id.desc()).limit(100)
+    if request.args.get('status'):
+        query = query.where(Job.status == request.args['status'])
+    if request.args.get('kind'):
+        query = query.where(Job.kind == request.args['kind'])
+    return jsonify([jobs.to_dict(job) for job in db.session.execute(query).scalars()])
+
+@bp.route('/jobs/<int:id>', methods=['GET'])
+@admin_required
+def get_job(id):
+    return jsonify(jobs.to_dict(db.session.get(Job, id) or abort(404)))
+
+@bp.route('/jobs/<int:id>/retry', methods=['POST'])
+@admin_required
+def retry_job(id):
+    job = db.session.get(Job, id) or abort(404)
+    if job.status != 'failed':
+        return jsonify({'message': 'Only failed jobs can be retried'}), 409
+    job.status, job.attempts, job.error, job.finished_at = 'queued', 0, None, None
+    job.run_after = datetime.now(timezone.utc)
+    db.session.info['jobs_enqueued'] = True
+    db.session.commit()
+    return jsonify(jobs.to_dict(job))
+
+@bp.route('/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    """Per-endpoint latency, DB time and SQL statement histograms since the process started."""
+    return jsonify({
+        'endpoints': instrumentation.get_metrics(),
+        'cache': cache.get_cache().stats(),
+        'password_hasher': get_hasher().stats(),
+    })
@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 from backend.app import db
 from backend.app.models import User
-from flask_jwt_extended import create_access_token
+from backend.app.identity import issue_token
 
 bp = Blueprint('auth', __name__)
 
@@ -35,5 +35,10 @@ def login():
     if user is None or not user.check_password(data['password']):
         return jsonify({'message': 'Invalid username or password'}), 401
 
-    access_token = create_access_token(identity={'username': user.username, 'role': user.role})
+    # Upgrade hashes made with an older method or cost while we have the plain password
+    if user.password_needs_rehash():
+        user.set_password(data['password'])
+        db.session.commit()
+
+    access_token = issue_token(user)
     return jsonify(access_token=access_token)
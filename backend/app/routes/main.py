@@ -1,7 +1,14 @@
-from flask import Blueprint, jsonify, request
+from datetime import datetime, timezone
+from flask import Blueprint, abort, jsonify, request, url_for
 from flask_jwt_extended import jwt_required
+from sqlalchemy import select
+from backend.app import db, search as search_index, storage, suggest, sync
+from backend.app.serialization import FieldSet, exists
+from backend.app.pagination import Keyset, paginate
+from backend.app.cache import cached
+from backend.app.catalog import conditional
+from backend.app.database import use_replica
 from backend.app.models import Course, Module, Topic, NewsArticle, Event, Resource
-from sqlalchemy import or_
 
 bp = Blueprint('main', __name__)
 
@@ -12,22 +19,98 @@ def ping():
     """
     return jsonify({'message': 'pong!'})
 
+MODULE_LIST_FIELDS = FieldSet(id=Module.id, name=Module.name, description=Module.description)
+TOPIC_LIST_FIELDS = FieldSet(id=Topic.id, name=Topic.name)
+NEWS_FIELDS = FieldSet(id=NewsArticle.id, title=NewsArticle.title, content=NewsArticle.content,
+                       created_at=NewsArticle.created_at)
+EVENT_FIELDS = FieldSet(id=Event.id, title=Event.title, description=Event.description, event_date=Event.event_date)
+NEWS_KEYSET = Keyset(NEWS_FIELDS, 'created_at', 'id', descending=True)
+EVENT_KEYSET = Keyset(EVENT_FIELDS, 'event_date', 'id')
+# Articles carry their full content, so news pages are smaller
+NEWS_PAGE_SIZE = 20
+MAX_NEWS_PAGE_SIZE = 100
+
 @bp.route('/courses/<int:id>/modules', methods=['GET'])
 @jwt_required()
+@cached('course:{id}:modules')
+@conditional('courses', 'modules')
 def get_course_modules(id):
-    course = Course.query.get_or_404(id)
-    modules = course.modules.all()
-    return jsonify([{'id': m.id, 'name': m.name, 'description': m.description} for m in modules])
+    if not exists(Course.id == id):
+        abort(404)
+    return jsonify(MODULE_LIST_FIELDS.all(Module.course_id == id, order_by=Module.id))
+
+TREE_TOPIC_FIELDS = {'id': Topic.id, 'name': Topic.name, 'content': Topic.content}
+
+@bp.route('/courses/<int:id>/tree', methods=['GET'])
+@jwt_required()
+@use_replica
+@conditional('courses', 'modules', 'topics', 'resources')
+def get_course_tree(id):
+    """
+    Returns a course with its modules, topics and resource summaries.
+
+    `depth` limits how far down the tree to go (1: modules, 2: topics,
+    3: resources) and `fields` picks the topic columns to return, so the
+    whole tree is loaded in at most four queries regardless of its size.
+    """
+    depth = min(max(request.args.get('depth', 3, type=int), 0), 3)
+    fields = [f for f in request.args.get('fields', 'id,name').split(',') if f in TREE_TOPIC_FIELDS]
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+
+    course = db.session.get(Course, id) or abort(404)
+    tree = {'id': course.id, 'name': course.name, 'description': course.description}
+    if depth < 1:
+        return jsonify(tree)
+
+    module_ids = select(Module.id).where(Module.course_id == course.id)
+    modules = db.session.execute(
+        select(Module.id, Module.name, Module.description)
+        .where(Module.course_id == course.id).order_by(Module.id)
+    ).all()
+    tree['modules'] = [{'id': m.id, 'name': m.name, 'description': m.description} for m in modules]
+    if depth < 2:
+        return jsonify(tree)
+
+    topics_by_module = {m['id']: m.setdefault('topics', []) for m in tree['modules']}
+    topic_columns = [TREE_TOPIC_FIELDS[f] for f in fields]
+    topics = db.session.execute(
+        select(Topic.module_id, *topic_columns)
+        .where(Topic.module_id.in_(module_ids)).order_by(Topic.id)
+    ).all()
+    topics_by_id = {}
+    for row in topics:
+        topic = {f: getattr(row, f) for f in fields}
+        topics_by_module[row.module_id].append(topic)
+        topics_by_id[topic['id']] = topic
+    if depth < 3:
+        return jsonify(tree)
+
+    for topic in topics_by_id.values():
+        topic['resources'] = []
+    resources = db.session.execute(
+        select(Resource.id, Resource.name, Resource.resource_type, Resource.topic_id)
+        .join(Topic, Resource.topic_id == Topic.id)
+        .where(Topic.module_id.in_(module_ids)).order_by(Resource.id)
+    ).all()
+    for r in resources:
+        topics_by_id[r.topic_id]['resources'].append(
+            {'id': r.id, 'name': r.name, 'resource_type': r.resource_type})
+    return jsonify(tree)
 
 @bp.route('/modules/<int:id>/topics', methods=['GET'])
 @jwt_required()
+@cached('module:{id}:topics')
+@conditional('modules', 'topics')
 def get_module_topics(id):
-    module = Module.query.get_or_404(id)
-    topics = module.topics.all()
-    return jsonify([{'id': t.id, 'name': t.name} for t in topics])
+    if not exists(Module.id == id):
+        abort(404)
+    return jsonify(TOPIC_LIST_FIELDS.all(Topic.module_id == id, order_by=Topic.id))
 
 @bp.route('/topics/<int:id>', methods=['GET'])
 @jwt_required()
+@cached('topic:{id}')
+@conditional('topics', 'resources')
 def get_topic_details(id):
     topic = Topic.query.get_or_404(id)
     resources = topic.resources.all()
@@ -35,38 +118,96 @@ def get_topic_details(id):
         'id': topic.id,
         'name': topic.name,
         'content': topic.content,
-        'resources': [{'id': r.id, 'name': r.name, 'resource_type': r.resource_type, 'path_or_url': r.path_or_url} for r in resources]
+        'resources': [{
+            'id': r.id,
+            'name': r.name,
+            'resource_type': r.resource_type,
+            # Uploaded files are served by get_resource_content rather than exposing their server path
+            'path_or_url': url_for('main.get_resource_content', id=r.id) if storage.is_stored_file(r) else r.path_or_url,
+            'size': r.size,
+            'mime_type': r.mime_type
+        } for r in resources]
     })
 
+@bp.route('/resources/<int:id>/content', methods=['GET'])
+@jwt_required()
+def get_resource_content(id):
+    resource = db.session.get(Resource, id) or abort(404)
+    if not storage.is_stored_file(resource):
+        return jsonify({'message': 'Resource is an external link', 'url': resource.path_or_url}), 404
+    return storage.send_resource(resource)
+
+def _start_of_today():
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+
+def _today():
+    return _start_of_today().date()
+
+def _parse_date_arg(value):
+    """An ISO 8601 date or timestamp as naive UTC, the way event dates are stored."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
 @bp.route('/news', methods=['GET'])
+@cached('news')
+@conditional('news_articles')
 def get_news():
-    articles = NewsArticle.query.order_by(NewsArticle.created_at.desc()).all()
-    return jsonify([{'id': a.id, 'title': a.title, 'content': a.content, 'created_at': a.created_at.isoformat()} for a in articles])
+    """Newest first, `limit` per page; follow `X-Next-Cursor` / the `Link` header for more."""
+    return paginate(NEWS_FIELDS, NEWS_KEYSET, default_limit=NEWS_PAGE_SIZE, max_limit=MAX_NEWS_PAGE_SIZE)
 
 @bp.route('/events', methods=['GET'])
+@cached('events', vary=_today)
+@conditional('events', vary=_today)
 def get_events():
-    events = Event.query.order_by(Event.event_date.asc()).all()
-    return jsonify([{'id': e.id, 'title': e.title, 'description': e.description, 'event_date': e.event_date.isoformat()} for e in events])
+    """
+    Events dated in `[from, to)`, soonest first, paginated like /news.
+
+    Without `from` only today's and later events are listed.
+    """
+    try:
+        start = _parse_date_arg(request.args['from']) if request.args.get('from') else _start_of_today()
+        end = _parse_date_arg(request.args['to']) if request.args.get('to') else None
+    except ValueError:
+        return jsonify({'message': 'from and to must be ISO 8601 dates'}), 400
+    criteria = [Event.event_date >= start]
+    if end is not None:
+        criteria.append(Event.event_date < end)
+    return paginate(EVENT_FIELDS, EVENT_KEYSET, *criteria)
+
+@bp.route('/sync', methods=['GET'])
+@jwt_required()
+@use_replica
+def sync_feed():
+    """
+    Catalog, news and event records created, changed or deleted since `since`.
+
+    `since` is the `cursor` of the previous page (omit it for a full
+    download); keep fetching while `has_more` is true.
+    """
+    try:
+        since = sync.decode_cursor(request.args.get('since'))
+    except ValueError:
+        return jsonify({'message': 'Invalid sync cursor'}), 400
+    limit = min(max(request.args.get('limit', sync.DEFAULT_PAGE_SIZE, type=int), 1), sync.MAX_PAGE_SIZE)
+    return jsonify(sync.changes_since(since, limit=limit))
 
 @bp.route('/search', methods=['GET'])
 @jwt_required()
+@use_replica
 def search():
     query = request.args.get('q', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
     if not query:
-        return jsonify([])
-
-    search_term = f"%{query}%"
+        return jsonify({'results': [], 'total': 0, 'page': page, 'per_page': per_page})
 
-    topics = Topic.query.filter(or_(Topic.name.ilike(search_term), Topic.content.ilike(search_term))).all()
-    resources = Resource.query.filter(Resource.name.ilike(search_term)).all()
+    total, results = search_index.search(query, page=page, per_page=per_page)
+    return jsonify({'results': results, 'total': total, 'page': page, 'per_page': per_page})
 
-    results = []
-    for topic in topics:
-        results.append({'id': topic.id, 'name': topic.name, 'type': 'topic', 'url': f'#/topics/{topic.id}'})
-
-    for resource in resources:
-        # Avoid duplicating topics if a resource and its parent topic are both found
-        if not any(r['id'] == resource.topic_id and r['type'] == 'topic' for r in results):
-             results.append({'id': resource.id, 'name': resource.name, 'type': 'resource', 'url': f'#/topics/{resource.topic_id}'})
-
-    return jsonify(results)
+@bp.route('/search/suggest', methods=['GET'])
+@jwt_required()
+def search_suggest():
+    """Typeahead: the most popular course, module, topic and resource names with a word starting with `prefix`."""
+    prefix = request.args.get('prefix', '')
+    limit = min(max(request.args.get('limit', suggest.DEFAULT_LIMIT, type=int), 1), suggest.MAX_LIMIT)
+    return jsonify({'prefix': prefix, 'suggestions': suggest.suggest(prefix, limit=limit)})
@@ -1,63 +1,103 @@
-from flask import Blueprint, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime, timezone
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required
 from backend.app import db
-from backend.app.models import User, Topic, Badge, Module
+from sqlalchemy import select
+from backend.app.completion import complete_topic, complete_topics, progress_summary
+from backend.app.database import use_replica
+from backend.app.identity import current_user_id
+from backend.app.models import Badge, Topic, user_badge_association, user_topic_progress
 
 bp = Blueprint('progress', __name__)
 
-def check_and_award_badge(user, module):
-    """Checks if a user has completed all topics in a module and awards a badge."""
-    module_topics = set(t.id for t in module.topics)
-    completed_topics = set(t.id for t in user.completed_topics)
-
-    if module_topics.issubset(completed_topics):
-        badge_name = f"Module Master - {module.name}"
-        badge = Badge.query.filter_by(name=badge_name).first()
-        if not badge:
-            badge = Badge(name=badge_name, description=f"Completed all topics in the {module.name} module.", icon="🏆")
-            db.session.add(badge)
-
-        if badge not in user.badges:
-            user.badges.append(badge)
-            return True
-    return False
+MAX_BATCH_COMPLETIONS = 500
 
 @bp.route('/topics/<int:id>/complete', methods=['POST'])
 @jwt_required()
 def mark_topic_complete(id):
-    username = get_jwt_identity().get('username')
-    user = User.query.filter_by(username=username).first_or_404()
+    user_id = current_user_id()
     topic = Topic.query.get_or_404(id)
 
-    if topic in user.completed_topics:
+    created, badge = complete_topic(user_id, topic)
+    if not created:
         return jsonify({'message': 'Topic already marked as complete.'}), 200
 
-    user.completed_topics.append(topic)
-
-    badge_awarded = check_and_award_badge(user, topic.module)
-
     db.session.commit()
 
     message = f'Topic {id} marked as complete.'
-    if badge_awarded:
-        message += f' Congratulations! You earned the "{badge_awarded.name}" badge!'
+    if badge:
+        message += f' Congratulations! You earned the "{badge.name}" badge!'
 
     return jsonify({'message': message}), 201
 
+def _parse_completed_at(value):
+    """Parses a client timestamp as naive UTC, the way it is stored; missing, invalid or future values mean "now"."""
+    if not isinstance(value, str):
+        return None
+    try:
+        completed_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    completed_at = completed_at.astimezone(timezone.utc) if completed_at.tzinfo else completed_at.replace(tzinfo=timezone.utc)
+    return completed_at.replace(tzinfo=None) if completed_at <= datetime.now(timezone.utc) else None
+
+@bp.route('/topics/complete', methods=['POST'])
+@jwt_required()
+def mark_topics_complete():
+    """
+    Marks a batch of topics complete, e.g. when a mobile client syncs offline work.
+
+    Body: `{"completions": [{"topic_id": 1, "completed_at": "2024-05-01T10:00:00Z"}, 2, ...]}`.
+    """
+    data = request.get_json(silent=True) or {}
+    items = data.get('completions')
+    if not isinstance(items, list) or not items:
+        return jsonify({'message': 'Missing completions'}), 400
+    if len(items) > MAX_BATCH_COMPLETIONS:
+        return jsonify({'message': f'At most {MAX_BATCH_COMPLETIONS} completions per request'}), 400
+
+    completions = {}
+    for item in items:
+        topic_id = item.get('topic_id') if isinstance(item, dict) else item
+        if not isinstance(topic_id, int) or isinstance(topic_id, bool):
+            return jsonify({'message': 'Each completion needs an integer topic_id'}), 400
+        completed_at = _parse_completed_at(item.get('completed_at')) if isinstance(item, dict) else None
+        completions.setdefault(topic_id, completed_at)
+
+    user_id = current_user_id()
+    created, existing, unknown, badges = complete_topics(user_id, completions)
+    db.session.commit()
+
+    return jsonify({
+        'completed_topic_ids': created,
+        'already_completed_topic_ids': existing,
+        'unknown_topic_ids': unknown,
+        'badges': [{'name': b.name, 'description': b.description, 'icon': b.icon} for b in badges]
+    }), 201 if created else 200
+
 @bp.route('/progress', methods=['GET'])
 @jwt_required()
+@use_replica
 def get_user_progress():
-    username = get_jwt_identity().get('username')
-    user = User.query.filter_by(username=username).first_or_404()
+    user_id = current_user_id()
 
-    completed_ids = [topic.id for topic in user.completed_topics]
+    completed_ids = db.session.execute(
+        select(user_topic_progress.c.topic_id).where(user_topic_progress.c.user_id == user_id)
+    ).scalars().all()
     return jsonify({'completed_topic_ids': completed_ids})
 
+@bp.route('/progress/summary', methods=['GET'])
+@jwt_required()
+@use_replica
+def get_user_progress_summary():
+    user_id = current_user_id()
+    return jsonify(progress_summary(user_id))
+
 @bp.route('/badges', methods=['GET'])
 @jwt_required()
+@use_replica
 def get_user_badges():
-    username = get_jwt_identity().get('username')
-    user = User.query.filter_by(username=username).first_or_404()
+    user_id = current_user_id()
 
-    badges = user.badges.all()
+    badges = Badge.query.join(user_badge_association).filter(user_badge_association.c.user_id == user_id).all()
     return jsonify([{'name': b.name, 'description': b.description, 'icon': b.icon} for b in badges])
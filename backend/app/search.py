@@ -0,0 +1,391 @@
+"""Full-text search over topics and resources.
+
+Two backends share one interface: an SQLite FTS5 virtual table that lives in
+the application database, and a pure-Python inverted index used when FTS5 is
+not available (or when ``SEARCH_BACKEND`` is set to ``'memory'``).
+
+Index writes follow the transaction they belong to: FTS5 rows are written in
+it, and the in-memory index only applies a session's changes once it commits.
+"""
+import bisect
+import math
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy import event, text
+
+from backend.app import db
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+SNIPPET_TOKENS = 12
+SNIPPET_CHARS = 80
+NAME_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+
+def tokenize(value):
+    return TOKEN_RE.findall((value or '').lower())
+
+
+def _doc_rowid(kind, ref_id):
+    # Topics and resources share one index; interleave their ids so every
+    # document has a stable rowid that can be replaced in place.
+    return ref_id * 2 if kind == 'topic' else ref_id * 2 + 1
+
+
+def _hit(kind, ref_id, name, topic_id, snippet, score):
+    return {
+        'id': ref_id,
+        'name': name,
+        'type': kind,
+        'url': f'#/topics/{topic_id}',
+        'snippet': snippet,
+        'score': round(score, 4),
+    }
+
+
+class FTS5SearchIndex:
+    """Search index backed by an SQLite FTS5 table in the app database."""
+
+    name = 'fts5'
+
+    def __init__(self):
+        self._ready = False
+
+    @staticmethod
+    def is_supported(engine):
+        if engine.dialect.name != 'sqlite':
+            return False
+        # Probe on a throwaway connection so an in-flight session transaction
+        # on the (possibly shared) app connection is never disturbed.
+        probe = sqlite3.connect(':memory:')
+        try:
+            probe.execute("CREATE VIRTUAL TABLE fts5_probe USING fts5(x)")
+        except sqlite3.OperationalError:
+            return False
+        finally:
+            probe.close()
+        return True
+
+    def _ensure(self):
+        """Create and fill the table on first use, in a transaction that is committed.
+
+        Request sessions that only read are never committed, so the table is
+        built on a connection of its own. A session that already wrote holds
+        the database's write lock and builds it itself instead; the index
+        only counts as ready once a later call finds the table committed.
+        """
+        if self._ready:
+            return
+        if db.session.info.get('wrote'):
+            self._create(db.session)
+            return
+        with db.engine.begin() as connection:
+            self._create(connection)
+        self._ready = True
+
+    @classmethod
+    def _create(cls, connection):
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+        )).scalar()
+        if not exists:
+            connection.execute(text(
+                "CREATE VIRTUAL TABLE search_index USING fts5("
+                "name, body, kind UNINDEXED, ref_id UNINDEXED, topic_id UNINDEXED, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+            cls._populate(connection)
+
+    @staticmethod
+    def _populate(connection):
+        connection.execute(text(
+            "INSERT INTO search_index (rowid, name, body, kind, ref_id, topic_id) "
+            "SELECT id * 2, name, coalesce(content, ''), 'topic', id, id FROM topics"
+        ))
+        connection.execute(text(
+            "INSERT INTO search_index (rowid, name, body, kind, ref_id, topic_id) "
+            "SELECT id * 2 + 1, name, coalesce(text_content, ''), 'resource', id, topic_id FROM resources"
+        ))
+
+    def rebuild(self):
+        self._ensure()
+        db.session.execute(text("DELETE FROM search_index"))
+        self._populate(db.session)
+
+    def add(self, kind, ref_id, name, body, topic_id):
+        self.add_many([(kind, ref_id, name, body, topic_id)])
+
+    def add_many(self, docs):
+        """Index ``(kind, ref_id, name, body, topic_id)`` tuples with two executemany statements."""
+        self._ensure()
+        params = [{'rowid': _doc_rowid(kind, ref_id), 'name': name, 'body': body or '', 'kind': kind,
+                   'ref_id': ref_id, 'topic_id': topic_id} for kind, ref_id, name, body, topic_id in docs]
+        if not params:
+            return
+        db.session.execute(text("DELETE FROM search_index WHERE rowid = :rowid"),
+                           [{'rowid': p['rowid']} for p in params])
+        db.session.execute(text(
+            "INSERT INTO search_index (rowid, name, body, kind, ref_id, topic_id) "
+            "VALUES (:rowid, :name, :body, :kind, :ref_id, :topic_id)"
+        ), params)
+
+    def remove(self, kind, ref_id):
+        self._ensure()
+        db.session.execute(text("DELETE FROM search_index WHERE rowid = :rowid"),
+                           {'rowid': _doc_rowid(kind, ref_id)})
+
+    def remove_topics(self, topic_ids):
+        self._ensure()
+        ids = list(topic_ids)
+        if not ids:
+            return
+        params = {f'id{i}': topic_id for i, topic_id in enumerate(ids)}
+        placeholders = ', '.join(f':{key}' for key in params)
+        db.session.execute(text(f"DELETE FROM search_index WHERE topic_id IN ({placeholders})"), params)
+
+    @staticmethod
+    def _match_expression(terms):
+        return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+    def search(self, query, page=1, per_page=20):
+        self._ensure()
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+        match = self._match_expression(terms)
+        # A resource is only listed when its parent topic did not match itself.
+        where = (
+            "search_index MATCH :match AND NOT (kind = 'resource' AND topic_id IN ("
+            "SELECT topic_id FROM search_index WHERE search_index MATCH :match AND kind = 'topic'))"
+        )
+        total = db.session.execute(text(f"SELECT count(*) FROM search_index WHERE {where}")
+                                   .execution_options(readonly=True), {'match': match}).scalar()
+        rows = db.session.execute(text(
+            "SELECT kind, ref_id, name, topic_id, "
+            f"snippet(search_index, -1, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS snippet, "
+            f"bm25(search_index, {NAME_WEIGHT}, {BODY_WEIGHT}) AS rank "
+            f"FROM search_index WHERE {where} ORDER BY rank LIMIT :limit OFFSET :offset"
+        ).execution_options(readonly=True), {'match': match, 'limit': per_page, 'offset': (page - 1) * per_page})
+        return total, [_hit(r.kind, r.ref_id, r.name, r.topic_id, r.snippet, -r.rank) for r in rows]
+
+
+class MemorySearchIndex:
+    """Pure-Python inverted index with BM25 ranking and prefix matching.
+
+    The index is built from the database the first time it is used in a
+    process and is then kept up to date by the admin routes. Their changes
+    are queued on the session and applied by :meth:`apply` after it commits.
+    """
+
+    name = 'memory'
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._loaded = False
+        self._docs = {}
+        self._postings = defaultdict(dict)
+        self._terms = []
+        self._by_topic = defaultdict(set)
+        self._total_length = 0
+
+    def _ensure(self):
+        if not self._loaded:
+            self.rebuild()
+
+    def rebuild(self):
+        from backend.app.models import Resource, Topic
+
+        with self._lock:
+            self._reset()
+            self._loaded = True
+            topics = db.session.query(Topic.id, Topic.name, Topic.content).yield_per(1000)
+            for topic_id, name, content in topics:
+                self._add(('topic', topic_id), name, content, topic_id)
+            resources = db.session.query(Resource.id, Resource.name, Resource.text_content,
+                                         Resource.topic_id).yield_per(1000)
+            for resource_id, name, text_content, topic_id in resources:
+                self._add(('resource', resource_id), name, text_content, topic_id)
+
+    def _add(self, key, name, body, topic_id):
+        weights = defaultdict(float)
+        for token in tokenize(name):
+            weights[token] += NAME_WEIGHT
+        for token in tokenize(body):
+            weights[token] += BODY_WEIGHT
+        length = sum(weights.values())
+        self._docs[key] = {'name': name, 'body': body or '', 'topic_id': topic_id, 'length': length}
+        self._total_length += length
+        self._by_topic[topic_id].add(key)
+        for token, weight in weights.items():
+            if token not in self._postings:
+                bisect.insort(self._terms, token)
+            self._postings[token][key] = weight
+
+    def _remove(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        self._total_length -= doc['length']
+        self._by_topic[doc['topic_id']].discard(key)
+        if not self._by_topic[doc['topic_id']]:
+            del self._by_topic[doc['topic_id']]
+        for token in set(tokenize(doc['name'])) | set(tokenize(doc['body'])):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[token]
+                del self._terms[bisect.bisect_left(self._terms, token)]
+
+    def add(self, kind, ref_id, name, body, topic_id):
+        self.add_many([(kind, ref_id, name, body, topic_id)])
+
+    def add_many(self, docs):
+        _pending().extend(('add', tuple(doc)) for doc in docs)
+
+    def remove(self, kind, ref_id):
+        _pending().append(('remove', (kind, ref_id)))
+
+    def remove_topics(self, topic_ids):
+        _pending().extend(('remove_topic', topic_id) for topic_id in topic_ids)
+
+    def apply(self, changes):
+        """Apply committed changes; an index that is not loaded yet will read them from the database."""
+        with self._lock:
+            if not self._loaded:
+                return
+            for op, arg in changes:
+                if op == 'add':
+                    kind, ref_id, name, body, topic_id = arg
+                    self._remove((kind, ref_id))
+                    self._add((kind, ref_id), name, body, topic_id)
+                elif op == 'remove':
+                    self._remove(arg)
+                else:
+                    for key in list(self._by_topic.get(arg, ())):
+                        self._remove(key)
+
+    def _expand(self, term):
+        start = bisect.bisect_left(self._terms, term)
+        end = bisect.bisect_left(self._terms, term + '\uffff')
+        return self._terms[start:end]
+
+    def _snippet(self, doc, terms):
+        body = doc['body'] or doc['name']
+        lowered = body.lower()
+        positions = [lowered.find(term) for term in terms]
+        positions = [p for p in positions if p >= 0]
+        start = max(min(positions) - SNIPPET_CHARS // 2, 0) if positions else 0
+        window = body[start:start + SNIPPET_CHARS]
+        for term in sorted(set(terms), key=len, reverse=True):
+            window = re.sub(r'(?i)\b(%s\w*)' % re.escape(term), r'<mark>\1</mark>', window)
+        prefix = '…' if start > 0 else ''
+        suffix = '…' if start + SNIPPET_CHARS < len(body) else ''
+        return prefix + window + suffix
+
+    def search(self, query, page=1, per_page=20):
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+        with self._lock:
+            self._ensure()
+            n_docs = len(self._docs) or 1
+            avg_length = (self._total_length / n_docs) or 1.0
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for token in self._expand(term):
+                    postings = self._postings[token]
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for key, weight in postings.items():
+                        norm = self.k1 * (1 - self.b + self.b * self._docs[key]['length'] / avg_length)
+                        term_scores[key] += idf * weight * (self.k1 + 1) / (weight + norm)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {key: scores[key] + value for key, value in term_scores.items() if key in scores}
+                if not scores:
+                    return 0, []
+
+            matched_topics = {key[1] for key in scores if key[0] == 'topic'}
+            ranked = sorted(
+                (key for key in scores
+                 if key[0] == 'topic' or self._docs[key]['topic_id'] not in matched_topics),
+                key=lambda key: (-scores[key], key),
+            )
+            offset = (page - 1) * per_page
+            hits = []
+            for key in ranked[offset:offset + per_page]:
+                doc = self._docs[key]
+                hits.append(_hit(key[0], key[1], doc['name'], doc['topic_id'],
+                                 self._snippet(doc, terms), scores[key]))
+            return len(ranked), hits
+
+
+def get_search_index():
+    """Return the search index for the current application, creating it on first use."""
+    index = current_app.extensions.get('search_index')
+    if index is None:
+        backend = current_app.config.get('SEARCH_BACKEND', 'auto')
+        if backend == 'fts5' or (backend == 'auto' and FTS5SearchIndex.is_supported(db.engine)):
+            index = FTS5SearchIndex()
+        else:
+            index = MemorySearchIndex()
+        current_app.extensions['search_index'] = index
+    return index
+
+
+def _pending():
+    return db.session.info.setdefault('search_changes', [])
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_committed_changes(session):
+    if session.get_nested_transaction() is not None:
+        return  # a savepoint was released; wait for the real commit
+    changes = session.info.pop('search_changes', None)
+    if changes and current_app:
+        current_app.extensions['search_index'].apply(changes)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_pending_changes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('search_changes', None)
+
+
+def index_topic(topic):
+    get_search_index().add('topic', topic.id, topic.name, topic.content, topic.id)
+
+
+def index_topics(topics):
+    """Index many topics at once; `topics` yields objects or rows with ``id``, ``name`` and ``content``."""
+    get_search_index().add_many(('topic', t.id, t.name, t.content, t.id) for t in topics)
+
+
+def index_resource(resource):
+    get_search_index().add('resource', resource.id, resource.name, resource.text_content, resource.topic_id)
+
+
+def remove_resource(resource_id):
+    get_search_index().remove('resource', resource_id)
+
+
+def remove_topics(topic_ids):
+    """Drop the given topics and every resource attached to them from the index."""
+    get_search_index().remove_topics(topic_ids)
+
+
+def search(query, page=1, per_page=20):
+    """Return ``(total, hits)`` for a ranked, paginated query."""
+    return get_search_index().search(query, page=page, per_page=per_page)
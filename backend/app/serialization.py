@@ -0,0 +1,102 @@
+"""Projected list queries and the JSON provider.
+
+List endpoints declare the fields they return as a :class:`FieldSet`,
+which runs one Core SELECT of exactly those columns and hands back plain
+dicts: no ORM objects are built and unused columns (``Topic.content``,
+``User.password_hash`` ...) are never read.
+
+``JSON_PROVIDER`` picks the serializer behind ``jsonify``: ``'orjson'``,
+``'stdlib'`` (Flask's default), ``'auto'`` (orjson when it is installed) or
+a ``'module:Class'`` path to any :class:`flask.json.provider.JSONProvider`.
+Both built-in providers write datetimes as ISO 8601, so responses are the
+same whichever one is active.
+"""
+import importlib
+from datetime import date
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+
+from backend.app import db
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class FieldSet:
+    """The response fields of a list endpoint, each mapped to the column it is read from."""
+
+    def __init__(self, **columns):
+        self.columns = columns
+
+    def select(self):
+        return select(*(column.label(name) for name, column in self.columns.items()))
+
+    def all(self, *criteria, order_by=None, limit=None):
+        """Run the projected SELECT filtered by `criteria` and return a list of dicts."""
+        stmt = self.select().where(*criteria)
+        if order_by is not None:
+            stmt = stmt.order_by(*order_by) if isinstance(order_by, (list, tuple)) else stmt.order_by(order_by)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        names = list(self.columns)
+        return [dict(zip(names, row)) for row in db.session.execute(stmt)]
+
+
+def exists(*criteria):
+    """True when a row matches `criteria`; a cheap stand-in for ``get_or_404`` when the row itself isn't needed."""
+    return db.session.execute(select(1).where(*criteria).limit(1)).first() is not None
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """Flask's provider, writing dates as ISO 8601 instead of HTTP dates."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+
+class OrjsonProvider(StdlibJSONProvider):
+    """Serializes with orjson; falls back to the stdlib encoder for options orjson doesn't have."""
+
+    def dumps(self, obj, **kwargs):
+        separators = kwargs.pop('separators', None)  # orjson output is always compact
+        indent = kwargs.pop('indent', None)
+        if kwargs or indent not in (None, 2):
+            return super().dumps(obj, separators=separators, indent=indent, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+
+PROVIDERS = {
+    'stdlib': StdlibJSONProvider,
+    'orjson': OrjsonProvider,
+}
+
+
+def init_json(app):
+    """Install the configured JSON provider; call before anything wraps ``app.json``."""
+    provider = app.config.get('JSON_PROVIDER', 'auto')
+    if provider == 'auto':
+        provider = 'orjson' if orjson is not None else 'stdlib'
+    if provider == 'orjson' and orjson is None:
+        raise RuntimeError("JSON_PROVIDER is 'orjson' but orjson is not installed")
+    if provider in PROVIDERS:
+        cls = PROVIDERS[provider]
+    else:
+        module_name, _, class_name = provider.partition(':')
+        cls = getattr(importlib.import_module(module_name), class_name)
+    app.json = cls(app)
@@ -0,0 +1,231 @@
+"""Content-addressed storage for uploaded resource files.
+
+Uploads are streamed in fixed-size chunks to a temporary file while being
+hashed, then moved to ``<UPLOAD_FOLDER>/objects/<aa>/<bb>/<sha256>``. A
+``blobs`` row per distinct content counts the resources that reference it;
+the file is only deleted, after the transaction commits, once the last
+reference is released. A file placed by a transaction that rolls back (or
+is closed without committing) is removed again unless a committed blob
+refers to it.
+"""
+import hashlib
+import mimetypes
+import os
+import tempfile
+from collections import Counter
+
+from flask import abort, current_app, make_response, request
+from sqlalchemy import bindparam, delete, event, select, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import send_file
+
+from backend.app import db
+from backend.app.models import Blob
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_MIME_TYPE = 'application/octet-stream'
+
+
+class BlobStore:
+    """Filesystem layout of the blob store rooted at `root`."""
+
+    def __init__(self, root, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def key_for(sha256):
+        return os.path.join('objects', sha256[:2], sha256[2:4], sha256)
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, self.key_for(sha256))
+
+    def save_stream(self, stream):
+        """
+        Stream `stream` into the store and return ``(sha256, size, created)``; memory use is one chunk.
+
+        `created` is False when the content was already stored.
+        """
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+            sha256 = digest.hexdigest()
+            path = self.path_for(sha256)
+            created = not os.path.exists(path)
+            if created:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            else:
+                os.remove(tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return sha256, size, created
+
+
+def get_store():
+    return BlobStore(current_app.config['UPLOAD_FOLDER'],
+                     current_app.config.get('UPLOAD_CHUNK_SIZE', CHUNK_SIZE))
+
+
+def guess_mime_type(filename, declared=None):
+    guessed, _ = mimetypes.guess_type(filename or '')
+    return guessed or declared or DEFAULT_MIME_TYPE
+
+
+def _add_reference(sha256, size, mime_type):
+    added = db.session.execute(
+        update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1)
+    ).rowcount
+    if added:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(Blob(sha256=sha256, size=size, mime_type=mime_type, ref_count=1))
+    except IntegrityError:
+        # Another request stored the same content first.
+        db.session.execute(update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1))
+
+
+def store_upload(file):
+    """
+    Store an uploaded ``FileStorage`` and take a reference on its blob.
+
+    Returns a dict with the ``sha256``, ``size``, ``mime_type`` and storage
+    ``path`` (relative to ``UPLOAD_FOLDER``) to record on the resource.
+    """
+    store = get_store()
+    sha256, size, created = store.save_stream(file.stream)
+    if created:
+        db.session.info.setdefault('placed_files', {})[sha256] = store.path_for(sha256)
+    mime_type = guess_mime_type(file.filename, file.mimetype)
+    _add_reference(sha256, size, mime_type)
+    return {'sha256': sha256, 'size': size, 'mime_type': mime_type, 'path': store.key_for(sha256)}
+
+
+def release(sha256s):
+    """
+    Drop one reference per entry in `sha256s` (an iterable, repeats allowed).
+
+    Blobs left without references are deleted, and their files are removed
+    once the surrounding transaction commits.
+    """
+    counts = Counter(sha for sha in sha256s if sha)
+    if not counts:
+        return
+    blobs = Blob.__table__
+    db.session.execute(
+        update(blobs).where(blobs.c.sha256 == bindparam('b_sha256'))
+        .values(ref_count=blobs.c.ref_count - bindparam('b_count')),
+        [{'b_sha256': sha, 'b_count': n} for sha, n in counts.items()],
+    )
+    orphaned = db.session.execute(
+        select(Blob.sha256).where(Blob.sha256.in_(counts), Blob.ref_count <= 0)
+    ).scalars().all()
+    if orphaned:
+        db.session.execute(delete(Blob).where(Blob.sha256.in_(orphaned)))
+        store = get_store()
+        db.session.info.setdefault('orphaned_files', []).extend(store.path_for(sha) for sha in orphaned)
+
+
+def discard_files(paths):
+    """Remove files outside the blob store (legacy flat uploads) once the surrounding transaction commits."""
+    paths = [path for path in paths if path and os.path.isabs(path)]
+    if paths:
+        db.session.info.setdefault('orphaned_files', []).extend(paths)
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            current_app.logger.warning('Error deleting file %s: %s', path, e)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _remove_orphaned_files(session):
+    if session.get_nested_transaction() is not None:
+        return  # a savepoint was released; wait for the real commit
+    session.info.pop('placed_files', None)
+    _remove_files(session.info.pop('orphaned_files', ()))
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _keep_orphaned_files(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('orphaned_files', None)
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _remove_placed_files(session, transaction):
+    # Still set only if the transaction was rolled back, or closed by a failed request's teardown.
+    if transaction.parent is not None:
+        return
+    placed = session.info.pop('placed_files', None)
+    if placed:
+        # Another upload of the same content may have found the file and committed its blob since.
+        with db.engine.connect() as connection:
+            kept = set(connection.execute(select(Blob.sha256).where(Blob.sha256.in_(placed))).scalars())
+        _remove_files(path for sha, path in placed.items() if sha not in kept)
+
+
+def is_stored_file(resource):
+    """True for uploaded files (blob store or legacy flat uploads), False for external links."""
+    return bool(resource.sha256) or os.path.isabs(resource.path_or_url or '')
+
+
+def send_resource(resource):
+    """
+    Build the response serving a resource's file.
+
+    Werkzeug's ``send_file`` handles Range/If-Range and hands the open file
+    to the WSGI server's file wrapper (``sendfile`` under gunicorn), so the
+    body never passes through Python. With ``RESOURCE_SENDFILE_MODE`` set to
+    ``'x-accel-redirect'`` or ``'x-sendfile'`` the transfer is delegated to
+    the front proxy instead.
+    """
+    if resource.sha256:
+        key = BlobStore.key_for(resource.sha256)
+        path = get_store().path_for(resource.sha256)
+        etag = resource.sha256
+    else:
+        key = os.path.relpath(resource.path_or_url, current_app.config['UPLOAD_FOLDER'])
+        path = resource.path_or_url
+        etag = True
+    if not os.path.isfile(path):
+        abort(404)
+
+    mime_type = resource.mime_type or guess_mime_type(path)
+    download_name = resource.name
+    if not os.path.splitext(download_name)[1]:
+        download_name += mimetypes.guess_extension(mime_type) or ''
+    mode = current_app.config.get('RESOURCE_SENDFILE_MODE')
+
+    if mode == 'x-accel-redirect':
+        response = make_response('')
+        prefix = current_app.config['RESOURCE_ACCEL_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = f"{prefix}/{key.replace(os.sep, '/')}"
+        response.mimetype = mime_type
+        if etag is not True:
+            response.set_etag(etag)
+        response.last_modified = resource.uploaded_at
+        return response
+
+    return send_file(path, request.environ, mimetype=mime_type, download_name=download_name,
+                     conditional=True, etag=etag, last_modified=resource.uploaded_at, max_age=3600,
+                     use_x_sendfile=mode == 'x-sendfile', response_class=current_app.response_class)
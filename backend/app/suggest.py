@@ -0,0 +1,413 @@
+"""Typeahead suggestions over course, module, topic and resource names.
+
+Each worker keeps a :class:`SuggestIndex` in memory: one sorted array of
+``(key, kind, id)`` where the keys are the tokenized name and every suffix
+of it starting at a word, so ``card`` finds both "Cardiology" and "Acute
+cardiac care". A lookup is two bisections and a top-N over the matching
+slice, ranked by popularity: a topic's completion count, summed up to its
+module and course, and inherited by its resources. No query is run.
+
+Committed edits that add, remove, rename or move a record are applied to
+the worker's copy after the commit (ORM flushes are picked up by a hook;
+Core statements call :func:`changed` and :func:`removed`). A timer writes
+them to the ``SUGGEST_SNAPSHOT_PATH`` file ``SUGGEST_SAVE_DELAY`` seconds
+later, off the request path and once per burst of edits, under a file lock
+and on top of whatever another worker saved there last. New workers load
+that file instead of reading the catalog, and running workers reload it
+(keeping their own unsaved edits) whenever it is newer than their copy. Completion counts are
+refreshed by a full rebuild on a background thread once the data is
+``SUGGEST_MAX_AGE`` seconds old; the old copy is served meanwhile.
+"""
+import atexit
+import bisect
+import heapq
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: snapshot writes by different workers are not serialized
+    fcntl = None
+
+from flask import current_app
+from sqlalchemy import event, func, inspect, select
+
+from backend.app import db
+from backend.app.models import Course, Module, Resource, Topic, user_topic_progress
+from backend.app.search import tokenize
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+# Changes from which apply() rebuilds the key array in one pass instead of editing it key by key
+BULK_CHANGES = 100
+# Seconds before a failed background rebuild is tried again
+REBUILD_RETRY_SECONDS = 60
+
+# kind: (model, column holding the parent's id)
+KINDS = {
+    'course': (Course, None),
+    'module': (Module, 'course_id'),
+    'topic': (Topic, 'module_id'),
+    'resource': (Resource, 'topic_id'),
+}
+KIND_BY_TABLE = {model.__tablename__: kind for kind, (model, _) in KINDS.items()}
+URLS = {'course': '#/courses/{id}', 'module': '#/modules/{id}', 'topic': '#/topics/{id}',
+        'resource': '#/topics/{parent}'}
+
+
+def _keys(name):
+    words = tokenize(name)
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+class SuggestIndex:
+    """Name prefix index; `built_at` is when its completion counts were read from the database."""
+
+    def __init__(self, entries=(), built_at=None):
+        self._lock = threading.RLock()
+        self.built_at = time.time() if built_at is None else built_at
+        self.synced_at = 0.0  # mtime of the snapshot this copy matches
+        self._entries = {}
+        self._keys = []
+        for kind, ref_id, name, parent, popularity in entries:
+            self._entries[(kind, ref_id)] = (name, parent, popularity)
+            self._keys.extend((key, kind, ref_id) for key in _keys(name))
+        self._keys.sort()
+
+    @classmethod
+    def build(cls):
+        """Read every name and the completion counts from the database."""
+        completions = dict(db.session.execute(
+            select(user_topic_progress.c.topic_id, func.count()).group_by(user_topic_progress.c.topic_id)
+        ).all())
+        rows = {kind: db.session.execute(select(model.id, model.name, *([getattr(model, parent)] if parent else [])))
+                .all() for kind, (model, parent) in KINDS.items()}
+
+        module_popularity, course_popularity = defaultdict(int), defaultdict(int)
+        for topic_id, _, module_id in rows['topic']:
+            module_popularity[module_id] += completions.get(topic_id, 0)
+        for module_id, _, course_id in rows['module']:
+            course_popularity[course_id] += module_popularity[module_id]
+
+        entries = [('course', course_id, name, None, course_popularity[course_id])
+                   for course_id, name in rows['course']]
+        entries += [('module', module_id, name, course_id, module_popularity[module_id])
+                    for module_id, name, course_id in rows['module']]
+        entries += [('topic', topic_id, name, module_id, completions.get(topic_id, 0))
+                    for topic_id, name, module_id in rows['topic']]
+        entries += [('resource', resource_id, name, topic_id, completions.get(topic_id, 0))
+                    for resource_id, name, topic_id in rows['resource']]
+        return cls(entries)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            snapshot = json.load(f)
+        index = cls(snapshot['entries'], built_at=snapshot['built_at'])
+        index.synced_at = os.stat(path).st_mtime
+        return index
+
+    def save(self, path):
+        """Write the snapshot atomically, so other workers never read half of it."""
+        with self._lock:
+            entries = [[kind, ref_id, name, parent, popularity]
+                       for (kind, ref_id), (name, parent, popularity) in self._entries.items()]
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'built_at': self.built_at, 'entries': entries}, f)
+        os.replace(tmp_path, path)
+        self.synced_at = os.stat(path).st_mtime
+
+    def __len__(self):
+        return len(self._entries)
+
+    def entries(self):
+        """A copy of ``{(kind, id): (name, parent, popularity)}``."""
+        with self._lock:
+            return dict(self._entries)
+
+    def _remove(self, ref):
+        entry = self._entries.pop(ref, None)
+        if entry is None:
+            return None
+        for key in _keys(entry[0]):
+            del self._keys[bisect.bisect_left(self._keys, (key, *ref))]
+        return entry
+
+    def _popularity(self, kind, parent, previous):
+        if previous is not None:
+            return previous[2]
+        if kind == 'resource':
+            return self._entries.get(('topic', parent), (None, None, 0))[2]
+        return 0
+
+    def apply(self, changes):
+        """Apply ``{(kind, id): (name, parent) or None}``; None removes the record."""
+        with self._lock:
+            if len(changes) >= BULK_CHANGES:
+                self._apply_bulk(changes)
+                return
+            for (kind, ref_id), change in changes.items():
+                previous = self._remove((kind, ref_id))
+                if change is None:
+                    continue
+                name, parent = change
+                self._entries[(kind, ref_id)] = (name, parent, self._popularity(kind, parent, previous))
+                for key in _keys(name):
+                    bisect.insort(self._keys, (key, kind, ref_id))
+
+    def _apply_bulk(self, changes):
+        """Each insort/del moves the whole array; for many changes, filter it and merge the new keys in once."""
+        added = []
+        for (kind, ref_id), change in changes.items():
+            previous = self._entries.pop((kind, ref_id), None)
+            if change is None:
+                continue
+            name, parent = change
+            self._entries[(kind, ref_id)] = (name, parent, self._popularity(kind, parent, previous))
+            added.extend((key, kind, ref_id) for key in _keys(name))
+        kept = (entry for entry in self._keys if (entry[1], entry[2]) not in changes)
+        self._keys = list(heapq.merge(kept, sorted(added)))
+
+    def suggest(self, prefix, limit=DEFAULT_LIMIT):
+        """The `limit` most popular records with a word starting with `prefix`, in order."""
+        prefix = ' '.join(tokenize(prefix))
+        if not prefix:
+            return []
+        with self._lock:
+            start = bisect.bisect_left(self._keys, (prefix,))
+            end = bisect.bisect_left(self._keys, (prefix + '\uffff',))
+            refs = {(kind, ref_id) for _, kind, ref_id in self._keys[start:end]}
+            entries = self._entries
+            best = heapq.nsmallest(limit, refs, key=lambda ref: (
+                -entries[ref][2], not entries[ref][0].lower().startswith(prefix), entries[ref][0].lower(), ref))
+            return [{'type': kind, 'id': ref_id, 'name': entries[(kind, ref_id)][0],
+                     'url': URLS[kind].format(id=ref_id, parent=entries[(kind, ref_id)][1]),
+                     'popularity': entries[(kind, ref_id)][2]}
+                    for kind, ref_id in best]
+
+
+_refresh_lock = threading.Lock()
+
+
+def _snapshot_mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except (FileNotFoundError, TypeError):
+        return None
+
+
+@contextmanager
+def _locked_snapshot(path):
+    """Hold an exclusive lock on the snapshot file while it is read, changed and written back."""
+    if not path or fcntl is None:
+        yield
+        return
+    with open(f'{path}.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_snapshot(app, path):
+    """The snapshot at `path`, or None when there is none or it cannot be read."""
+    if _snapshot_mtime(path) is None:
+        return None
+    try:
+        return SuggestIndex.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        app.logger.warning('Ignoring unreadable suggest snapshot %s: %s', path, e)
+        return None
+
+
+def _current(app, path, index):
+    """
+    `index`, or the snapshot at `path` if another worker saved a different one since `index` was synced.
+
+    Edits this worker has not saved yet are applied to a snapshot it loads.
+    """
+    if index is not None and _snapshot_mtime(path) in (None, index.synced_at):
+        return index
+    loaded = _read_snapshot(app, path)
+    if loaded is None:
+        return index
+    loaded.apply(app.extensions.get('suggest_unsaved') or {})
+    return loaded
+
+
+def _is_old(app, index):
+    return time.time() - index.built_at > app.config.get('SUGGEST_MAX_AGE', 300)
+
+
+def init_suggest(app):
+    """Start warm from the snapshot written by another worker; an old one is served until rebuilt."""
+    if app.config.get('SUGGEST_SNAPSHOT_PATH') is None:
+        os.makedirs(app.instance_path, exist_ok=True)
+        app.config['SUGGEST_SNAPSHOT_PATH'] = os.path.join(app.instance_path, 'suggest_index.json')
+    index = _read_snapshot(app, app.config['SUGGEST_SNAPSHOT_PATH'])
+    if index is not None:
+        app.extensions['suggest_index'] = index
+    atexit.register(save_snapshot, app)
+
+
+def get_suggest_index():
+    """
+    The current worker's index, reloaded when another worker saved a newer snapshot.
+
+    Only a worker without any index builds one inline. Once the data is
+    ``SUGGEST_MAX_AGE`` old it keeps being served while a background thread
+    rebuilds it, so suggestions never wait on the catalog scan.
+    """
+    app = current_app._get_current_object()
+    index = app.extensions.get('suggest_index')
+    path = app.config.get('SUGGEST_SNAPSHOT_PATH')
+    if index is None or _snapshot_mtime(path) not in (None, index.synced_at):
+        with _refresh_lock:
+            if app.extensions.get('suggest_index') is index:  # else another thread got here first
+                index = _current(app, path, index)
+                if index is None:
+                    index = SuggestIndex.build()
+                    with _locked_snapshot(path):
+                        if path and _current(app, path, None) is None:  # keep one another worker saved meanwhile
+                            index.save(path)
+                app.extensions['suggest_index'] = index
+            index = app.extensions['suggest_index']
+    if _is_old(app, index):
+        _start_rebuild(app)
+    return index
+
+
+def _start_rebuild(app):
+    """Rebuild the index on a background thread, unless one is running or the last one failed recently."""
+    with _refresh_lock:
+        if app.extensions.get('suggest_rebuilding') or time.time() < app.extensions.get('suggest_retry_at', 0):
+            return
+        app.extensions['suggest_rebuilding'] = True
+    threading.Thread(target=_rebuild, args=(app,), name='suggest-rebuild', daemon=True).start()
+
+
+def _changes_between(before, after):
+    """The :meth:`SuggestIndex.apply` changes that turn the `before` entries into the `after` ones."""
+    changes = {ref: None for ref in before.keys() - after.keys()}
+    changes.update({ref: entry[:2] for ref, entry in after.items()
+                    if ref not in before or before[ref][:2] != entry[:2]})
+    return changes
+
+
+def _rebuild(app):
+    path = app.config.get('SUGGEST_SNAPSHOT_PATH')
+    with app.app_context():
+        try:
+            base = app.extensions['suggest_index'].entries()
+            index = SuggestIndex.build()
+            with _refresh_lock, _locked_snapshot(path):
+                current = _current(app, path, app.extensions['suggest_index'])
+                # Edits committed while the catalog was read, here or in other workers
+                index.apply(_changes_between(base, current.entries()))
+                if path:
+                    index.save(path)
+                    app.extensions.pop('suggest_unsaved', None)
+                app.extensions['suggest_index'] = index
+        except Exception:
+            app.logger.exception('Rebuilding the suggest index failed')
+            app.extensions['suggest_retry_at'] = time.time() + REBUILD_RETRY_SECONDS
+        finally:
+            app.extensions['suggest_rebuilding'] = False
+            db.session.remove()
+
+
+def suggest(prefix, limit=DEFAULT_LIMIT):
+    return get_suggest_index().suggest(prefix, limit=limit)
+
+
+def _pending():
+    return db.session.info.setdefault('suggest_changes', {})
+
+
+def changed(kind, rows):
+    """Queue ``(id, name, parent_id)`` rows written with Core statements; applied once the transaction commits."""
+    _pending().update({(kind, ref_id): (name, parent) for ref_id, name, parent in rows})
+
+
+def removed(kind, ids):
+    """Queue the removal of `kind` records deleted with Core statements."""
+    _pending().update({(kind, ref_id): None for ref_id in ids})
+
+
+def _renamed_or_moved(obj, parent):
+    attrs = inspect(obj).attrs
+    return attrs.name.history.has_changes() or (parent is not None and attrs[parent].history.has_changes())
+
+
+@event.listens_for(db.session, 'after_flush')
+def _queue_flushed_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        kind = KIND_BY_TABLE.get(getattr(obj, '__tablename__', None))
+        if kind is None:
+            continue
+        parent = KINDS[kind][1]
+        if obj in session.deleted:
+            session.info.setdefault('suggest_changes', {})[(kind, obj.id)] = None
+        elif obj in session.new or _renamed_or_moved(obj, parent):
+            session.info.setdefault('suggest_changes', {})[(kind, obj.id)] = (
+                obj.name, getattr(obj, parent) if parent else None)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_committed_changes(session):
+    if session.get_nested_transaction() is not None:
+        return  # a savepoint was released; wait for the real commit
+    changes = session.info.pop('suggest_changes', None)
+    if not changes or not current_app:
+        return
+    app = current_app._get_current_object()
+    path = app.config.get('SUGGEST_SNAPSHOT_PATH')
+    with _refresh_lock:
+        index = app.extensions.get('suggest_index')
+        if index is None:
+            # Nothing here to update; make sure nobody starts from a snapshot without these changes
+            with _locked_snapshot(path):
+                try:
+                    os.remove(path)
+                except (FileNotFoundError, TypeError):
+                    pass
+            return
+        index.apply(changes)
+        if path:
+            app.extensions.setdefault('suggest_unsaved', {}).update(changes)
+            if app.extensions.get('suggest_save_timer') is None:
+                timer = threading.Timer(app.config.get('SUGGEST_SAVE_DELAY', 2.0), save_snapshot, args=(app,))
+                timer.daemon = True
+                app.extensions['suggest_save_timer'] = timer
+                timer.start()
+
+
+def save_snapshot(app):
+    """Write this worker's unsaved edits to the snapshot, on top of the version another worker saved last."""
+    path = app.config.get('SUGGEST_SNAPSHOT_PATH')
+    with _refresh_lock:
+        timer = app.extensions.pop('suggest_save_timer', None)
+        if timer is not None:
+            timer.cancel()  # when called directly, e.g. at exit
+        if not path or not app.extensions.get('suggest_unsaved'):
+            return
+        try:
+            with _locked_snapshot(path):
+                index = app.extensions['suggest_index'] = _current(app, path, app.extensions['suggest_index'])
+                index.save(path)
+        except OSError:
+            app.logger.exception('Saving the suggest snapshot %s failed', path)
+            return
+        app.extensions.pop('suggest_unsaved', None)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_pending_changes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('suggest_changes', None)
@@ -0,0 +1,151 @@
+"""Delta sync feed for the catalog, news and events.
+
+Every create, update or delete of a synced record leaves one row in
+``sync_changes``, replacing that record's previous row, with a fresh
+autoincrement ``seq``. ORM flushes are recorded by an ``after_flush`` hook;
+Core statements that bypass the ORM (bulk import, set-based deletes, the
+benchmark seeder) call :func:`record` themselves.
+
+``GET /sync?since=<cursor>`` reads the rows after the cursor in ``seq``
+order with one primary-key range query, then loads the current fields of
+the changed records per kind. Deleted records come back as tombstones.
+The cursor is the last ``seq`` returned, encoded; a client without one
+starts from zero and receives the whole catalog, page by page. A client
+that is up to date costs one empty range scan.
+
+``seq`` values come from the single ``sync_sequence`` row, which a writer
+updates before logging its changes and keeps locked until it commits. A
+transaction can therefore only take seqs once every transaction holding
+lower ones has committed or rolled back, so a reader never sees a higher
+``seq`` while a lower one is still to come, on server databases as on
+SQLite (which serializes writers anyway).
+"""
+import base64
+import binascii
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, event, insert, select, update
+
+from backend.app import db
+from backend.app.models import Course, Event, Module, NewsArticle, Resource, SyncChange, SyncSequence, Topic
+from backend.app.serialization import FieldSet
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+# kind: (model, fields sent for a live record)
+KINDS = {
+    'course': (Course, FieldSet(id=Course.id, name=Course.name, description=Course.description,
+                                updated_at=Course.updated_at)),
+    'module': (Module, FieldSet(id=Module.id, course_id=Module.course_id, name=Module.name,
+                                description=Module.description, updated_at=Module.updated_at)),
+    'topic': (Topic, FieldSet(id=Topic.id, module_id=Topic.module_id, name=Topic.name, content=Topic.content,
+                              updated_at=Topic.updated_at)),
+    'resource': (Resource, FieldSet(id=Resource.id, topic_id=Resource.topic_id, name=Resource.name,
+                                    resource_type=Resource.resource_type, size=Resource.size,
+                                    mime_type=Resource.mime_type, updated_at=Resource.updated_at)),
+    'news': (NewsArticle, FieldSet(id=NewsArticle.id, title=NewsArticle.title, content=NewsArticle.content,
+                                   created_at=NewsArticle.created_at, updated_at=NewsArticle.updated_at)),
+    'event': (Event, FieldSet(id=Event.id, title=Event.title, description=Event.description,
+                              event_date=Event.event_date, updated_at=Event.updated_at)),
+}
+KIND_BY_TABLE = {model.__tablename__: kind for kind, (model, _) in KINDS.items()}
+
+
+def encode_cursor(seq):
+    return base64.urlsafe_b64encode(str(seq).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """The ``seq`` a cursor stands for (0 for none); raises ValueError for anything we didn't hand out."""
+    if not cursor:
+        return 0
+    try:
+        seq = int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'Invalid sync cursor {cursor!r}')
+    if seq < 0:
+        raise ValueError(f'Invalid sync cursor {cursor!r}')
+    return seq
+
+
+def _allocate(connection, count):
+    """Reserve `count` consecutive seqs, locking the sequence row until the transaction ends."""
+    sequence = SyncSequence.__table__
+    connection.execute(update(sequence).where(sequence.c.id == 1).values(last_seq=sequence.c.last_seq + count))
+    last = connection.execute(select(sequence.c.last_seq).where(sequence.c.id == 1)).scalar_one()
+    return range(last - count + 1, last + 1)
+
+
+def record(kind, ids, deleted=False, connection=None):
+    """Log a change (or, with `deleted`, a tombstone) for the `kind` records with the given ids."""
+    ids = sorted(set(ids))
+    if not ids:
+        return
+    connection = connection or db.session
+    changes = SyncChange.__table__
+    now = datetime.now(timezone.utc)
+    seqs = _allocate(connection, len(ids))
+    connection.execute(delete(changes).where(changes.c.kind == kind, changes.c.record_id.in_(ids)))
+    connection.execute(insert(changes), [
+        {'seq': seq, 'kind': kind, 'record_id': record_id, 'deleted': deleted, 'changed_at': now}
+        for seq, record_id in zip(seqs, ids)
+    ])
+
+
+@event.listens_for(db.session, 'after_flush')
+def _record_flushed_changes(session, flush_context):
+    changed, deleted = defaultdict(set), defaultdict(set)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        kind = KIND_BY_TABLE.get(getattr(obj, '__tablename__', None))
+        if kind is None:
+            continue
+        if obj in session.deleted:
+            deleted[kind].add(obj.id)
+        elif obj in session.new or session.is_modified(obj):
+            changed[kind].add(obj.id)
+    if not changed and not deleted:
+        return
+    connection = session.connection()
+    for kind, ids in changed.items():
+        record(kind, ids, connection=connection)
+    for kind, ids in deleted.items():
+        record(kind, ids, deleted=True, connection=connection)
+
+
+def changes_since(seq, limit=DEFAULT_PAGE_SIZE):
+    """
+    Up to `limit` changes after `seq`, oldest first.
+
+    Returns ``{'changes': [...], 'cursor': ..., 'has_more': bool}``; each
+    change is ``{'type', 'id', 'deleted'}`` plus the record's ``data`` unless
+    it was deleted.
+    """
+    changes = SyncChange.__table__
+    rows = db.session.execute(
+        select(changes.c.seq, changes.c.kind, changes.c.record_id, changes.c.deleted)
+        .where(changes.c.seq > seq).order_by(changes.c.seq).limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    live = defaultdict(list)
+    for row in rows:
+        if not row.deleted and row.kind in KINDS:
+            live[row.kind].append(row.record_id)
+    records = {}
+    for kind, ids in live.items():
+        model, fields = KINDS[kind]
+        records[kind] = {item['id']: item for item in fields.all(model.id.in_(ids))}
+
+    items = []
+    for row in rows:
+        if row.deleted:
+            items.append({'type': row.kind, 'id': row.record_id, 'deleted': True})
+            continue
+        data = records.get(row.kind, {}).get(row.record_id)
+        if data is None:
+            continue  # deleted after this page was read; its tombstone has a later seq
+        items.append({'type': row.kind, 'id': row.record_id, 'deleted': False, 'data': data})
+    return {'changes': items, 'cursor': encode_cursor(rows[-1].seq if rows else seq), 'has_more': has_more}
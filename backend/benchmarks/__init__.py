@@ -0,0 +1,11 @@
+"""Synthetic-catalog load generation and endpoint benchmarks.
+
+Seed a throwaway database and benchmark the hot endpoints::
+
+    python -m backend.benchmarks run --topics-per-module 20 --users 2000 --output bench.json
+
+then compare two runs, failing when a scenario's p95 latency grew by more
+than the threshold or it started issuing more SQL per request::
+
+    python -m backend.benchmarks compare baseline.json bench.json --threshold 0.2
+"""
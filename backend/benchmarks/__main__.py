@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from backend import benchmarks
+from backend.app import create_app, db
+from backend.benchmarks import runner
+from backend.benchmarks.seed import seed
+from backend.config import Config
+
+
+def _make_app(args, workdir):
+    database = args.database or f"sqlite:///{os.path.join(workdir, 'benchmark.db')}"
+    config = type('BenchmarkConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': database,
+        'DATABASE_PROFILE': args.profile,
+        'SEARCH_BACKEND': args.search_backend,
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+    })
+    return create_app(config_class=config)
+
+
+def _run(args):
+    with tempfile.TemporaryDirectory(prefix='medlib-bench-') as workdir:
+        app = _make_app(args, workdir)
+        dataset = None
+        if not args.no_seed:
+            with app.app_context():
+                db.create_all()
+                started = time.perf_counter()
+                dataset = seed(courses=args.courses, modules_per_course=args.modules_per_course,
+                               topics_per_module=args.topics_per_module,
+                               resources_per_topic=args.resources_per_topic, users=args.users,
+                               completions=args.completions, seed=args.seed)
+                dataset['seconds'] = round(time.perf_counter() - started, 2)
+            print(f"Seeded {json.dumps(dataset)}", file=sys.stderr)
+
+        report = runner.run(app, scenarios=args.scenario, requests=args.requests, warmup=args.warmup,
+                            seed=args.seed, dataset=dataset)
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+    print(f"{'scenario':<12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'sql/req':>8} {'errors':>7}")
+    for name, result in report['results'].items():
+        print(f"{name:<12} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+              f"{result['throughput_rps']:>9.1f} {result['sql_per_request']:>8.2f} {result['errors']:>7}")
+    if args.output:
+        runner.save(report, args.output)
+    return 0
+
+
+def _compare(args):
+    rows, regressions = runner.compare(runner.load(args.baseline), runner.load(args.current),
+                                       threshold=args.threshold, metric=args.metric)
+    print(f"{'scenario':<12} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, before, after, change in rows:
+        flag = '  REGRESSION' if name in regressions else ''
+        print(f"{name:<12} {before:>10.2f} {after:>10.2f} {change:>+8.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m backend.benchmarks', description=benchmarks.__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='seed a database and benchmark the hot endpoints')
+    run.add_argument('--database', help='database URL (default: a temporary SQLite file)')
+    run.add_argument('--no-seed', action='store_true', help='benchmark the existing data in --database')
+    run.add_argument('--profile', default='sqlite', help='DATABASE_PROFILE to use')
+    run.add_argument('--search-backend', default='auto', choices=('auto', 'fts5', 'memory'))
+    run.add_argument('--courses', type=int, default=10)
+    run.add_argument('--modules-per-course', type=int, default=8)
+    run.add_argument('--topics-per-module', type=int, default=12)
+    run.add_argument('--resources-per-topic', type=int, default=2)
+    run.add_argument('--users', type=int, default=500)
+    run.add_argument('--completions', type=int, default=20000)
+    run.add_argument('--seed', type=int, default=1234)
+    run.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    run.add_argument('--warmup', type=int, default=10, help='unmeasured requests per scenario')
+    run.add_argument('--scenario', action='append', choices=sorted(runner.SCENARIOS),
+                     help='scenario to run (repeatable; default: all)')
+    run.add_argument('--output', help='write the JSON report here')
+    run.set_defaults(handler=_run)
+
+    compare = commands.add_parser('compare', help='compare two JSON reports')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.2, help='allowed relative slowdown')
+    compare.add_argument('--metric', default='p95_ms', choices=('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'))
+    compare.set_defaults(handler=_compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""In-process endpoint benchmarks.
+
+Each scenario issues requests through Flask's test client, so the numbers
+cover routing, auth, SQL and serialization but not the network or the WSGI
+server. Every request runs in its own application context (and so its own
+database session), as it would under gunicorn.
+"""
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import sqlalchemy
+from sqlalchemy import event, select
+
+from backend.app import db
+from backend.app.identity import issue_token
+from backend.app.models import Course, Topic, User
+from backend.benchmarks.seed import PASSWORD, WORDS
+
+# Statements per request may drift this much (e.g. an identity cache entry expiring) before it counts as a regression
+SQL_TOLERANCE = 0.1
+
+# `request(client, context, rng)` sends one request and returns the response.
+Scenario = namedtuple('Scenario', 'name request')
+
+
+def _get(url):
+    def request(client, context, rng):
+        return client.get(url(context, rng), headers=rng.choice(context['headers']))
+    return request
+
+
+def _login(client, context, rng):
+    username = rng.choice(context['usernames'])
+    return client.post('/auth/login', json={'username': username, 'password': PASSWORD})
+
+
+def _complete(client, context, rng):
+    return client.post(f"/api/topics/{rng.choice(context['topic_ids'])}/complete",
+                       headers=rng.choice(context['headers']))
+
+
+SCENARIOS = {
+    'catalog': Scenario('catalog', _get(lambda c, rng: '/admin/courses')),
+    'course_tree': Scenario('course_tree', _get(lambda c, rng: f"/courses/{rng.choice(c['course_ids'])}/tree")),
+    'topic': Scenario('topic', _get(lambda c, rng: f"/topics/{rng.choice(c['topic_ids'])}")),
+    'search': Scenario('search', _get(lambda c, rng: f'/search?q={rng.choice(WORDS)}')),
+    'progress': Scenario('progress', _get(lambda c, rng: '/api/progress')),
+    'complete': Scenario('complete', _complete),
+    'login': Scenario('login', _login),
+}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class StatementCounter:
+    """Counts SQL statements sent to every engine of the app."""
+
+    def __init__(self, engines):
+        self.engines = engines
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._count)
+
+
+def _build_context(app, users=200):
+    """Ids to pick from and pre-issued tokens, so only `login` pays for password hashing."""
+    with app.app_context():
+        students = db.session.execute(
+            select(User).where(User.role == 'student').order_by(User.id).limit(users)
+        ).scalars().all()
+        return {
+            'usernames': [u.username for u in students],
+            'headers': [{'Authorization': f'Bearer {issue_token(u)}'} for u in students],
+            'course_ids': db.session.execute(select(Course.id)).scalars().all(),
+            'topic_ids': db.session.execute(select(Topic.id)).scalars().all(),
+        }
+
+
+def run_scenario(app, scenario, context, requests=200, warmup=10, seed=0):
+    """Run one scenario and return its latency, throughput and SQL statistics."""
+    rng = random.Random(seed)
+    with app.app_context():
+        engines = list(db.engines.values())
+    client = app.test_client(use_cookies=False)
+    for _ in range(warmup):
+        scenario.request(client, context, rng)
+
+    latencies, statements, errors = [], [], 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        with StatementCounter(engines) as counter:
+            request_started = time.perf_counter()
+            response = scenario.request(client, context, rng)
+            latencies.append((time.perf_counter() - request_started) * 1000)
+        statements.append(counter.count)
+        if response.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+        'throughput_rps': round(requests / elapsed, 1) if elapsed else 0.0,
+        'sql_per_request': round(sum(statements) / len(statements), 2) if statements else 0.0,
+        'sql_max': max(statements, default=0),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(app, scenarios=None, requests=200, warmup=10, seed=0, dataset=None):
+    """Run the named scenarios (all by default) and return the JSON-ready report."""
+    names = scenarios or list(SCENARIOS)
+    context = _build_context(app)
+    results = {}
+    for name in names:
+        results[name] = run_scenario(app, SCENARIOS[name], context, requests=requests, warmup=warmup, seed=seed)
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'sqlalchemy': sqlalchemy.__version__,
+            'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+            'database_profile': app.config.get('DATABASE_PROFILE'),
+            'requests': requests,
+            'warmup': warmup,
+            'seed': seed,
+            'dataset': dataset,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=0.2, metric='p95_ms'):
+    """
+    Compare two reports; return ``(rows, regressions)``.
+
+    Each row is ``(scenario, baseline value, current value, relative change)``.
+    A scenario regresses when `metric` grew by more than `threshold`, or when
+    it now runs more SQL statements per request (runs with the same seed
+    send the same requests, so statement counts are directly comparable).
+    """
+    rows, regressions = [], []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        change = (result[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+        rows.append((name, before[metric], result[metric], change))
+        if change > threshold or result['sql_per_request'] > before['sql_per_request'] + SQL_TOLERANCE:
+            regressions.append(name)
+    return rows, regressions
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(report, path):
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+        f.write('\n')
@@ -0,0 +1,116 @@
+"""Synthetic catalog generator.
+
+Fills an empty database with courses, modules, topics, link resources,
+students and topic completions. The same ``seed`` always produces the same
+data, and every table is written with one executemany INSERT so a catalog of
+tens of thousands of rows takes seconds.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select, update
+
+from backend.app import catalog, db, search, sync
+from backend.app.models import Course, Module, Resource, Topic, User, UserModuleProgress, user_topic_progress
+from backend.app.passwords import get_hasher
+
+PASSWORD = 'benchmark-password'
+ADMIN_USERNAME = 'bench-admin'
+
+WORDS = (
+    'anatomy', 'artery', 'bacteria', 'biopsy', 'bone', 'cardiac', 'cartilage', 'cell', 'cortex', 'cranial',
+    'dermis', 'diagnosis', 'dosage', 'embryo', 'enzyme', 'epithelium', 'femur', 'gland', 'glucose', 'hepatic',
+    'hormone', 'immune', 'infection', 'insulin', 'kidney', 'lesion', 'ligament', 'lung', 'lymph', 'marrow',
+    'membrane', 'metabolism', 'muscle', 'nerve', 'neuron', 'oncology', 'organ', 'pathology', 'pelvis',
+    'pharmacology', 'plasma', 'pulmonary', 'receptor', 'renal', 'respiratory', 'sepsis', 'skeletal',
+    'spinal', 'suture', 'symptom', 'syndrome', 'synapse', 'tendon', 'thorax', 'tissue', 'toxin', 'tumor',
+    'vaccine', 'valve', 'vascular', 'vein', 'ventricle', 'virus', 'vitamin',
+)
+
+
+def _phrase(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def _insert_returning_ids(model, rows):
+    if not rows:
+        return []
+    table = model.__table__
+    return [row[0] for row in db.session.execute(insert(table).returning(table.c.id), rows)]
+
+
+def seed(courses=10, modules_per_course=8, topics_per_module=12, resources_per_topic=2, users=500,
+         completions=20000, seed=1234):
+    """
+    Populate the current app's (empty) database and commit.
+
+    Students are named ``user00000``, ``user00001``, ... and, like the
+    ``bench-admin`` account, use :data:`PASSWORD`. Returns the row counts.
+    """
+    if db.session.scalar(select(func.count(Course.id))):
+        raise ValueError('The benchmark seeder needs an empty database')
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+
+    course_ids = _insert_returning_ids(Course, [
+        {'name': f'{_phrase(rng, 2).title()} {i}', 'description': _phrase(rng, 20)} for i in range(courses)
+    ])
+    module_ids = _insert_returning_ids(Module, [
+        {'name': f'{_phrase(rng, 2).title()} {c}.{m}', 'description': _phrase(rng, 15), 'course_id': course_id}
+        for c, course_id in enumerate(course_ids) for m in range(modules_per_course)
+    ])
+    topic_ids = _insert_returning_ids(Topic, [
+        {'name': _phrase(rng, 3).title(), 'content': _phrase(rng, 200), 'module_id': module_id}
+        for module_id in module_ids for _ in range(topics_per_module)
+    ])
+    resource_rows = [
+        {'name': f'{_phrase(rng, 2).title()} reference', 'resource_type': 'link', 'topic_id': topic_id,
+         'path_or_url': f'https://example.org/resources/{topic_id}/{r}', 'uploaded_at': now}
+        for topic_id in topic_ids for r in range(resources_per_topic)
+    ]
+    resource_ids = _insert_returning_ids(Resource, resource_rows)
+
+    password_hash = get_hasher().hash(PASSWORD)
+    user_rows = [{'username': ADMIN_USERNAME, 'email': f'{ADMIN_USERNAME}@example.com', 'role': 'admin',
+                  'password_hash': password_hash, 'created_at': now}]
+    user_rows += [{'username': f'user{i:05d}', 'email': f'user{i:05d}@example.com', 'role': 'student',
+                   'password_hash': password_hash, 'created_at': now} for i in range(users)]
+    user_ids = _insert_returning_ids(User, user_rows)[1:]
+
+    completions = min(completions, len(user_ids) * len(topic_ids))
+    pairs = set()
+    while len(pairs) < completions:
+        pairs.add((rng.choice(user_ids), rng.choice(topic_ids)))
+    if pairs:
+        db.session.execute(insert(user_topic_progress), [
+            {'user_id': user_id, 'topic_id': topic_id,
+             'completed_at': now - timedelta(minutes=rng.randrange(90 * 24 * 60))}
+            for user_id, topic_id in sorted(pairs)
+        ])
+        # Per-module counters that completion.py otherwise maintains incrementally
+        db.session.execute(insert(UserModuleProgress.__table__).from_select(
+            ['user_id', 'module_id', 'completed_count'],
+            select(user_topic_progress.c.user_id, Topic.module_id, func.count())
+            .join(Topic, Topic.id == user_topic_progress.c.topic_id)
+            .group_by(user_topic_progress.c.user_id, Topic.module_id)
+        ))
+
+    db.session.execute(update(Module.__table__).values(
+        topic_count=select(func.count(Topic.id)).where(Topic.module_id == Module.__table__.c.id).scalar_subquery()
+    ))
+    catalog.touch('courses', 'modules', 'topics', 'resources')
+    for kind, ids in (('course', course_ids), ('module', module_ids), ('topic', topic_ids),
+                      ('resource', resource_ids)):
+        sync.record(kind, ids)
+    search.get_search_index().rebuild()
+    db.session.commit()
+
+    return {
+        'courses': len(course_ids),
+        'modules': len(module_ids),
+        'topics': len(topic_ids),
+        'resources': len(resource_rows),
+        'users': len(user_ids),
+        'completions': len(pairs),
+        'seed': seed,
+    }
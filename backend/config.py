@@ -3,12 +3,86 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Named engine setups selected with DATABASE_PROFILE. 'pragmas' run on every new
+# SQLite connection; every other key is passed to create_engine.
+ENGINE_PROFILES = {
+    'default': {},
+    # File-backed SQLite shared by several gunicorn workers: WAL lets readers run
+    # alongside the single writer, and writers wait instead of failing with "database is locked".
+    'sqlite': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY',
+        },
+        'pool_size': 5,
+        'max_overflow': 10,
+    },
+    # Client/server databases (PostgreSQL, MySQL) behind a connection pool.
+    'server': {
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+    },
+}
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'you-will-never-guess'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE') or 'sqlite'
+    # Optional read replica for read-only GET views; clients that wrote within the
+    # sticky window keep reading from the primary.
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL') or None
+    DATABASE_REPLICA_STICKY_SECONDS = int(os.environ.get('DATABASE_REPLICA_STICKY_SECONDS') or 5)
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'super-secret-jwt-key'
+    # Seconds a user's role/token version may be served from memory before re-checking the database
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 60)
+    # Werkzeug hash method; existing hashes are upgraded on the next successful login after a change
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1)
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE') or 16) # waiting hashes before answering 503
+    PASSWORD_HASH_RETRY_AFTER = 1
     UPLOAD_FOLDER = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'uploads')
+    UPLOAD_CHUNK_SIZE = 1024 * 1024 # bytes read per step while streaming an upload to disk
+    # None serves files from the app; 'x-accel-redirect' (nginx) or 'x-sendfile'
+    # (Apache/lighttpd) hands the transfer to the front proxy.
+    RESOURCE_SENDFILE_MODE = os.environ.get('RESOURCE_SENDFILE_MODE') or None
+    RESOURCE_ACCEL_PREFIX = os.environ.get('RESOURCE_ACCEL_PREFIX') or '/protected-uploads'
+    # 'auto' uses SQLite FTS5 when the database supports it, else an in-process index
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto'
+    # Typeahead index: snapshot file shared by workers (unset: suggest_index.json in the
+    # instance folder; empty disables it), the seconds after a commit before it is written,
+    # and the seconds after which a worker rebuilds it to pick up new completion counts
+    SUGGEST_SNAPSHOT_PATH = os.environ.get('SUGGEST_SNAPSHOT_PATH')
+    SUGGEST_SAVE_DELAY = float(os.environ.get('SUGGEST_SAVE_DELAY') or 2.0)
+    SUGGEST_MAX_AGE = int(os.environ.get('SUGGEST_MAX_AGE') or 300)
+    # Serializer behind jsonify: 'auto' (orjson when installed), 'orjson', 'stdlib' or a 'module:Class' path
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER') or 'auto'
+    # Response cache: 'memory' (per-process LRU), 'fake' or a 'module:Class' path
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'memory'
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES') or 1024)
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES') or 64 * 1024 * 1024)
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL') or 300)
+    # Background jobs: 'thread' runs them on in-process worker threads, 'manual' only via `flask jobs run`
+    JOBS_MODE = os.environ.get('JOBS_MODE') or 'thread'
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS') or 2)
+    JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL') or 5) # seconds between idle checks for due retries
+    JOBS_LEASE_SECONDS = 300 # a running job whose worker vanished is picked up again after this
+    JOBS_MAX_ATTEMPTS = 3
+    JOBS_RETRY_BACKOFF = 5 # seconds before the first retry, doubled for each further attempt
+    # Days of per-day analytics kept before the compaction job folds them into months
+    ANALYTICS_DAILY_DAYS = int(os.environ.get('ANALYTICS_DAILY_DAYS') or 90)
+    # Users per committed batch when badges are recomputed after module contents change
+    BADGE_RECOMPUTE_BATCH_SIZE = int(os.environ.get('BADGE_RECOMPUTE_BATCH_SIZE') or 5000)
+    # Server-Timing headers, per-request log lines and /admin/metrics histograms
+    INSTRUMENTATION_ENABLED = (os.environ.get('INSTRUMENTATION_ENABLED') or 'true').lower() == 'true'
+    # Log a request as an N+1 suspect once one statement shape runs more often than this
+    INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = int(os.environ.get('INSTRUMENTATION_N_PLUS_ONE_THRESHOLD') or 10)
 
 class TestingConfig(Config):
     TESTING = True
@@ -16,3 +90,6 @@ class TestingConfig(Config):
     WTF_CSRF_ENABLED = False # Disable CSRF for tests
     SECRET_KEY = 'test-secret-key'
     JWT_SECRET_KEY = 'test-jwt-secret-key'
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000' # keep tests fast
+    JOBS_MODE = 'manual' # tests run jobs explicitly with jobs.run_pending()
+    SUGGEST_SNAPSHOT_PATH = ''
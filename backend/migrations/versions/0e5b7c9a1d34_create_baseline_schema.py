@@ -0,0 +1,126 @@
+"""Create the schema the app shipped with before it had migrations
+
+Databases created back then with ``db.create_all()`` already have these
+tables, and so does any database created with ``db.create_all()`` since, so
+each table is only created when it is missing. An empty database is brought
+up to date by running every revision from this one.
+
+Revision ID: 0e5b7c9a1d34
+Revises:
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0e5b7c9a1d34'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Parents before children.
+TABLES = ('news_articles', 'events', 'badges', 'users', 'courses', 'user_badge_association', 'modules',
+          'topics', 'user_topic_progress', 'resources')
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'news_articles' not in existing:
+        op.create_table('news_articles',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=False),
+            sa.Column('content', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'events' not in existing:
+        op.create_table('events',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('title', sa.String(length=200), nullable=False),
+            sa.Column('description', sa.Text(), nullable=False),
+            sa.Column('event_date', sa.DateTime(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'badges' not in existing:
+        op.create_table('badges',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=128), nullable=False),
+            sa.Column('description', sa.String(length=256), nullable=True),
+            sa.Column('icon', sa.String(length=128), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name')
+        )
+    if 'users' not in existing:
+        op.create_table('users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=64), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password_hash', sa.String(length=256), nullable=True),
+            sa.Column('role', sa.String(length=20), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+        op.create_index('ix_users_username', 'users', ['username'], unique=True)
+    if 'courses' not in existing:
+        op.create_table('courses',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=128), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('name')
+        )
+    if 'user_badge_association' not in existing:
+        op.create_table('user_badge_association',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('badge_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['badge_id'], ['badges.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('user_id', 'badge_id')
+        )
+    if 'modules' not in existing:
+        op.create_table('modules',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=128), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('course_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['course_id'], ['courses.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'topics' not in existing:
+        op.create_table('topics',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=128), nullable=False),
+            sa.Column('content', sa.Text(), nullable=True),
+            sa.Column('module_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['module_id'], ['modules.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'user_topic_progress' not in existing:
+        op.create_table('user_topic_progress',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('topic_id', sa.Integer(), nullable=False),
+            sa.Column('completed_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['topic_id'], ['topics.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('user_id', 'topic_id')
+        )
+    if 'resources' not in existing:
+        op.create_table('resources',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=128), nullable=False),
+            sa.Column('resource_type', sa.String(length=50), nullable=False),
+            sa.Column('path_or_url', sa.String(length=256), nullable=False),
+            sa.Column('topic_id', sa.Integer(), nullable=False),
+            sa.Column('uploaded_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['topic_id'], ['topics.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    for name in reversed(TABLES):
+        op.drop_table(name)
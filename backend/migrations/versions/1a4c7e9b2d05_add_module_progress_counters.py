@@ -0,0 +1,62 @@
+"""Add per-module topic totals and per-user module progress counters
+
+Badge checks compare ``user_module_progress.completed_count`` with
+``modules.topic_count``, which is backfilled from each module's topics.
+Counters for completions made before this revision are seeded on a user's
+next completion in the module, and "Module Master" badges awarded before
+it are matched to their module by name when ``badges.module_id`` is first
+needed.
+
+Databases created with ``db.create_all()`` from the current models already
+have this schema, so every step is skipped when its table or column exists.
+
+Revision ID: 1a4c7e9b2d05
+Revises: 0e5b7c9a1d34
+Create Date: 2026-10-17 21:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1a4c7e9b2d05'
+down_revision = '0e5b7c9a1d34'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'user_module_progress' not in inspector.get_table_names():
+        op.create_table('user_module_progress',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('module_id', sa.Integer(), nullable=False),
+            sa.Column('completed_count', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['module_id'], ['modules.id']),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('user_id', 'module_id')
+        )
+    if 'topic_count' not in {c['name'] for c in inspector.get_columns('modules')}:
+        op.add_column('modules', sa.Column('topic_count', sa.Integer(), server_default='0', nullable=False))
+        modules = sa.table('modules', sa.column('id'), sa.column('topic_count'))
+        topics = sa.table('topics', sa.column('module_id'))
+        bind.execute(modules.update().values(topic_count=(
+            sa.select(sa.func.count()).select_from(topics).where(topics.c.module_id == modules.c.id).scalar_subquery()
+        )))
+    if 'module_id' not in {c['name'] for c in inspector.get_columns('badges')}:
+        with op.batch_alter_table('badges') as batch_op:
+            batch_op.add_column(sa.Column('module_id', sa.Integer(), nullable=True))
+            batch_op.create_unique_constraint('uq_badges_module_id', ['module_id'])
+            batch_op.create_foreign_key('fk_badges_module_id_modules', 'modules', ['module_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('badges') as batch_op:
+        batch_op.drop_constraint('fk_badges_module_id_modules', type_='foreignkey')
+        batch_op.drop_constraint('uq_badges_module_id', type_='unique')
+        batch_op.drop_column('module_id')
+    with op.batch_alter_table('modules') as batch_op:
+        batch_op.drop_column('topic_count')
+    op.drop_table('user_module_progress')
@@ -0,0 +1,33 @@
+"""Add the catalog_versions table behind ETag / Last-Modified validators
+
+Rows are created on the first change to each catalog table.
+
+Revision ID: 2b6e8a0c4f17
+Revises: 1a4c7e9b2d05
+Create Date: 2026-10-17 21:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b6e8a0c4f17'
+down_revision = '1a4c7e9b2d05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'catalog_versions' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('catalog_versions',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('catalog_versions')
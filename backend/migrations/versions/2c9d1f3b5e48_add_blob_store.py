@@ -0,0 +1,49 @@
+"""Add the content-addressed blob store for uploads
+
+Resources uploaded before this revision keep their ``path_or_url`` and no
+``sha256``; only new uploads are stored as blobs.
+
+Revision ID: 2c9d1f3b5e48
+Revises: 2b6e8a0c4f17
+Create Date: 2026-10-17 21:12:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c9d1f3b5e48'
+down_revision = '2b6e8a0c4f17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'blobs' not in inspector.get_table_names():
+        op.create_table('blobs',
+            sa.Column('sha256', sa.String(length=64), nullable=False),
+            sa.Column('size', sa.BigInteger(), nullable=False),
+            sa.Column('mime_type', sa.String(length=128), nullable=True),
+            sa.Column('ref_count', sa.Integer(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('sha256')
+        )
+    if 'sha256' not in {c['name'] for c in inspector.get_columns('resources')}:
+        with op.batch_alter_table('resources') as batch_op:
+            batch_op.add_column(sa.Column('sha256', sa.String(length=64), nullable=True))
+            batch_op.add_column(sa.Column('size', sa.BigInteger(), nullable=True))
+            batch_op.add_column(sa.Column('mime_type', sa.String(length=128), nullable=True))
+            batch_op.create_foreign_key('fk_resources_sha256_blobs', 'blobs', ['sha256'], ['sha256'])
+            batch_op.create_index('ix_resources_sha256', ['sha256'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('resources') as batch_op:
+        batch_op.drop_index('ix_resources_sha256')
+        batch_op.drop_constraint('fk_resources_sha256_blobs', type_='foreignkey')
+        batch_op.drop_column('mime_type')
+        batch_op.drop_column('size')
+        batch_op.drop_column('sha256')
+    op.drop_table('blobs')
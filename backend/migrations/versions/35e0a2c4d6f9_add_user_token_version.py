@@ -0,0 +1,26 @@
+"""Add users.token_version, bumped to revoke a user's issued tokens
+
+Revision ID: 35e0a2c4d6f9
+Revises: 2c9d1f3b5e48
+Create Date: 2026-10-17 21:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '35e0a2c4d6f9'
+down_revision = '2c9d1f3b5e48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'token_version' not in {c['name'] for c in sa.inspect(op.get_bind()).get_columns('users')}:
+        op.add_column('users', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('token_version')
@@ -0,0 +1,45 @@
+"""Add indexes for catalog listings and reverse lookups
+
+Foreign keys that every listing filters on, the ORDER BY columns of /news
+and /events, and the reverse sides of the progress, badge and module
+progress link tables.
+
+Databases created with ``db.create_all()`` from the current models already
+have these indexes, so every operation is guarded with ``if_not_exists`` /
+``if_exists`` and the revision can be applied to any existing database.
+
+Revision ID: 3f1c2a9d7b10
+Revises: 35e0a2c4d6f9
+Create Date: 2026-10-17 21:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = '35e0a2c4d6f9'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_modules_course_id', 'modules', ['course_id']),
+    ('ix_topics_module_id', 'topics', ['module_id']),
+    ('ix_resources_topic_id', 'resources', ['topic_id']),
+    ('ix_news_articles_created_at', 'news_articles', ['created_at']),
+    ('ix_events_event_date', 'events', ['event_date']),
+    ('ix_user_topic_progress_topic_id_user_id', 'user_topic_progress', ['topic_id', 'user_id']),
+    ('ix_user_badge_association_badge_id', 'user_badge_association', ['badge_id']),
+    ('ix_user_module_progress_module_id', 'user_module_progress', ['module_id']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
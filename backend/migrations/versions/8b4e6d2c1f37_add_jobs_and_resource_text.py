@@ -0,0 +1,47 @@
+"""Add the background jobs table and extracted resource text
+
+Revision ID: 8b4e6d2c1f37
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-17 21:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e6d2c1f37'
+down_revision = '3f1c2a9d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'jobs' not in inspector.get_table_names():
+        op.create_table('jobs',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('kind', sa.String(length=64), nullable=False),
+            sa.Column('payload', sa.JSON(), nullable=False),
+            sa.Column('status', sa.String(length=16), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('max_attempts', sa.Integer(), nullable=False),
+            sa.Column('run_after', sa.DateTime(), nullable=False),
+            sa.Column('locked_by', sa.String(length=128), nullable=True),
+            sa.Column('locked_at', sa.DateTime(), nullable=True),
+            sa.Column('result', sa.JSON(), nullable=True),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_jobs_status_run_after', 'jobs', ['status', 'run_after'], unique=False)
+    if 'text_content' not in {c['name'] for c in inspector.get_columns('resources')}:
+        op.add_column('resources', sa.Column('text_content', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('resources') as batch_op:
+        batch_op.drop_column('text_content')
+    op.drop_index('ix_jobs_status_run_after', table_name='jobs')
+    op.drop_table('jobs')
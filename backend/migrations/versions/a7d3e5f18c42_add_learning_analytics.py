@@ -0,0 +1,123 @@
+"""Add the learning analytics rollups, active learners and learner totals
+
+Tables created here are filled from the existing progress and badges, as
+``flask analytics rebuild`` would. Completions are counted by day; the
+days older than ``ANALYTICS_DAILY_DAYS`` are merged into months by the
+next ``analytics.compact`` job.
+
+Revision ID: a7d3e5f18c42
+Revises: f2b8d4c6a913
+Create Date: 2026-10-18 00:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e5f18c42'
+down_revision = 'f2b8d4c6a913'
+branch_labels = None
+depends_on = None
+
+ROLLUP_COLUMNS = ['metric', 'scope', 'scope_id', 'period', 'start', 'value']
+
+
+def _backfill(bind, created):
+    progress = sa.table('user_topic_progress', sa.column('user_id'), sa.column('topic_id'), sa.column('completed_at'))
+    topics = sa.table('topics', sa.column('id'), sa.column('module_id'))
+    modules = sa.table('modules', sa.column('id'), sa.column('course_id'))
+    badges = sa.table('user_badge_association', sa.column('user_id'))
+    users = sa.table('users', sa.column('id'))
+    rollups = sa.table('analytics_rollups', *(sa.column(name) for name in ROLLUP_COLUMNS))
+    learners = sa.table('active_learners', sa.column('period'), sa.column('start', sa.Date()), sa.column('user_id'))
+    stats = sa.table('learner_stats', sa.column('user_id'), sa.column('completions'), sa.column('badges'))
+    day = sa.func.date(progress.c.completed_at, type_=sa.Date())
+
+    if 'analytics_rollups' in created:
+        with_topics = progress.join(topics, topics.c.id == progress.c.topic_id)
+        per_scope = {
+            'topic': (progress.c.topic_id, progress),
+            'module': (topics.c.module_id, with_topics),
+            'course': (modules.c.course_id, with_topics.join(modules, modules.c.id == topics.c.module_id)),
+            'site': (sa.literal(0), progress),
+        }
+        for scope, (scope_id, source) in per_scope.items():
+            group = [day] if scope == 'site' else [scope_id, day]
+            bind.execute(rollups.insert().from_select(ROLLUP_COLUMNS, (
+                sa.select(sa.literal('completions'), sa.literal(scope), scope_id, sa.literal('day'), day, sa.func.count())
+                .select_from(source).where(progress.c.completed_at.is_not(None)).group_by(*group)
+            )))
+
+    if 'active_learners' in created:
+        bind.execute(learners.insert().from_select(['period', 'start', 'user_id'], (
+            sa.select(sa.literal('day'), day, progress.c.user_id).distinct()
+            .where(progress.c.completed_at.is_not(None))
+        )))
+        months = {}
+        for active_day in bind.execute(sa.select(learners.c.start).distinct()).scalars():
+            months.setdefault(active_day.replace(day=1), []).append(active_day)
+        for month, days in months.items():
+            bind.execute(learners.insert().from_select(['period', 'start', 'user_id'], (
+                sa.select(sa.literal('month'), sa.literal(month, sa.Date()), learners.c.user_id).distinct()
+                .where(learners.c.period == 'day', learners.c.start.in_(days))
+            )))
+        if 'analytics_rollups' in created:
+            bind.execute(rollups.insert().from_select(ROLLUP_COLUMNS, (
+                sa.select(sa.literal('active_learners'), sa.literal('site'), sa.literal(0), learners.c.period,
+                          learners.c.start, sa.func.count())
+                .group_by(learners.c.period, learners.c.start)
+            )))
+
+    if 'learner_stats' in created:
+        completed = sa.select(sa.func.count()).where(progress.c.user_id == users.c.id).scalar_subquery()
+        awarded = sa.select(sa.func.count()).where(badges.c.user_id == users.c.id).scalar_subquery()
+        bind.execute(stats.insert().from_select(['user_id', 'completions', 'badges'], (
+            sa.select(users.c.id, completed, awarded).where(sa.or_(
+                sa.exists().where(progress.c.user_id == users.c.id),
+                sa.exists().where(badges.c.user_id == users.c.id),
+            ))
+        )))
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+    if 'analytics_rollups' not in tables:
+        op.create_table('analytics_rollups',
+            sa.Column('metric', sa.String(length=32), nullable=False),
+            sa.Column('scope', sa.String(length=16), nullable=False),
+            sa.Column('scope_id', sa.Integer(), nullable=False),
+            sa.Column('period', sa.String(length=8), nullable=False),
+            sa.Column('start', sa.Date(), nullable=False),
+            sa.Column('value', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('metric', 'scope', 'scope_id', 'period', 'start'),
+        )
+        op.create_index('ix_analytics_rollups_metric_scope_start', 'analytics_rollups',
+                        ['metric', 'scope', 'start'], unique=False)
+    if 'active_learners' not in tables:
+        op.create_table('active_learners',
+            sa.Column('period', sa.String(length=8), nullable=False),
+            sa.Column('start', sa.Date(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('period', 'start', 'user_id'),
+        )
+    if 'learner_stats' not in tables:
+        op.create_table('learner_stats',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('completions', sa.Integer(), nullable=False),
+            sa.Column('badges', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('user_id'),
+        )
+        op.create_index('ix_learner_stats_completions', 'learner_stats', ['completions', 'user_id'], unique=False)
+        op.create_index('ix_learner_stats_badges', 'learner_stats', ['badges', 'user_id'], unique=False)
+    _backfill(bind, {'analytics_rollups', 'active_learners', 'learner_stats'} - tables)
+
+
+def downgrade():
+    op.drop_table('learner_stats')
+    op.drop_table('active_learners')
+    op.drop_index('ix_analytics_rollups_metric_scope_start', table_name='analytics_rollups')
+    op.drop_table('analytics_rollups')
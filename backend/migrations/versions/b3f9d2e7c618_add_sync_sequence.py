@@ -0,0 +1,38 @@
+"""Add the sync_sequence row that hands out /sync seqs in commit order
+
+The row starts at the highest ``sync_changes.seq`` already logged.
+
+Revision ID: b3f9d2e7c618
+Revises: a7d3e5f18c42
+Create Date: 2026-10-18 00:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f9d2e7c618'
+down_revision = 'a7d3e5f18c42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'sync_sequence' not in sa.inspect(bind).get_table_names():
+        op.create_table('sync_sequence',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('last_seq', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+    sequence = sa.table('sync_sequence', sa.column('id'), sa.column('last_seq'))
+    if bind.execute(sa.select(sequence.c.id)).first() is None:
+        changes = sa.table('sync_changes', sa.column('seq'))
+        bind.execute(sequence.insert().values(
+            id=1, last_seq=sa.select(sa.func.coalesce(sa.func.max(changes.c.seq), 0)).scalar_subquery()
+        ))
+
+
+def downgrade():
+    op.drop_table('sync_sequence')
@@ -0,0 +1,59 @@
+"""Cascade catalog deletes in the database
+
+Deleting a course, module or topic removes its descendants, completions and
+module progress through ``ON DELETE CASCADE``; a deleted module's badge
+keeps its holders and loses its ``module_id`` (``ON DELETE SET NULL``).
+
+SQLite cannot alter a constraint in place, so each table is rebuilt in
+batch mode. Constraints that already have the wanted action (databases
+created with ``db.create_all()`` from the current models) are left alone.
+
+Revision ID: c5a7e3f90d21
+Revises: 8b4e6d2c1f37
+Create Date: 2026-10-17 22:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a7e3f90d21'
+down_revision = '8b4e6d2c1f37'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table, ON DELETE action)
+FOREIGN_KEYS = [
+    ('modules', 'course_id', 'courses', 'CASCADE'),
+    ('topics', 'module_id', 'modules', 'CASCADE'),
+    ('resources', 'topic_id', 'topics', 'CASCADE'),
+    ('user_topic_progress', 'topic_id', 'topics', 'CASCADE'),
+    ('user_module_progress', 'module_id', 'modules', 'CASCADE'),
+    ('badges', 'module_id', 'modules', 'SET NULL'),
+]
+
+# Lets batch mode find SQLite's unnamed constraints by the name we give them.
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _set_ondelete(table, column, referred, ondelete):
+    inspector = sa.inspect(op.get_bind())
+    existing = next(fk for fk in inspector.get_foreign_keys(table)
+                    if fk['constrained_columns'] == [column] and fk['referred_table'] == referred)
+    if (existing.get('options', {}).get('ondelete') or '').upper() == (ondelete or ''):
+        return
+    name = existing['name'] or f'fk_{table}_{column}_{referred}'
+    with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(name, type_='foreignkey')
+        batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    for table, column, referred, ondelete in FOREIGN_KEYS:
+        _set_ondelete(table, column, referred, ondelete)
+
+
+def downgrade():
+    for table, column, referred, _ in reversed(FOREIGN_KEYS):
+        _set_ondelete(table, column, referred, None)
@@ -0,0 +1,33 @@
+"""Record when badges are awarded and index completion times for exports
+
+Badges awarded before this revision have no ``awarded_at`` and are only
+included in exports without ``since``.
+
+Revision ID: d81f4b6a2e93
+Revises: c5a7e3f90d21
+Create Date: 2026-10-17 22:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81f4b6a2e93'
+down_revision = 'c5a7e3f90d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'awarded_at' not in {c['name'] for c in inspector.get_columns('user_badge_association')}:
+        op.add_column('user_badge_association', sa.Column('awarded_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_user_topic_progress_completed_at', 'user_topic_progress', ['completed_at'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_user_topic_progress_completed_at', table_name='user_topic_progress', if_exists=True)
+    with op.batch_alter_table('user_badge_association') as batch_op:
+        batch_op.drop_column('awarded_at')
@@ -0,0 +1,70 @@
+"""Add updated_at columns and the sync_changes log behind /sync
+
+``updated_at`` starts out as the row's creation time where one exists.
+The log is seeded with one change per existing record, so clients
+starting without a cursor receive the whole catalog.
+
+Revision ID: e4c9a1d7f502
+Revises: d81f4b6a2e93
+Create Date: 2026-10-17 23:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4c9a1d7f502'
+down_revision = 'd81f4b6a2e93'
+branch_labels = None
+depends_on = None
+
+# (table, sync kind, column to start updated_at from)
+SYNCED_TABLES = [
+    ('courses', 'course', None),
+    ('modules', 'module', None),
+    ('topics', 'topic', None),
+    ('resources', 'resource', 'uploaded_at'),
+    ('news_articles', 'news', 'created_at'),
+    ('events', 'event', 'created_at'),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    for table, _, created_column in SYNCED_TABLES:
+        if 'updated_at' in {c['name'] for c in inspector.get_columns(table)}:
+            continue
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        rows = sa.table(table, sa.column('updated_at'), *([sa.column(created_column)] if created_column else []))
+        start = sa.func.coalesce(rows.c[created_column], sa.func.now()) if created_column else sa.func.now()
+        bind.execute(rows.update().values(updated_at=start))
+
+    if 'sync_changes' in inspector.get_table_names():
+        return
+    op.create_table('sync_changes',
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=32), nullable=False),
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('deleted', sa.Boolean(), nullable=False),
+        sa.Column('changed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('seq'),
+        sa.UniqueConstraint('kind', 'record_id', name='uq_sync_changes_kind_record_id'),
+        sqlite_autoincrement=True,
+    )
+    changes = sa.table('sync_changes', sa.column('kind'), sa.column('record_id'), sa.column('deleted'),
+                       sa.column('changed_at'))
+    for table, kind, _ in SYNCED_TABLES:
+        rows = sa.table(table, sa.column('id'))
+        bind.execute(changes.insert().from_select(
+            ['kind', 'record_id', 'deleted', 'changed_at'],
+            sa.select(sa.literal(kind), rows.c.id, sa.false(), sa.func.now()).order_by(rows.c.id),
+        ))
+
+
+def downgrade():
+    op.drop_table('sync_changes')
+    for table, _, _ in reversed(SYNCED_TABLES):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,36 @@
+"""Index news and events by their full keyset for paginated lists
+
+The composite indexes replace the single-column ones, which they cover.
+
+Revision ID: f2b8d4c6a913
+Revises: e4c9a1d7f502
+Create Date: 2026-10-17 23:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b8d4c6a913'
+down_revision = 'e4c9a1d7f502'
+branch_labels = None
+depends_on = None
+
+# (table, old single-column index, new keyset index, keyset columns)
+KEYSET_INDEXES = [
+    ('news_articles', 'ix_news_articles_created_at', 'ix_news_articles_created_at_id', ['created_at', 'id']),
+    ('events', 'ix_events_event_date', 'ix_events_event_date_id', ['event_date', 'id']),
+]
+
+
+def upgrade():
+    for table, old_name, new_name, columns in KEYSET_INDEXES:
+        op.create_index(new_name, table, columns, unique=False, if_not_exists=True)
+        op.drop_index(old_name, table_name=table, if_exists=True)
+
+
+def downgrade():
+    for table, old_name, new_name, columns in KEYSET_INDEXES:
+        op.create_index(old_name, table, columns[:1], unique=False, if_not_exists=True)
+        op.drop_index(new_name, table_name=table, if_exists=True)
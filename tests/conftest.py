@@ -1,5 +1,8 @@
+import io
+import json
 import pytest
 from backend.app import create_app, db
+from backend.app.models import Course, Module, Topic, User
 from backend.config import TestingConfig
 
 @pytest.fixture(scope='function')
@@ -24,3 +27,59 @@ def test_client():
         # Tear down the database
         db.session.remove()
         db.drop_all()
+
+@pytest.fixture(scope='function')
+def auth_headers(test_client):
+    """
+    Returns a helper that creates a user, logs them in and returns auth headers.
+    """
+    def _auth_headers(username='adminuser', password='adminpassword', role='admin'):
+        user = User(username=username, email=f'{username}@example.com', role=role)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+
+        response = test_client.post('/auth/login',
+                                    data=json.dumps({'username': username, 'password': password}),
+                                    content_type='application/json')
+        token = json.loads(response.data)['access_token']
+        return {'Authorization': f'Bearer {token}'}
+
+    return _auth_headers
+
+@pytest.fixture(scope='function')
+def seed_module(test_client):
+    """
+    Returns a helper that creates a course with one module of `topics` topics and returns their ids.
+    """
+    def _seed_module(topics=2):
+        course = Course(name='Physiology')
+        module = Module(name='Renal', course=course, topic_count=topics)
+        db.session.add_all([course, module, *(Topic(name=f'Topic {t}', module=module) for t in range(topics))])
+        db.session.commit()
+        return module.id, [t.id for t in module.topics]
+
+    return _seed_module
+
+@pytest.fixture(scope='function')
+def topic_id(test_client, tmp_path):
+    """
+    Creates a topic to upload resources to, with uploads stored under tmp_path, and returns its id.
+    """
+    test_client.application.config['UPLOAD_FOLDER'] = str(tmp_path)
+    topic = Topic(name='ECG basics', module=Module(name='Cardiology', course=Course(name='Medicine')))
+    db.session.add(topic)
+    db.session.commit()
+    return topic.id
+
+@pytest.fixture(scope='function')
+def upload():
+    """
+    Returns a helper that uploads `content` as `filename` to a topic's resources through `client`.
+    """
+    def _upload(client, headers, topic_id, content, filename):
+        return client.post(f'/admin/topics/{topic_id}/resources', headers=headers,
+                           data={'file': (io.BytesIO(content), filename)},
+                           content_type='multipart/form-data')
+
+    return _upload
@@ -0,0 +1,115 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import select
+from backend.app import analytics, db, jobs
+from backend.app.instrumentation import count_queries
+from backend.app.models import AnalyticsRollup, Job, LearnerStats, User
+
+
+def complete(test_client, headers, topic_id):
+    return test_client.post(f'/api/topics/{topic_id}/complete', headers=headers)
+
+
+def complete_many(test_client, headers, completions):
+    response = test_client.post('/api/topics/complete', headers=headers, data=json.dumps({'completions': completions}),
+                                content_type='application/json')
+    assert response.status_code == 201
+
+
+def get(test_client, headers, url, **params):
+    response = test_client.get(url, headers=headers, query_string=params)
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+
+def rollups():
+    return sorted(db.session.execute(select(AnalyticsRollup.metric, AnalyticsRollup.scope, AnalyticsRollup.scope_id,
+                                            AnalyticsRollup.period, AnalyticsRollup.start,
+                                            AnalyticsRollup.value)).all())
+
+
+def test_completions_feed_rollups_and_leaderboards(test_client, auth_headers, seed_module):
+    """
+    GIVEN a module with three topics and two students
+    WHEN one student completes every topic (one of them offline, last week) and the other completes one
+    THEN the admin rankings, daily activity and leaderboards reflect it without reading raw progress rows
+    """
+    module_id, topic_ids = seed_module(topics=3)
+    admin = auth_headers()
+    alice = auth_headers(username='alice', role='student')
+    bob = auth_headers(username='bob', role='student')
+    today = datetime.now(timezone.utc).date()
+    last_week = today - timedelta(days=7)
+
+    complete(test_client, alice, topic_ids[0])
+    complete_many(test_client, alice, [topic_ids[1],
+                                       {'topic_id': topic_ids[2], 'completed_at': f'{last_week}T09:00:00Z'}])
+    complete(test_client, bob, topic_ids[0])
+
+    with count_queries() as queries:
+        topics = get(test_client, admin, '/admin/analytics/completions', scope='topic')
+        courses = get(test_client, admin, '/admin/analytics/completions', scope='course', **{'from': today.isoformat()})
+        activity = get(test_client, admin, '/admin/analytics/activity')
+        by_completions = get(test_client, admin, '/admin/analytics/leaderboard')
+        by_badges = get(test_client, admin, '/admin/analytics/leaderboard', by='badges', limit=1)
+    assert not [s for s in queries.statements if 'user_topic_progress' in s or 'user_badge_association' in s]
+
+    assert topics[0] == {'id': topic_ids[0], 'name': 'Topic 0', 'completions': 2}
+    assert courses == [{'id': 1, 'name': 'Physiology', 'completions': 3}]
+    assert activity == [
+        {'start': last_week.isoformat(), 'completions': 1, 'active_learners': 1},
+        {'start': today.isoformat(), 'completions': 3, 'active_learners': 2},
+    ]
+    assert [(u['username'], u['completions'], u['badges']) for u in by_completions] == [('alice', 3, 1), ('bob', 1, 0)]
+    assert [u['username'] for u in by_badges] == ['alice']
+    assert test_client.get('/admin/analytics/completions?scope=users', headers=admin).status_code == 400
+
+
+def test_compaction_merges_old_days_into_months(test_client, auth_headers, seed_module):
+    """
+    GIVEN completions synced for two days of an old month, by the same student, plus one today
+    WHEN the compaction job queued by today's first completion runs
+    THEN the old days are merged into one month bucket that still counts the student once
+    """
+    _, topic_ids = seed_module(topics=3)
+    alice = auth_headers(username='alice', role='student')
+    admin = auth_headers()
+    complete_many(test_client, alice, [{'topic_id': topic_ids[0], 'completed_at': '2024-03-04T10:00:00Z'},
+                                       {'topic_id': topic_ids[1], 'completed_at': '2024-03-20T10:00:00Z'}])
+    complete(test_client, alice, topic_ids[2])
+    assert Job.query.filter_by(kind='analytics.compact', status='queued').count() == 1
+
+    jobs.run_pending()
+
+    old = [r for r in rollups() if r.start < date(2024, 4, 1)]
+    assert {r.period for r in old} == {'month'}
+    assert ('active_learners', 'site', 0, 'month', date(2024, 3, 1), 1) in old
+    assert ('completions', 'module', 1, 'month', date(2024, 3, 1), 2) in old
+    months = get(test_client, admin, '/admin/analytics/activity', period='month')
+    assert months[0] == {'start': '2024-03-01', 'completions': 2, 'active_learners': 1}
+    assert months[-1]['completions'] == 1
+    days = get(test_client, admin, '/admin/analytics/activity', period='day')
+    assert [d['start'] for d in days] == [datetime.now(timezone.utc).date().isoformat()]
+
+
+def test_rebuild_matches_incremental_rollups(test_client, auth_headers, seed_module):
+    """
+    GIVEN rollups kept up to date by completions, then a deleted topic
+    WHEN the analytics are rebuilt from the raw rows
+    THEN the rebuilt rollups equal the incremental ones, except the deleted topic's completions are history
+    """
+    _, topic_ids = seed_module(topics=2)
+    alice = auth_headers(username='alice', role='student')
+    admin = auth_headers()
+    complete(test_client, alice, topic_ids[0])
+    complete_many(test_client, alice, [{'topic_id': topic_ids[1], 'completed_at': '2025-01-15T10:00:00Z'}])
+    jobs.run_pending()
+    incremental = rollups()
+
+    analytics.rebuild()
+    assert rollups() == incremental
+
+    test_client.delete(f'/admin/topics/{topic_ids[0]}', headers=admin)
+    alice_id = User.query.filter_by(username='alice').one().id
+    assert db.session.get(LearnerStats, alice_id).completions == 1
+    assert rollups() == incremental
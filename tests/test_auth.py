@@ -84,3 +84,123 @@ def test_invalid_login(test_client):
                                 content_type='application/json')
     assert response.status_code == 401
     assert b"Invalid username or password" in response.data
+
+def test_authenticated_request_needs_no_user_query(test_client, auth_headers):
+    """
+    GIVEN a logged in user
+    WHEN '/api/progress' is requested
+    THEN the only SQL statement is the progress query itself
+    """
+    from sqlalchemy import event
+    headers = auth_headers(username='student', role='student')
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = test_client.get('/api/progress', headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200
+    assert len(statements) == 1
+    assert 'user_topic_progress' in statements[0]
+
+def test_role_change_revokes_tokens(test_client, auth_headers):
+    """
+    GIVEN an admin and a second admin's token
+    WHEN the second admin is demoted to student
+    THEN their old token is rejected and a fresh login carries the new role
+    """
+    headers = auth_headers()
+    other_headers = auth_headers(username='otheradmin', password='otherpassword')
+    other = User.query.filter_by(username='otheradmin').first()
+    assert test_client.get('/admin/users', headers=other_headers).status_code == 200
+
+    response = test_client.put(f'/admin/users/{other.id}', headers=headers,
+                               data=json.dumps({'role': 'student'}), content_type='application/json')
+    assert response.status_code == 200
+
+    revoked = test_client.get('/admin/users', headers=other_headers)
+    assert revoked.status_code == 401
+    assert b"Token has been revoked" in revoked.data
+
+    response = test_client.post('/auth/login', data=json.dumps({'username': 'otheradmin', 'password': 'otherpassword'}),
+                                content_type='application/json')
+    new_headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+    assert test_client.get('/admin/users', headers=new_headers).status_code == 403
+    assert test_client.get('/api/progress', headers=new_headers).status_code == 200
+
+def test_login_rehashes_outdated_password(test_client):
+    """
+    GIVEN a user whose password was hashed with a cheaper method
+    WHEN they log in
+    THEN the stored hash is upgraded to the configured method
+    """
+    from werkzeug.security import generate_password_hash
+    user = User(username='legacy', email='legacy@example.com',
+                password_hash=generate_password_hash('legacypassword', 'pbkdf2:sha256:500'))
+    db.session.add(user)
+    db.session.commit()
+
+    response = test_client.post('/auth/login', data=json.dumps({'username': 'legacy', 'password': 'legacypassword'}),
+                                content_type='application/json')
+    assert response.status_code == 200
+    db.session.refresh(user)
+    assert user.password_hash.startswith('pbkdf2:sha256:1000$')
+    assert user.check_password('legacypassword')
+
+def test_login_returns_503_when_hasher_is_saturated(test_client):
+    """
+    GIVEN a password hasher with one worker, no queue and that worker busy
+    WHEN a user tries to log in
+    THEN the login is rejected with 503 and Retry-After instead of waiting
+    """
+    import threading
+    from backend.app.passwords import PasswordHasher
+    user = User(username='busy', email='busy@example.com')
+    user.set_password('busypassword')
+    db.session.add(user)
+    db.session.commit()
+
+    app = test_client.application
+    hasher = PasswordHasher(method='pbkdf2:sha256:1000', max_workers=1, max_queue=0, retry_after=3)
+    release = threading.Event()
+    blocker = threading.Thread(target=hasher._run, args=(release.wait,))
+    original = app.extensions['password_hasher']
+    app.extensions['password_hasher'] = hasher
+    blocker.start()
+    try:
+        while hasher.stats()['in_flight'] == 0:
+            pass
+        response = test_client.post('/auth/login', data=json.dumps({'username': 'busy', 'password': 'busypassword'}),
+                                    content_type='application/json')
+    finally:
+        release.set()
+        blocker.join()
+        app.extensions['password_hasher'] = original
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+    assert hasher.stats()['rejected'] == 1
+
+def test_admin_routes_see_revocations_from_other_workers(test_client, auth_headers):
+    """
+    GIVEN two admins whose identities this worker has cached
+    WHEN another worker demotes one and deletes the other, evicting only its own cache
+    THEN both tokens are rejected by admin routes straight away
+    """
+    from backend.app.identity import revoke_tokens
+    demoted_headers = auth_headers(username='demoted', password='demotedpassword')
+    deleted_headers = auth_headers(username='deleted', password='deletedpassword')
+    for headers in (demoted_headers, deleted_headers):
+        assert test_client.get('/admin/users', headers=headers).status_code == 200
+
+    demoted = User.query.filter_by(username='demoted').one()
+    demoted.role = 'student'
+    revoke_tokens(demoted)
+    db.session.delete(User.query.filter_by(username='deleted').one())
+    db.session.commit()
+
+    for headers in (demoted_headers, deleted_headers):
+        response = test_client.get('/admin/users', headers=headers)
+        assert response.status_code == 401
+        assert b"Token has been revoked" in response.data
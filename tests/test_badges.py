@@ -0,0 +1,139 @@
+import json
+from sqlalchemy import select
+from backend.app import db, jobs
+from backend.app.models import (Badge, Job, LearnerStats, Module, User, UserModuleProgress,
+                                user_badge_association, user_topic_progress)
+
+
+def complete(test_client, headers, topic_id):
+    return test_client.post(f'/api/topics/{topic_id}/complete', headers=headers)
+
+
+def holders(module_id):
+    return sorted(db.session.execute(
+        select(User.username).join(user_badge_association, user_badge_association.c.user_id == User.id)
+        .join(Badge, Badge.id == user_badge_association.c.badge_id).where(Badge.module_id == module_id)
+    ).scalars())
+
+
+def test_topic_changes_revoke_and_award_module_badges(test_client, auth_headers, seed_module):
+    """
+    GIVEN a two-topic module that alice finished and bob half finished
+    WHEN an admin adds a topic, then deletes the ones nobody but alice completed, and the queued jobs run
+    THEN alice loses the badge for the bigger module, and bob earns it once only his topic is left
+    """
+    module_id, topic_ids = seed_module(topics=2)
+    admin = auth_headers()
+    alice = auth_headers(username='alice', role='student')
+    bob = auth_headers(username='bob', role='student')
+    for topic_id in topic_ids:
+        complete(test_client, alice, topic_id)
+    complete(test_client, bob, topic_ids[0])
+    assert holders(module_id) == ['alice']
+
+    response = test_client.post(f'/admin/modules/{module_id}/topics', headers=admin,
+                                data=json.dumps({'name': 'Topic 2'}), content_type='application/json')
+    new_topic_id = json.loads(response.data)['id']
+    assert Job.query.filter_by(kind='badges.recompute', status='queued').one().payload == {'module_ids': [module_id]}
+    jobs.run_pending()
+    assert holders(module_id) == []
+
+    test_client.delete(f'/admin/topics/{topic_ids[1]}', headers=admin)
+    test_client.delete(f'/admin/topics/{new_topic_id}', headers=admin)
+    jobs.run_pending()
+    assert holders(module_id) == ['alice', 'bob']
+    stats = dict(db.session.execute(select(User.username, LearnerStats.badges).join(LearnerStats)).all())
+    assert stats == {'alice': 1, 'bob': 1}
+
+
+def test_topic_edits_widen_the_queued_recompute(test_client, auth_headers, seed_module):
+    """
+    GIVEN two modules and an admin
+    WHEN several topics are added to both, a whole-catalog recompute is requested, and another topic is added
+    THEN a single queued job covers them all, and a topic added once it has run queues a new one
+    """
+    module_id, _ = seed_module(topics=1)
+    other = Module(name='Cardiac', course_id=db.session.get(Module, module_id).course_id)
+    db.session.add(other)
+    db.session.commit()
+    other_id = other.id
+    admin = auth_headers()
+
+    def add_topic(target, name):
+        return test_client.post(f'/admin/modules/{target}/topics', headers=admin,
+                                data=json.dumps({'name': name}), content_type='application/json')
+
+    for n in range(3):
+        add_topic(module_id, f'Extra {n}')
+    add_topic(other_id, 'Extra')
+    queued = Job.query.filter_by(kind='badges.recompute', status='queued').one()
+    assert queued.payload == {'module_ids': sorted([module_id, other_id])}
+
+    job_id = json.loads(test_client.post('/admin/badges/recompute', headers=admin).data)['id']
+    add_topic(module_id, 'Extra 3')
+    assert job_id == queued.id
+    assert [(j.id, j.payload) for j in Job.query.filter_by(kind='badges.recompute')] == [(job_id, {})]
+
+    jobs.run_pending()
+    add_topic(other_id, 'Late')
+    assert Job.query.filter_by(kind='badges.recompute', status='queued').one().payload == {'module_ids': [other_id]}
+
+
+def test_recompute_job_reports_progress_per_batch(test_client, auth_headers, monkeypatch, seed_module):
+    """
+    GIVEN completions recorded before the module counters existed, for users spread over several batches
+    WHEN an admin queues a whole-catalog recompute with a small batch size
+    THEN the counters are seeded, the badge is created and awarded, and the job shows every batch it ran
+    """
+    monkeypatch.setitem(test_client.application.config, 'BADGE_RECOMPUTE_BATCH_SIZE', 2)
+    module_id, topic_ids = seed_module(topics=2)
+    admin = auth_headers()
+    users = [User(username=f'u{i}', email=f'u{i}@example.com', password_hash='x') for i in range(5)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.execute(user_topic_progress.insert(), [{'user_id': u.id, 'topic_id': t}
+                                                       for u in users[:3] for t in topic_ids])
+    db.session.commit()
+
+    response = test_client.post('/admin/badges/recompute', headers=admin)
+    assert response.status_code == 202
+    job_id = json.loads(response.data)['id']
+    progress = []
+    report_progress = jobs.report_progress
+    monkeypatch.setattr(jobs, 'report_progress', lambda p: progress.append(p) or report_progress(p))
+    jobs.run_pending()
+
+    job = json.loads(test_client.get(f'/admin/jobs/{job_id}', headers=admin).data)
+    assert job['status'] == 'succeeded'
+    assert [p['batches'] for p in progress] == [1, 2, 3]
+    assert job['result'] == {'module_ids': None, 'batches': 3, 'total_batches': 3, 'counters_seeded': 3,
+                             'badges_created': 1, 'awarded': 3, 'revoked': 0}
+    assert holders(module_id) == ['u0', 'u1', 'u2']
+    assert UserModuleProgress.query.count() == 3
+
+    assert test_client.post('/admin/badges/recompute', headers=admin, data=json.dumps({'module_ids': 'all'}),
+                            content_type='application/json').status_code == 400
+
+
+def test_cli_recompute_is_idempotent(test_client, auth_headers, seed_module):
+    """
+    GIVEN a module badge held by a user who never completed the module
+    WHEN the recompute command runs twice for that module
+    THEN the first run revokes it and the second finds nothing to change
+    """
+    module_id, topic_ids = seed_module(topics=2)
+    alice = auth_headers(username='alice', role='student')
+    complete(test_client, alice, topic_ids[0])
+    badge = Badge(name='Module Master - Renal', module_id=module_id)
+    db.session.add(badge)
+    db.session.flush()
+    db.session.execute(user_badge_association.insert().values(
+        user_id=User.query.filter_by(username='alice').one().id, badge_id=badge.id))
+    db.session.commit()
+
+    runner = test_client.application.test_cli_runner()
+    first = runner.invoke(args=['badges', 'recompute', '--module', str(module_id)])
+    assert 'Done: 0 badge(s) awarded, 1 revoked' in first.output
+    second = runner.invoke(args=['badges', 'recompute', '--module', str(module_id)])
+    assert 'Done: 0 badge(s) awarded, 0 revoked' in second.output
+    assert holders(module_id) == []
@@ -0,0 +1,47 @@
+from sqlalchemy import func, select
+from backend.app import db
+from backend.app.models import Module, Topic, UserModuleProgress, user_topic_progress
+from backend.benchmarks import runner
+from backend.benchmarks.seed import seed
+
+def test_seed_is_reproducible_and_consistent(test_client):
+    """
+    GIVEN an empty database
+    WHEN the benchmark seeder runs
+    THEN it creates the requested rows and the per-module counters match the completions
+    """
+    counts = seed(courses=2, modules_per_course=2, topics_per_module=3, resources_per_topic=1, users=5,
+                  completions=20, seed=7)
+    assert counts['topics'] == 12
+    assert counts['completions'] == 20
+    assert db.session.scalar(select(func.count()).select_from(user_topic_progress)) == 20
+    assert db.session.scalar(select(func.sum(UserModuleProgress.completed_count))) == 20
+    assert set(db.session.execute(select(Module.topic_count)).scalars()) == {3}
+    first_names = db.session.execute(select(Topic.name).order_by(Topic.id)).scalars().all()
+
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    seed(courses=2, modules_per_course=2, topics_per_module=3, resources_per_topic=1, users=5,
+         completions=20, seed=7)
+    assert db.session.execute(select(Topic.name).order_by(Topic.id)).scalars().all() == first_names
+
+def test_benchmark_report_and_compare(test_client):
+    """
+    GIVEN a seeded catalog
+    WHEN two scenarios are benchmarked and the report is compared with a slower copy of itself
+    THEN the report has latency and SQL statistics and the slowdown is flagged
+    """
+    seed(courses=1, modules_per_course=2, topics_per_module=2, resources_per_topic=1, users=3, completions=5)
+    report = runner.run(test_client.application, scenarios=['topic', 'progress'], requests=5, warmup=1)
+
+    progress = report['results']['progress']
+    assert progress['errors'] == 0
+    assert progress['p50_ms'] <= progress['p95_ms'] <= progress['p99_ms']
+    assert progress['sql_per_request'] == 1
+
+    slower = {'results': {name: dict(result, p95_ms=result['p95_ms'] * 2 + 1)
+                          for name, result in report['results'].items()}}
+    _, regressions = runner.compare(report, slower, threshold=0.2)
+    assert sorted(regressions) == ['progress', 'topic']
+    assert runner.compare(report, report)[1] == []
@@ -0,0 +1,89 @@
+import json
+from sqlalchemy import event
+from backend.app import db
+from backend.app.cache import FakeCache, LRUCache
+from backend.app.models import Course, Module, NewsArticle, Topic
+
+
+def test_lru_cache_limits_and_ttl():
+    """
+    GIVEN an LRU cache with two slots and a controllable clock
+    WHEN entries are added, read and allowed to expire
+    THEN the least recently used entry is evicted and expired entries miss
+    """
+    now = [0.0]
+    cache = LRUCache(max_entries=2, default_ttl=10, clock=lambda: now[0])
+    cache.set('a', b'1')
+    cache.set('b', b'2')
+    assert cache.get('a') == b'1'
+    cache.set('c', b'3')
+    assert cache.get('b') is None
+    assert cache.get('c') == b'3'
+
+    now[0] = 11.0
+    assert cache.get('a') is None
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['expirations'] == 1 and stats['hits'] == 2
+
+
+def test_cache_hit_skips_database(test_client, auth_headers):
+    """
+    GIVEN a topic whose details have been requested once
+    WHEN they are requested again
+    THEN the response comes from the cache without any SQL
+    """
+    module = Module(name='Neurology', course=Course(name='Medicine'))
+    topic = Topic(name='Stroke', content='Time is brain.', module=module)
+    db.session.add(topic)
+    db.session.commit()
+    headers = auth_headers(username='student', role='student')
+
+    first = test_client.get(f'/topics/{topic.id}', headers=headers)
+    assert first.headers['X-Cache'] == 'MISS'
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        second = test_client.get(f'/topics/{topic.id}', headers=headers)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.data == first.data
+    assert second.headers['ETag'] == first.headers['ETag']
+    assert statements == []
+
+
+def test_topic_update_evicts_exact_keys(test_client, auth_headers):
+    """
+    GIVEN the fake cache backend
+    WHEN an admin updates a topic
+    THEN exactly the topic and its module's topic list are evicted
+    """
+    test_client.application.extensions['response_cache'] = fake = FakeCache()
+    module = Module(name='Neurology', course=Course(name='Medicine'))
+    topic = Topic(name='Stroke', module=module)
+    db.session.add(topic)
+    db.session.commit()
+    headers = auth_headers()
+
+    test_client.get(f'/topics/{topic.id}', headers=headers)
+    test_client.get(f'/modules/{module.id}/topics', headers=headers)
+    assert set(fake.data) == {f'topic:{topic.id}', f'module:{module.id}:topics'}
+
+    test_client.put(f'/admin/topics/{topic.id}', headers=headers,
+                    data=json.dumps({'name': 'Ischaemic stroke'}), content_type='application/json')
+    assert fake.deleted == [f'topic:{topic.id}', f'module:{module.id}:topics']
+    assert json.loads(test_client.get(f'/topics/{topic.id}', headers=headers).data)['name'] == 'Ischaemic stroke'
+
+
+def test_news_cache_follows_table_changes(test_client):
+    """
+    GIVEN a cached news list
+    WHEN a news article is added through the ORM
+    THEN the next request sees it
+    """
+    assert json.loads(test_client.get('/news').data) == []
+    db.session.add(NewsArticle(title='Welcome', content='Hello'))
+    db.session.commit()
+    assert len(json.loads(test_client.get('/news').data)) == 1
@@ -0,0 +1,45 @@
+import json
+from datetime import datetime
+from backend.app import db
+from backend.app.models import Course, NewsArticle
+
+
+def test_course_list_etag_round_trip(test_client, auth_headers):
+    """
+    GIVEN a course list fetched once
+    WHEN it is fetched again with If-None-Match, before and after an admin change
+    THEN a 304 is returned until the catalog changes
+    """
+    db.session.add(Course(name='Pathology'))
+    db.session.commit()
+    headers = auth_headers()
+
+    first = test_client.get('/admin/courses', headers=headers)
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and not etag.startswith('W/')
+
+    cached = test_client.get('/admin/courses', headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+
+    test_client.post('/admin/courses', headers=headers,
+                     data=json.dumps({'name': 'Microbiology'}), content_type='application/json')
+    fresh = test_client.get('/admin/courses', headers={**headers, 'If-None-Match': etag})
+    assert fresh.status_code == 200
+    assert fresh.headers['ETag'] != etag
+    assert len(json.loads(fresh.data)) == 2
+
+
+def test_news_last_modified(test_client):
+    """
+    GIVEN a news article
+    WHEN '/news' is fetched with If-Modified-Since equal to its Last-Modified
+    THEN a 304 is returned
+    """
+    db.session.add(NewsArticle(title='Welcome', content='Hello', created_at=datetime(2024, 1, 1)))
+    db.session.commit()
+
+    first = test_client.get('/news')
+    assert first.status_code == 200
+    cached = test_client.get('/news', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert cached.status_code == 304
@@ -0,0 +1,60 @@
+import json
+from backend.app import db
+from backend.app.instrumentation import query_budget
+from backend.app.models import Course, Module, Topic, Resource
+
+
+def seed_course(modules=3, topics=4):
+    course = Course(name='Anatomy', description='Human anatomy')
+    db.session.add(course)
+    for m in range(modules):
+        module = Module(name=f'Module {m}', course=course)
+        for t in range(topics):
+            topic = Topic(name=f'Topic {m}.{t}', content='x' * 1000, module=module)
+            db.session.add(Resource(name=f'Slides {m}.{t}', resource_type='pdf',
+                                    path_or_url='/tmp/slides.pdf', topic=topic))
+    db.session.commit()
+    return course
+
+
+def test_course_tree_uses_fixed_number_of_queries(test_client, auth_headers):
+    """
+    GIVEN a course with several modules, topics and resources
+    WHEN '/courses/<id>/tree' is requested
+    THEN the whole tree is returned in a constant number of SQL statements
+    """
+    headers = auth_headers(role='student', username='student')
+    course_id = seed_course().id
+    db.session.expunge_all()
+
+    # course, modules, topics and resources, plus the catalog version lookup
+    with query_budget(5):
+        response = test_client.get(f'/courses/{course_id}/tree', headers=headers)
+
+    assert response.status_code == 200
+    tree = json.loads(response.data)
+    assert len(tree['modules']) == 3
+    assert all(len(m['topics']) == 4 for m in tree['modules'])
+    assert tree['modules'][0]['topics'][0]['resources'][0]['name'] == 'Slides 0.0'
+    assert 'content' not in tree['modules'][0]['topics'][0]
+
+
+def test_course_tree_depth_and_fields(test_client, auth_headers):
+    """
+    GIVEN a course tree
+    WHEN '/courses/<id>/tree' is requested with depth and fields parameters
+    THEN only the requested levels and topic fields are returned
+    """
+    headers = auth_headers(role='student', username='student')
+    course = seed_course(modules=1, topics=1)
+
+    shallow = json.loads(test_client.get(f'/courses/{course.id}/tree?depth=1', headers=headers).data)
+    assert 'topics' not in shallow['modules'][0]
+
+    full = json.loads(test_client.get(f'/courses/{course.id}/tree?depth=2&fields=name,content',
+                                      headers=headers).data)
+    topic = full['modules'][0]['topics'][0]
+    assert topic['content'] == 'x' * 1000
+    assert 'resources' not in topic
+
+    assert test_client.get('/courses/999/tree', headers=headers).status_code == 404
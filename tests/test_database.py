@@ -0,0 +1,148 @@
+import json
+import sqlite3
+import pytest
+from sqlalchemy import text
+from backend.app import create_app, db, search
+from backend.app.database import STICKY_COOKIE, replica_reads
+from backend.app.models import Course, Module, Topic, User, user_topic_progress
+from backend.config import TestingConfig
+
+@pytest.fixture(scope='function')
+def replicated_client(tmp_path):
+    """
+    Test client for an app whose primary and replica are two SQLite files.
+    """
+    config = type('ReplicaConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'primary.db'}",
+        'DATABASE_REPLICA_URL': f"sqlite:///{tmp_path / 'replica.db'}",
+    })
+    app = create_app(config_class=config)
+    with app.app_context():
+        db.create_all()
+        with app.test_client() as testing_client:
+            yield testing_client
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+def replicate(tmp_path):
+    """Copies the primary database over the replica, standing in for replication."""
+    source = sqlite3.connect(tmp_path / 'primary.db')
+    target = sqlite3.connect(tmp_path / 'replica.db')
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+def login(client, username, password):
+    response = client.post('/auth/login', data=json.dumps({'username': username, 'password': password}),
+                           content_type='application/json')
+    return {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+
+def test_sqlite_profile_sets_pragmas(replicated_client):
+    """
+    GIVEN the default 'sqlite' engine profile and a file database
+    WHEN a connection is opened
+    THEN it runs in WAL mode with the configured busy timeout and synchronous level
+    """
+    with db.engine.connect() as connection:
+        assert connection.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert connection.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+        assert connection.execute(text('PRAGMA synchronous')).scalar() == 1 # NORMAL
+    assert db.engine.pool.size() == 5
+
+def test_read_only_views_use_replica_until_client_writes(replicated_client, tmp_path):
+    """
+    GIVEN a replica that lags behind the primary
+    WHEN a student reads their progress, then completes a topic and reads again
+    THEN the first read is served by the replica and the read after the write by the primary
+    """
+    user = User(username='student', email='student@example.com', role='student')
+    user.set_password('studentpassword')
+    course = Course(name='Anatomy', description='')
+    module = Module(name='Bones', description='', course=course)
+    first, second = Topic(name='Skull', content='', module=module), Topic(name='Spine', content='', module=module)
+    db.session.add_all([user, course, module, first, second])
+    db.session.commit()
+    headers = login(replicated_client, 'student', 'studentpassword')
+    replicate(tmp_path)
+
+    # Written to the primary only, as if replication had not caught up yet
+    db.session.execute(user_topic_progress.insert().values(user_id=user.id, topic_id=first.id))
+    db.session.commit()
+    replicated_client.delete_cookie(STICKY_COOKIE)
+
+    response = replicated_client.get('/api/progress', headers=headers)
+    assert json.loads(response.data)['completed_topic_ids'] == []
+
+    response = replicated_client.post(f'/api/topics/{second.id}/complete', headers=headers)
+    assert response.status_code == 201
+    assert replicated_client.get_cookie(STICKY_COOKIE) is not None
+
+    response = replicated_client.get('/api/progress', headers=headers)
+    assert sorted(json.loads(response.data)['completed_topic_ids']) == [first.id, second.id]
+
+def test_reads_after_a_write_stay_on_primary(replicated_client, tmp_path):
+    """
+    GIVEN replica reads enabled for the session
+    WHEN a transaction writes and then reads
+    THEN the read sees the uncommitted write on the primary
+    """
+    replicate(tmp_path)
+    db.session.add(Course(name='Anatomy', description=''))
+    db.session.commit()
+
+    with replica_reads():
+        assert Course.query.count() == 0
+        db.session.add(Course(name='Physiology', description=''))
+        db.session.flush()
+        assert Course.query.count() == 2
+        db.session.rollback()
+        assert Course.query.count() == 0
+
+def test_readonly_text_queries_use_replica_without_pinning(replicated_client, tmp_path):
+    """
+    GIVEN replica reads enabled and a replica that lags behind the primary
+    WHEN a text() query marked readonly runs, then a plain text() statement
+    THEN the first is served by the replica without marking the session as written, the second by the primary
+    """
+    replicate(tmp_path)
+    db.session.add(Course(name='Anatomy', description=''))
+    db.session.commit()
+
+    with replica_reads():
+        count = text('SELECT count(*) FROM courses')
+        assert db.session.execute(count.execution_options(readonly=True)).scalar() == 0
+        assert 'wrote' not in db.session.info
+        assert db.session.execute(count).scalar() == 1
+        assert db.session.info['wrote']
+        db.session.rollback()
+
+def test_search_reads_the_replica(replicated_client, tmp_path):
+    """
+    GIVEN the FTS5 search backend and a topic not yet replicated
+    WHEN a student who has not written searches
+    THEN the replica answers and no read-your-writes cookie is set
+    """
+    replicated_client.application.config['SEARCH_BACKEND'] = 'fts5'
+    module = Module(name='Bones', description='', course=Course(name='Anatomy', description=''))
+    user = User(username='student', email='student@example.com', role='student')
+    user.set_password('studentpassword')
+    db.session.add_all([user, Topic(name='Skull', content='', module=module)])
+    db.session.commit()
+    headers = login(replicated_client, 'student', 'studentpassword')
+    replicated_client.get('/search?q=skull', headers=headers)  # builds the index on the primary
+    replicate(tmp_path)
+
+    topic = Topic(name='Skull base', content='', module_id=module.id)
+    db.session.add(topic)
+    db.session.flush()
+    search.index_topic(topic)
+    db.session.commit()
+    db.session.info.pop('wrote_at')  # written by the test, not by the student's requests
+    replicated_client.delete_cookie(STICKY_COOKIE)
+
+    response = replicated_client.get('/search?q=skull', headers=headers)
+    assert [hit['name'] for hit in json.loads(response.data)['results']] == ['Skull']
+    assert replicated_client.get_cookie(STICKY_COOKIE) is None
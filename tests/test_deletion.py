@@ -0,0 +1,103 @@
+import json
+from sqlalchemy import func, select, text
+from backend.app import db
+from backend.app.instrumentation import count_queries
+from backend.app.models import (Badge, Blob, Course, Module, Resource, Topic, User, UserModuleProgress,
+                                user_topic_progress)
+
+
+def make_course(name, modules=1, topics_per_module=2):
+    course = Course(name=name)
+    for m in range(modules):
+        module = Module(name=f'{name} module {m}', course=course, topic_count=topics_per_module)
+        for t in range(topics_per_module):
+            Topic(name=f'{name} topic {m}.{t}', module=module)
+    db.session.add(course)
+    db.session.commit()
+    return course
+
+
+def count(table):
+    return db.session.execute(select(func.count()).select_from(table)).scalar()
+
+
+def test_deleting_a_course_removes_everything_below_it(test_client, auth_headers, tmp_path, upload):
+    """
+    GIVEN a course with resources, completions, module progress and a module badge
+    WHEN the course is deleted
+    THEN its subtree and unshared files are gone while shared files, other courses and earned badges stay
+    """
+    test_client.application.config['UPLOAD_FOLDER'] = str(tmp_path)
+    headers = auth_headers()
+    doomed, kept = make_course('Anatomy'), make_course('Physiology')
+    doomed_topic, kept_topic = doomed.modules[0].topics[0].id, kept.modules[0].topics[0].id
+    only_here = json.loads(upload(test_client, headers, doomed_topic, b'only in anatomy', 'a.pdf').data)
+    shared = json.loads(upload(test_client, headers, doomed_topic, b'in both courses', 'b.pdf').data)
+    upload(test_client, headers, kept_topic, b'in both courses', 'b.pdf')
+    legacy = tmp_path / 'legacy.pdf'
+    legacy.write_bytes(b'flat upload')
+    db.session.add(Resource(name='old', resource_type='pdf', path_or_url=str(legacy), topic_id=doomed_topic))
+
+    student = User(username='student', email='student@example.com')
+    db.session.add(student)
+    db.session.flush()
+    badge = Badge(name='Module Master - Anatomy module 0', module_id=doomed.modules[0].id)
+    student.badges.append(badge)
+    db.session.execute(user_topic_progress.insert(), [{'user_id': student.id, 'topic_id': doomed_topic},
+                                                      {'user_id': student.id, 'topic_id': kept_topic}])
+    db.session.add(UserModuleProgress(user_id=student.id, module_id=doomed.modules[0].id, completed_count=1))
+    db.session.commit()
+    doomed_id = doomed.id
+
+    response = test_client.delete(f'/admin/courses/{doomed_id}', headers=headers)
+    assert response.status_code == 200
+
+    db.session.expire_all()
+    assert [c.name for c in Course.query.all()] == ['Physiology']
+    assert count(Module.__table__) == count(Topic.__table__) / 2 == 1
+    assert [r.topic_id for r in Resource.query.all()] == [kept_topic]
+    assert db.session.execute(select(user_topic_progress.c.topic_id)).scalars().all() == [kept_topic]
+    assert count(UserModuleProgress.__table__) == 0
+    assert badge.module_id is None and student.badges.all() == [badge]
+
+    def blob_path(sha):
+        return tmp_path / 'objects' / sha[:2] / sha[2:4] / sha
+    assert not blob_path(only_here['sha256']).exists()
+    assert blob_path(shared['sha256']).exists()
+    assert db.session.get(Blob, shared['sha256']).ref_count == 1
+    assert not legacy.exists()
+
+
+def test_deleting_a_course_takes_the_same_statements_at_any_size(test_client, auth_headers):
+    """
+    GIVEN a two-topic course and a 400-topic course
+    WHEN each is deleted
+    THEN both deletes run the same number of SQL statements
+    """
+    headers = auth_headers()
+    small, large = make_course('Small').id, make_course('Large', modules=20, topics_per_module=20).id
+    # Warm up: the first catalog write also creates the version rows
+    test_client.delete(f"/admin/courses/{make_course('Warm-up').id}", headers=headers)
+    statements = []
+    for course_id in (small, large):
+        with count_queries() as queries:
+            assert test_client.delete(f'/admin/courses/{course_id}', headers=headers).status_code == 200
+        statements.append(len(queries))
+    assert statements[0] == statements[1]
+    assert count(Topic.__table__) == 0
+
+
+def test_foreign_keys_cascade_in_the_database(test_client):
+    """
+    GIVEN a course with modules, topics and a resource
+    WHEN its row is deleted with plain SQL
+    THEN SQLite removes the descendants through ON DELETE CASCADE
+    """
+    course = make_course('Pathology')
+    db.session.add(Resource(name='link', resource_type='link', path_or_url='https://example.com',
+                            topic_id=course.modules[0].topics[0].id))
+    db.session.commit()
+
+    db.session.execute(text('DELETE FROM courses WHERE id = :id'), {'id': course.id})
+    db.session.commit()
+    assert (count(Module.__table__), count(Topic.__table__), count(Resource.__table__)) == (0, 0, 0)
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from backend.app import db, exports
+from backend.app.models import Badge, Course, Module, Topic, User, user_badge_association, user_topic_progress
+
+
+def seed_progress():
+    topic = Topic(name='Nephron', module=Module(name='Renal', course=Course(name='Medicine')))
+    students = [User(username=f'student{i}', email=f'student{i}@example.com') for i in range(3)]
+    badge = Badge(name='Module Master - Renal')
+    db.session.add_all([topic, badge, *students])
+    db.session.flush()
+    long_ago = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    db.session.execute(user_topic_progress.insert(), [
+        {'user_id': students[0].id, 'topic_id': topic.id, 'completed_at': long_ago},
+        {'user_id': students[1].id, 'topic_id': topic.id, 'completed_at': datetime.now(timezone.utc)},
+    ])
+    db.session.execute(user_badge_association.insert().values(user_id=students[1].id, badge_id=badge.id))
+    db.session.commit()
+    return topic.id, [s.id for s in students]
+
+
+def test_completions_export_streams_ndjson_incrementally(test_client, auth_headers):
+    """
+    GIVEN completions recorded in 2020 and today
+    WHEN completions are exported in full and then since a cut-off
+    THEN each row is a JSON line and the incremental pull only has the recent row
+    """
+    headers = auth_headers()
+    topic_id, student_ids = seed_progress()
+
+    response = test_client.get('/admin/export/completions', headers=headers)
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [(r['user_id'], r['topic_id']) for r in rows] == [(student_ids[0], topic_id), (student_ids[1], topic_id)]
+    assert rows[0]['completed_at'].startswith('2020-01-01T00:00:00')
+    until = response.headers['X-Export-Until']
+
+    recent = test_client.get('/admin/export/completions?since=2021-01-01T00:00:00Z', headers=headers)
+    assert [json.loads(line)['user_id'] for line in recent.data.decode().splitlines()] == [student_ids[1]]
+    nothing_new = test_client.get(f'/admin/export/completions?since={until.replace("+", "%2B")}', headers=headers)
+    assert nothing_new.data == b''
+
+
+def test_users_and_badges_export_as_csv(test_client, auth_headers):
+    """
+    GIVEN users, one of whom holds a badge
+    WHEN users and badges are exported as CSV
+    THEN a header row is followed by one row per record
+    """
+    headers = auth_headers()
+    _, student_ids = seed_progress()
+
+    response = test_client.get('/admin/export/users?format=csv', headers=headers)
+    assert response.mimetype == 'text/csv'
+    users = list(csv.DictReader(io.StringIO(response.data.decode())))
+    assert [u['username'] for u in users] == ['adminuser', 'student0', 'student1', 'student2']
+    assert set(users[0]) == {'id', 'username', 'email', 'role', 'created_at'}
+
+    badges = list(csv.reader(io.StringIO(test_client.get('/admin/export/badges?format=csv', headers=headers).data.decode())))
+    assert badges[0] == ['user_id', 'badge_id', 'badge_name', 'awarded_at']
+    assert [row[:3] for row in badges[1:]] == [[str(student_ids[1]), '1', 'Module Master - Renal']]
+
+    future = (datetime.now(timezone.utc) + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M:%S')
+    empty = test_client.get(f'/admin/export/badges?format=csv&since={future}', headers=headers)
+    assert empty.data.decode().splitlines() == ['user_id,badge_id,badge_name,awarded_at']
+
+
+def test_export_reads_in_fixed_size_batches(test_client):
+    """
+    GIVEN 25 users
+    WHEN they are exported with a batch size of 10
+    THEN the body arrives as three chunks and no chunk holds more than a batch
+    """
+    db.session.add_all([User(username=f'user{i}', email=f'user{i}@example.com') for i in range(25)])
+    db.session.commit()
+
+    chunks = list(exports.stream_export('users', 'ndjson', batch_size=10))
+    assert [chunk.count('\n') for chunk in chunks] == [10, 10, 5]
+
+
+def test_export_rejects_bad_requests(test_client, auth_headers):
+    """
+    GIVEN an admin
+    WHEN an unknown export, format or since value is requested
+    THEN the request is refused before anything is streamed
+    """
+    headers = auth_headers()
+    assert test_client.get('/admin/export/passwords', headers=headers).status_code == 404
+    assert test_client.get('/admin/export/users?format=xml', headers=headers).status_code == 400
+    assert test_client.get('/admin/export/users?since=yesterday', headers=headers).status_code == 400
+    student = auth_headers(username='student', role='student')
+    assert test_client.get('/admin/export/users', headers=student).status_code == 403
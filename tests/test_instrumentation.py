@@ -0,0 +1,73 @@
+import json
+import logging
+import pytest
+from backend.app import db
+from backend.app.instrumentation import query_budget, statement_shape
+from backend.app.models import User
+
+def test_server_timing_and_request_log(test_client, auth_headers, caplog):
+    """
+    GIVEN a logged in student
+    WHEN '/api/progress' is requested
+    THEN the response carries Server-Timing and a JSON log line records the SQL statements
+    """
+    headers = auth_headers(username='student', role='student')
+    with caplog.at_level(logging.INFO, logger='medlib.requests'):
+        response = test_client.get('/api/progress', headers=headers)
+
+    assert response.status_code == 200
+    timing = response.headers['Server-Timing']
+    for metric in ('db;dur=', 'serialize;dur=', 'handler;dur=', 'total;dur='):
+        assert metric in timing
+    assert 'desc="1 queries"' in timing
+
+    entry = json.loads(caplog.records[-1].getMessage())
+    assert entry['endpoint'] == 'progress.get_user_progress'
+    assert entry['status'] == 200
+    assert entry['sql_statements'] == 1
+    assert entry['n_plus_one'] == []
+
+def test_repeated_statement_shape_is_flagged(test_client, auth_headers, caplog):
+    """
+    GIVEN a view that loads users one query at a time
+    WHEN it runs more identical statements than the N+1 threshold
+    THEN a warning names the statement and the endpoint metrics count the suspect
+    """
+    app = test_client.application
+    app.config['INSTRUMENTATION_N_PLUS_ONE_THRESHOLD'] = 3
+
+    def load_one_by_one():
+        return {'users': [db.session.get(User, i) is not None for i in range(1, 6)]}
+    app.add_url_rule('/one-by-one', 'one_by_one', load_one_by_one)
+    headers = auth_headers()
+
+    with caplog.at_level(logging.WARNING, logger='medlib.requests'):
+        assert test_client.get('/one-by-one').status_code == 200
+    assert 'Possible N+1 queries in GET /one-by-one: 5x SELECT' in caplog.text
+
+    metrics = json.loads(test_client.get('/admin/metrics', headers=headers).data)
+    endpoint = metrics['endpoints']['one_by_one']
+    assert endpoint['requests'] == 1
+    assert endpoint['n_plus_one_suspects'] == 1
+    assert endpoint['sql_statements']['buckets']['5'] == 1
+    assert sum(endpoint['latency_ms']['buckets'].values()) == 1
+    assert 'hit_ratio' in metrics['cache']
+    assert 'queue_depth' in metrics['password_hasher']
+
+def test_query_budget_reports_statements(test_client, auth_headers):
+    """
+    GIVEN the query budget helper
+    WHEN a block runs more statements than allowed
+    THEN it fails with the list of statements
+    """
+    headers = auth_headers(username='student', role='student')
+    with query_budget(1) as recorder:
+        test_client.get('/api/progress', headers=headers)
+    assert len(recorder) == 1
+
+    with pytest.raises(AssertionError, match='at most 0 SQL statements, got 1'):
+        with query_budget(0):
+            test_client.get('/api/progress', headers=headers)
+
+def test_statement_shape_collapses_parameter_lists():
+    assert statement_shape('SELECT *\n  FROM t WHERE id IN (?, ?, ?)') == 'SELECT * FROM t WHERE id IN (?)'
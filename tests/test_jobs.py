@@ -0,0 +1,237 @@
+import io
+import json
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+import pytest
+from backend.app import create_app, db, jobs, processing
+from backend.app.models import Course, Job, Module, Resource, Topic
+from backend.config import TestingConfig
+
+
+def make_pdf(text):
+    stream = zlib.compress(f'BT /F1 12 Tf 72 712 Td ({text}) Tj ET'.encode('latin-1'))
+    return (b'%PDF-1.4\n1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n'
+            b'2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n'
+            b'3 0 obj << /Type /Page /Parent 2 0 R /Contents 4 0 R >> endobj\n'
+            + f'4 0 obj << /Length {len(stream)} /Filter /FlateDecode >>\nstream\n'.encode()
+            + stream + b'\nendstream\nendobj\n%%EOF\n')
+
+
+@pytest.fixture
+def flaky_handler():
+    calls = []
+
+    @jobs.handler('test.flaky')
+    def flaky(payload):
+        calls.append(payload)
+        if len(calls) <= payload.get('failures', 0):
+            raise RuntimeError(f'failure {len(calls)}')
+        return {'calls': len(calls)}
+
+    yield calls
+    jobs.HANDLERS.pop('test.flaky')
+
+
+def test_upload_queues_processing_jobs(test_client, auth_headers, topic_id, upload):
+    """
+    GIVEN an admin uploading a plain-text file
+    WHEN the upload returns and the queued jobs are run
+    THEN the checksum is verified and the extracted text becomes searchable
+    """
+    headers = auth_headers()
+    response = upload(test_client, headers, topic_id, b'Atrial fibrillation shows irregular RR intervals.', 'notes.txt')
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert len(data['jobs']) == 3
+    status = json.loads(test_client.get(f"/admin/jobs/{data['jobs'][0]}", headers=headers).data)
+    assert status['status'] == 'queued'
+    assert status['kind'] == 'resource.verify_checksum'
+
+    assert jobs.run_pending() == 3
+
+    results = [json.loads(test_client.get(f'/admin/jobs/{job_id}', headers=headers).data) for job_id in data['jobs']]
+    assert [r['status'] for r in results] == ['succeeded'] * 3
+    assert results[0]['result']['size'] == len(b'Atrial fibrillation shows irregular RR intervals.')
+    assert db.session.get(Resource, data['id']).text_content.startswith('Atrial fibrillation')
+
+    hits = json.loads(test_client.get('/search?q=fibrillation', headers=headers).data)['results']
+    assert [(hit['type'], hit['id']) for hit in hits] == [('resource', data['id'])]
+
+
+def test_pdf_is_probed_and_extracted(test_client, auth_headers, topic_id, upload):
+    """
+    GIVEN a PDF uploaded without a file extension
+    WHEN the processing jobs run
+    THEN the content type is detected, pages are counted and the text is extracted
+    """
+    headers = auth_headers()
+    data = json.loads(upload(test_client, headers, topic_id, make_pdf('Ventricular tachycardia'), 'lecture').data)
+    assert data['mime_type'] == 'application/octet-stream'
+
+    jobs.run_pending()
+
+    probe = db.session.get(Job, data['jobs'][1])
+    assert probe.result == {'declared_mime_type': 'application/octet-stream',
+                            'detected_mime_type': 'application/pdf', 'pages': 1}
+    resource = db.session.get(Resource, data['id'])
+    assert resource.mime_type == 'application/pdf'
+    assert 'Ventricular tachycardia' in resource.text_content
+
+
+def test_probed_type_reaches_cached_topic_and_text_extraction(test_client, auth_headers, topic_id, upload):
+    """
+    GIVEN a PDF uploaded without a file extension and its topic's cached details
+    WHEN text extraction runs before the metadata probe, and then the probe runs
+    THEN the text is extracted anyway, and the topic is served with the detected type
+    """
+    headers = auth_headers()
+    data = json.loads(upload(test_client, headers, topic_id, make_pdf('Atrial flutter'), 'lecture').data)
+    topic = json.loads(test_client.get(f'/topics/{topic_id}', headers=headers).data)
+    assert topic['resources'][0]['mime_type'] == 'application/octet-stream'
+
+    later = datetime.now(timezone.utc) + timedelta(minutes=1)
+    for job in Job.query.filter(Job.kind != 'resource.extract_text'):
+        job.run_after = later
+    db.session.commit()
+    assert jobs.run_pending() == 1
+    extract = Job.query.filter_by(kind='resource.extract_text').one()
+    assert (extract.status, extract.result) == ('succeeded', {'characters': len('Atrial flutter')})
+
+    jobs.run_pending(now=later)
+    topic = json.loads(test_client.get(f'/topics/{topic_id}', headers=headers).data)
+    assert topic['resources'][0]['mime_type'] == 'application/pdf'
+    assert db.session.get(Resource, data['id']).text_content == 'Atrial flutter'
+
+
+def test_pdf_pages_are_counted_chunk_by_chunk(monkeypatch):
+    """
+    GIVEN a 40-page PDF, a chunk size that splits page markers, and a small overlap
+    WHEN its pages are counted
+    THEN every page is counted exactly once
+    """
+    monkeypatch.setattr(processing, 'PAGE_SCAN_OVERLAP', 32)
+    pdf = b'%PDF-1.4\n' + b''.join(b'%d 0 obj << /Type /Page /Parent 1 0 R >> endobj\n' % n for n in range(40))
+    pdf += b'1 0 obj << /Type /Pages /Count 40 >> endobj\n%%EOF\n'
+    for chunk_size in (7, 64, len(pdf)):
+        assert processing.count_pdf_pages(io.BytesIO(pdf), chunk_size) == 40
+
+
+def test_failed_jobs_are_retried_with_backoff(test_client, auth_headers, flaky_handler):
+    """
+    GIVEN a job that fails on its first attempt
+    WHEN pending jobs are run now and again after the backoff
+    THEN it is requeued with the error and then succeeds; a job out of attempts fails and can be retried
+    """
+    job = jobs.enqueue('test.flaky', {'failures': 1})
+    db.session.commit()
+
+    assert jobs.run_pending() == 1
+    db.session.refresh(job)
+    assert (job.status, job.attempts, job.error) == ('queued', 1, 'RuntimeError: failure 1')
+    assert jobs.run_pending() == 0  # not due yet
+
+    jobs.run_pending(now=datetime.now(timezone.utc) + timedelta(minutes=1))
+    db.session.refresh(job)
+    assert (job.status, job.attempts, job.result) == ('succeeded', 2, {'calls': 2})
+
+    doomed = jobs.enqueue('test.flaky', {'failures': 10}, max_attempts=1)
+    db.session.commit()
+    jobs.run_pending()
+    db.session.refresh(doomed)
+    assert doomed.status == 'failed'
+
+    headers = auth_headers()
+    response = test_client.post(f'/admin/jobs/{doomed.id}/retry', headers=headers)
+    assert json.loads(response.data)['status'] == 'queued'
+    failed = json.loads(test_client.get('/admin/jobs?status=failed', headers=headers).data)
+    assert failed == []
+
+
+def test_jobs_of_a_lost_worker_are_reclaimed(test_client, flaky_handler):
+    """
+    GIVEN a job left 'running' by a worker that died
+    WHEN its lease has expired
+    THEN another worker claims and finishes it
+    """
+    job = jobs.enqueue('test.flaky')
+    db.session.commit()
+    stale = datetime.now(timezone.utc) - timedelta(hours=1)
+    job.status, job.locked_by, job.locked_at, job.attempts = 'running', 'dead-host:1:worker', stale, 1
+    db.session.commit()
+
+    assert jobs.run_pending() == 1
+    db.session.refresh(job)
+    assert (job.status, job.attempts, job.locked_by) == ('succeeded', 2, None)
+
+
+def test_reporting_progress_renews_the_lease(test_client):
+    """
+    GIVEN a job claimed so long ago that its lease has run out
+    WHEN the handler reports progress and commits
+    THEN no other worker can claim the job while it still runs
+    """
+    stale = datetime.now(timezone.utc) - timedelta(hours=1)
+    claimed_by_others = []
+
+    @jobs.handler('test.long')
+    def long_job(payload):
+        jobs.report_progress({'done': 1})
+        db.session.commit()
+        claimed_by_others.append(jobs.claim_next('other-host:1:worker'))
+        return {'done': 2}
+
+    try:
+        job = jobs.enqueue('test.long')
+        job.run_after = stale
+        db.session.commit()
+        jobs.run_pending(now=stale)
+    finally:
+        jobs.HANDLERS.pop('test.long')
+    db.session.refresh(job)
+    assert claimed_by_others == [None]
+    assert (job.status, job.attempts, job.result) == ('succeeded', 1, {'done': 2})
+
+
+def test_thread_runner_processes_uploads(tmp_path, upload):
+    """
+    GIVEN the app in 'thread' job mode on a file database
+    WHEN a file is uploaded
+    THEN the request returns immediately and worker threads finish the jobs
+    """
+    config = type('ThreadedJobsConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'jobs.db'}",
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'JOBS_MODE': 'thread',
+        'JOBS_POLL_INTERVAL': 0.05,
+    })
+    app = create_app(config_class=config)
+    with app.app_context():
+        db.create_all()
+        topic = Topic(name='ECG basics', module=Module(name='Cardiology', course=Course(name='Medicine')))
+        db.session.add(topic)
+        db.session.commit()
+        topic_id = topic.id
+        db.session.remove()
+    try:
+        client = app.test_client()
+        client.post('/auth/register', json={'username': 'admin', 'email': 'admin@example.com', 'password': 'pw'})
+        with app.app_context():
+            db.session.execute(db.text("UPDATE users SET role = 'admin'"))
+            db.session.commit()
+        token = json.loads(client.post('/auth/login', json={'username': 'admin', 'password': 'pw'}).data)
+        headers = {'Authorization': f"Bearer {token['access_token']}"}
+
+        data = json.loads(upload(client, headers, topic_id, b'Sinus rhythm', 'notes.txt').data)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            statuses = [json.loads(client.get(f'/admin/jobs/{job_id}', headers=headers).data)['status']
+                        for job_id in data['jobs']]
+            if statuses == ['succeeded'] * 3:
+                break
+            time.sleep(0.05)
+        assert statuses == ['succeeded'] * 3
+    finally:
+        app.extensions['job_runner'].stop(timeout=5)
+        with app.app_context():
+            db.engine.dispose()
@@ -0,0 +1,104 @@
+import json
+from datetime import datetime, timedelta
+from backend.app import db
+from backend.app.models import Course, Event, NewsArticle, User
+from backend.app.routes import main
+
+
+def pages(test_client, url, headers=None, **params):
+    """Follow X-Next-Cursor from the first page to the last and return every page's items."""
+    result = []
+    while True:
+        response = test_client.get(url, headers=headers, query_string=params)
+        assert response.status_code == 200
+        result.append(json.loads(response.data))
+        if 'X-Next-Cursor' not in response.headers:
+            assert 'Link' not in response.headers
+            return result
+        assert response.headers['Link'].endswith('; rel="next"')
+        params['cursor'] = response.headers['X-Next-Cursor']
+
+
+def test_news_pages_cover_every_article_once_in_order(test_client):
+    """
+    GIVEN five news articles, three of them published at the same instant
+    WHEN the news is read two articles at a time
+    THEN the pages hold every article exactly once, newest first, ties broken by id
+    """
+    now = datetime(2026, 5, 1, 12, 0)
+    stamps = [now, now, now, now - timedelta(days=1), now + timedelta(days=1)]
+    db.session.add_all(NewsArticle(title=f'N{i}', content='...', created_at=at) for i, at in enumerate(stamps))
+    db.session.commit()
+
+    result = pages(test_client, '/news', limit=2)
+
+    assert [len(page) for page in result] == [2, 2, 1]
+    assert [item['title'] for page in result for item in page] == ['N4', 'N2', 'N1', 'N0', 'N3']
+
+
+def test_events_default_to_upcoming_and_accept_a_window(test_client):
+    """
+    GIVEN one past event and two upcoming ones
+    WHEN events are listed without a window, with a from/to window and with a bad date
+    THEN the default hides past events, the window is honoured and the bad date is rejected
+    """
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    db.session.add_all([
+        Event(title='Past', description='-', event_date=today - timedelta(days=3)),
+        Event(title='Soon', description='-', event_date=today + timedelta(days=2)),
+        Event(title='Later', description='-', event_date=today + timedelta(days=30)),
+    ])
+    db.session.commit()
+
+    default = json.loads(test_client.get('/events').data)
+    assert [e['title'] for e in default] == ['Soon', 'Later']
+
+    window = {'from': (today - timedelta(days=7)).isoformat(), 'to': (today + timedelta(days=7)).date().isoformat()}
+    assert [e['title'] for page in pages(test_client, '/events', limit=1, **window) for e in page] == ['Past', 'Soon']
+
+    assert test_client.get('/events', query_string={'from': 'next week'}).status_code == 400
+
+
+def test_admin_lists_filter_and_reject_bad_cursors(test_client, auth_headers):
+    """
+    GIVEN students, an admin and several courses
+    WHEN users are listed by role and courses by name prefix, a page at a time
+    THEN only matching rows come back, and a forged cursor or unknown role is a 400
+    """
+    headers = auth_headers()
+    db.session.add_all(User(username=f'student{i}', email=f's{i}@example.com', password_hash='x') for i in range(3))
+    db.session.add_all(Course(name=name) for name in ['Cardiology', 'Cardiac Surgery', 'Neurology', 'card_games'])
+    db.session.commit()
+
+    students = pages(test_client, '/admin/users', headers, role='student', limit=2)
+    assert [u['username'] for page in students for u in page] == ['student0', 'student1', 'student2']
+    assert test_client.get('/admin/users?role=root', headers=headers).status_code == 400
+
+    cardio = pages(test_client, '/admin/courses', headers, name='Cardi')
+    assert [c['name'] for page in cardio for c in page] == ['Cardiology', 'Cardiac Surgery']
+    assert json.loads(test_client.get('/admin/courses?name=card_', headers=headers).data)[0]['name'] == 'card_games'
+
+    assert test_client.get('/admin/courses?cursor=bm9wZQ', headers=headers).status_code == 400
+
+
+def test_cached_pages_keep_their_cursor_and_date(test_client, monkeypatch):
+    """
+    GIVEN more news than fits on a page, and an event happening tomorrow
+    WHEN the first pages are served from the cache, and the events again after midnight
+    THEN cache hits still link to the next page, and the events list is not served from yesterday's entry
+    """
+    db.session.add_all(NewsArticle(title=f'N{i}', content='...') for i in range(main.NEWS_PAGE_SIZE + 1))
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    db.session.add(Event(title='Tomorrow', description='-', event_date=today + timedelta(days=1, hours=9)))
+    db.session.commit()
+
+    miss, hit = test_client.get('/news'), test_client.get('/news')
+    assert (miss.headers['X-Cache'], hit.headers['X-Cache']) == ('MISS', 'HIT')
+    assert hit.headers['X-Next-Cursor'] == miss.headers['X-Next-Cursor']
+    assert hit.headers['Link'] == miss.headers['Link']
+
+    assert [e['title'] for e in json.loads(test_client.get('/events').data)] == ['Tomorrow']
+    monkeypatch.setattr(main, '_start_of_today', lambda: today + timedelta(days=2))
+    response = test_client.get('/events')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert json.loads(response.data) == []
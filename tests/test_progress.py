@@ -0,0 +1,154 @@
+import json
+from datetime import datetime
+from sqlalchemy import select
+from backend.app import db
+from backend.app.models import Module, UserModuleProgress, User, user_topic_progress
+
+
+def complete(test_client, headers, topic_id):
+    return test_client.post(f'/api/topics/{topic_id}/complete', headers=headers)
+
+
+def test_badge_awarded_on_last_topic(test_client, auth_headers, seed_module):
+    """
+    GIVEN a module with two topics
+    WHEN a student completes both
+    THEN the module badge is awarded on the second completion only
+    """
+    module_id, topic_ids = seed_module()
+    headers = auth_headers(username='student', role='student')
+
+    first = complete(test_client, headers, topic_ids[0])
+    assert first.status_code == 201
+    assert b'badge' not in first.data
+    assert complete(test_client, headers, topic_ids[0]).status_code == 200
+
+    second = complete(test_client, headers, topic_ids[1])
+    assert second.status_code == 201
+    assert b'Module Master - Renal' in second.data
+
+    badges = json.loads(test_client.get('/api/badges', headers=headers).data)
+    assert [b['name'] for b in badges] == ['Module Master - Renal']
+
+
+def test_admin_topic_changes_keep_counters_correct(test_client, auth_headers, seed_module):
+    """
+    GIVEN a student part way through a module
+    WHEN an admin adds and deletes topics in that module
+    THEN the module total and the student's counter stay consistent
+    """
+    module_id, topic_ids = seed_module()
+    admin = auth_headers()
+    headers = auth_headers(username='student', role='student')
+    student_id = User.query.filter_by(username='student').first().id
+
+    complete(test_client, headers, topic_ids[0])
+    response = test_client.post(f'/admin/modules/{module_id}/topics', headers=admin,
+                                data=json.dumps({'name': 'Topic 2'}), content_type='application/json')
+    new_topic_id = json.loads(response.data)['id']
+    assert db.session.get(Module, module_id).topic_count == 3
+
+    complete(test_client, headers, topic_ids[1])
+    test_client.delete(f'/admin/topics/{topic_ids[0]}', headers=admin)
+    assert db.session.get(Module, module_id).topic_count == 2
+    assert db.session.get(UserModuleProgress, (student_id, module_id)).completed_count == 1
+
+    response = complete(test_client, headers, new_topic_id)
+    assert b'Module Master - Renal' in response.data
+
+
+def test_progress_summary(test_client, auth_headers, seed_module):
+    """
+    GIVEN a student who completed one of two topics
+    WHEN '/api/progress/summary' and the admin cohort summary are requested
+    THEN per-course and per-module counts and percentages are returned
+    """
+    module_id, topic_ids = seed_module()
+    headers = auth_headers(username='student', role='student')
+    complete(test_client, headers, topic_ids[0])
+
+    data = json.loads(test_client.get('/api/progress/summary', headers=headers).data)
+    assert data['modules'] == [{'id': module_id, 'name': 'Renal', 'course_id': data['courses'][0]['id'],
+                                'completed': 1, 'total': 2, 'percent': 50.0}]
+    assert data['courses'][0]['completed'] == 1 and data['courses'][0]['percent'] == 50.0
+
+    progress = json.loads(test_client.get('/api/progress', headers=headers).data)
+    assert progress['completed_topic_ids'] == [topic_ids[0]]
+
+    cohort = json.loads(test_client.get('/admin/progress/summary', headers=auth_headers()).data)
+    assert len(cohort) == 1
+    assert cohort[0]['modules'][0]['percent'] == 50.0
+
+
+def test_batch_completion(test_client, auth_headers, seed_module):
+    """
+    GIVEN a student who completed one topic online
+    WHEN they sync a batch including it, a new topic and an unknown id
+    THEN only the missing row is inserted and the module badge is returned
+    """
+    module_id, topic_ids = seed_module(topics=3)
+    headers = auth_headers(username='student', role='student')
+    complete(test_client, headers, topic_ids[0])
+
+    response = test_client.post('/api/topics/complete', headers=headers, content_type='application/json',
+                                data=json.dumps({'completions': [
+                                    topic_ids[0],
+                                    {'topic_id': topic_ids[1], 'completed_at': '2024-05-01T10:00:00Z'},
+                                    {'topic_id': topic_ids[2]},
+                                    999,
+                                ]}))
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    assert data['completed_topic_ids'] == topic_ids[1:]
+    assert data['already_completed_topic_ids'] == [topic_ids[0]]
+    assert data['unknown_topic_ids'] == [999]
+    assert [b['name'] for b in data['badges']] == ['Module Master - Renal']
+
+    student_id = User.query.filter_by(username='student').first().id
+    assert db.session.get(UserModuleProgress, (student_id, module_id)).completed_count == 3
+
+    again = test_client.post('/api/topics/complete', headers=headers, content_type='application/json',
+                             data=json.dumps({'completions': topic_ids}))
+    assert again.status_code == 200
+    assert json.loads(again.data)['badges'] == []
+
+def test_batch_completion_times_are_stored_in_utc(test_client, auth_headers, seed_module):
+    """
+    GIVEN a student in UTC-5 who completed a topic late in the evening of 1 May, local time
+    WHEN the completion is synced and an admin exports completions since 2 May
+    THEN it is stored as 04:30 UTC on 2 May and included in the export
+    """
+    _, topic_ids = seed_module(topics=1)
+    headers = auth_headers(username='student', role='student')
+    test_client.post('/api/topics/complete', headers=headers, content_type='application/json',
+                     data=json.dumps({'completions': [{'topic_id': topic_ids[0],
+                                                       'completed_at': '2024-05-01T23:30:00-05:00'}]}))
+    stored = db.session.execute(select(user_topic_progress.c.completed_at)).scalar_one()
+    assert stored == datetime(2024, 5, 2, 4, 30)
+
+    response = test_client.get('/admin/export/completions?since=2024-05-02', headers=auth_headers())
+    assert [json.loads(line)['topic_id'] for line in response.data.decode().splitlines()] == topic_ids
+
+
+def test_cohort_summary_pages_through_learners(test_client, auth_headers, seed_module):
+    """
+    GIVEN three students with progress, one without, and a module whose topic counter says 4
+    WHEN the admin cohort summary is read two learners at a time
+    THEN two pages cover exactly the three learners, with totals taken from the counter
+    """
+    module_id, topic_ids = seed_module(topics=2)
+    students = [auth_headers(username=f'student{i}', role='student') for i in range(4)]
+    for headers in students[:3]:
+        complete(test_client, headers, topic_ids[0])
+    db.session.get(Module, module_id).topic_count = 4
+    db.session.commit()
+    admin = auth_headers()
+
+    first = test_client.get('/admin/progress/summary?limit=2', headers=admin)
+    second = test_client.get(f"/admin/progress/summary?limit=2&cursor={first.headers['X-Next-Cursor']}",
+                             headers=admin)
+    assert 'X-Next-Cursor' not in second.headers
+    learners = json.loads(first.data) + json.loads(second.data)
+    ids = [User.query.filter_by(username=f'student{i}').one().id for i in range(3)]
+    assert [learner['user_id'] for learner in learners] == ids
+    assert {(m['total'], m['percent']) for learner in learners for m in learner['modules']} == {(4, 25.0)}
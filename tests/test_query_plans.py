@@ -0,0 +1,223 @@
+import shutil
+import sqlite3
+from datetime import date, datetime
+
+import pytest
+from flask_migrate import migrate, upgrade
+from sqlalchemy import func, inspect, select, text, tuple_
+from backend.app import MIGRATIONS_DIR, create_app, db, search
+from backend.app.models import (AnalyticsRollup, Badge, Event, LearnerStats, Module, NewsArticle, Resource, Topic,
+                                UserModuleProgress, user_badge_association, user_topic_progress)
+from backend.benchmarks.seed import seed
+from backend.config import TestingConfig
+
+# (name, statement, whether the query filters rows rather than listing a whole table)
+HOT_QUERIES = [
+    ('course modules', select(Module.id, Module.name).where(Module.course_id == 1), True),
+    ('module topics', select(Topic.id, Topic.name).where(Topic.module_id == 1), True),
+    ('topic resources', select(Resource.id, Resource.name).where(Resource.topic_id.in_([1, 2, 3])), True),
+    ('topic completed by', select(user_topic_progress.c.user_id).where(user_topic_progress.c.topic_id == 1), True),
+    ('user progress', select(user_topic_progress.c.topic_id).where(user_topic_progress.c.user_id == 1), True),
+    ('user badges', select(Badge.name).join(user_badge_association)
+     .where(user_badge_association.c.user_id == 1), True),
+    ('badge holders', select(user_badge_association.c.user_id).where(user_badge_association.c.badge_id == 1), True),
+    ('module progress counters', select(UserModuleProgress.user_id).where(UserModuleProgress.module_id == 1), True),
+    ('module topic totals', select(func.count(Topic.id)).where(Topic.module_id.in_([1, 2])), True),
+    ('news', select(NewsArticle.id).order_by(NewsArticle.created_at.desc(), NewsArticle.id.desc()), False),
+    ('news next page', select(NewsArticle.id)
+     .where(tuple_(NewsArticle.created_at, NewsArticle.id) < tuple_(datetime(2030, 1, 1), 10))
+     .order_by(NewsArticle.created_at.desc(), NewsArticle.id.desc()), True),
+    ('events', select(Event.id).order_by(Event.event_date.asc(), Event.id.asc()), False),
+    ('upcoming events', select(Event.id).where(Event.event_date >= datetime(2020, 1, 1))
+     .order_by(Event.event_date.asc(), Event.id.asc()), True),
+]
+
+MIGRATED_INDEXES = {
+    'ix_modules_course_id', 'ix_topics_module_id', 'ix_resources_topic_id', 'ix_news_articles_created_at_id',
+    'ix_events_event_date_id', 'ix_user_topic_progress_topic_id_user_id', 'ix_user_badge_association_badge_id',
+    'ix_user_module_progress_module_id', 'ix_user_topic_progress_completed_at',
+}
+
+# The schema db.create_all() produced before the app had migrations.
+BASELINE_SCHEMA = """
+CREATE TABLE news_articles (
+    id INTEGER NOT NULL, title VARCHAR(200) NOT NULL, content TEXT NOT NULL, created_at DATETIME,
+    PRIMARY KEY (id)
+);
+CREATE TABLE events (
+    id INTEGER NOT NULL, title VARCHAR(200) NOT NULL, description TEXT NOT NULL, event_date DATETIME NOT NULL,
+    created_at DATETIME, PRIMARY KEY (id)
+);
+CREATE TABLE badges (
+    id INTEGER NOT NULL, name VARCHAR(128) NOT NULL, description VARCHAR(256), icon VARCHAR(128),
+    PRIMARY KEY (id), UNIQUE (name)
+);
+CREATE TABLE users (
+    id INTEGER NOT NULL, username VARCHAR(64) NOT NULL, email VARCHAR(120) NOT NULL, password_hash VARCHAR(256),
+    role VARCHAR(20) NOT NULL, created_at DATETIME, PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE TABLE courses (
+    id INTEGER NOT NULL, name VARCHAR(128) NOT NULL, description TEXT, PRIMARY KEY (id), UNIQUE (name)
+);
+CREATE TABLE user_badge_association (
+    user_id INTEGER NOT NULL, badge_id INTEGER NOT NULL, PRIMARY KEY (user_id, badge_id),
+    FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(badge_id) REFERENCES badges (id)
+);
+CREATE TABLE modules (
+    id INTEGER NOT NULL, name VARCHAR(128) NOT NULL, description TEXT, course_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(course_id) REFERENCES courses (id)
+);
+CREATE TABLE topics (
+    id INTEGER NOT NULL, name VARCHAR(128) NOT NULL, content TEXT, module_id INTEGER NOT NULL,
+    PRIMARY KEY (id), FOREIGN KEY(module_id) REFERENCES modules (id)
+);
+CREATE TABLE user_topic_progress (
+    user_id INTEGER NOT NULL, topic_id INTEGER NOT NULL, completed_at DATETIME, PRIMARY KEY (user_id, topic_id),
+    FOREIGN KEY(user_id) REFERENCES users (id), FOREIGN KEY(topic_id) REFERENCES topics (id)
+);
+CREATE TABLE resources (
+    id INTEGER NOT NULL, name VARCHAR(128) NOT NULL, resource_type VARCHAR(50) NOT NULL,
+    path_or_url VARCHAR(256) NOT NULL, topic_id INTEGER NOT NULL, uploaded_at DATETIME,
+    PRIMARY KEY (id), FOREIGN KEY(topic_id) REFERENCES topics (id)
+);
+"""
+
+def query_plan(statement):
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    return [row[3] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}'))]
+
+@pytest.mark.parametrize('name, statement, filtered', HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_queries_use_indexes(test_client, name, statement, filtered):
+    """
+    GIVEN a seeded catalog with users and completions
+    WHEN a hot query is planned
+    THEN filtered queries search an index and listings are read in index order without a sort
+    """
+    seed(courses=3, modules_per_course=3, topics_per_module=4, resources_per_topic=2, users=20, completions=100)
+    db.session.execute(text('ANALYZE'))
+    plan = query_plan(statement)
+
+    if filtered:
+        full_scans = [step for step in plan if step.startswith('SCAN ')]
+        assert not full_scans, f'{name} scans a whole table: {plan}'
+    else:
+        assert not any('TEMP B-TREE' in step for step in plan), f'{name} sorts instead of using an index: {plan}'
+
+def test_migrations_bring_a_baseline_database_up_to_date(tmp_path):
+    """
+    GIVEN a database created from the schema the app shipped with before migrations existed
+    WHEN the migrations are applied (twice)
+    THEN every table, column and index of the current models exists and the second run is a no-op
+    """
+    config = type('MigrationConfig', (TestingConfig,), {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'old.db'}"})
+    app = create_app(config_class=config)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            for statement in BASELINE_SCHEMA.split(';'):
+                if statement.strip():
+                    connection.exec_driver_sql(statement)
+            connection.exec_driver_sql("INSERT INTO courses (id, name) VALUES (1, 'Medicine')")
+            connection.exec_driver_sql("INSERT INTO modules (id, name, course_id) VALUES (1, 'Cardiology', 1)")
+            connection.exec_driver_sql("INSERT INTO topics (id, name, module_id) VALUES (1, 'ECG', 1)")
+            connection.exec_driver_sql("INSERT INTO users (id, username, email, role) VALUES (1, 'alice', 'a@x', 'student')")
+            connection.exec_driver_sql("INSERT INTO badges (id, name) VALUES (1, 'Early bird')")
+            connection.exec_driver_sql("INSERT INTO user_badge_association (user_id, badge_id) VALUES (1, 1)")
+            connection.exec_driver_sql(
+                "INSERT INTO user_topic_progress (user_id, topic_id, completed_at) VALUES (1, 1, '2026-03-04 10:00:00')")
+
+        upgrade()
+        upgrade()
+
+        inspector = inspect(db.engine)
+        for table in db.metadata.sorted_tables:
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            assert columns >= set(table.columns.keys()), table.name
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            assert indexes >= {index.name for index in table.indexes}, table.name
+        indexes = {index['name'] for table in inspector.get_table_names() for index in inspector.get_indexes(table)}
+        assert indexes >= MIGRATED_INDEXES
+        assert db.session.execute(
+            select(Topic.name, Module.name, Module.topic_count).join(Module, Topic.module_id == Module.id)
+        ).all() == [('ECG', 'Cardiology', 1)]
+        day, month = date(2026, 3, 4), date(2026, 3, 1)
+        assert sorted(db.session.execute(select(AnalyticsRollup.__table__)).all()) == [
+            ('active_learners', 'site', 0, 'day', day, 1), ('active_learners', 'site', 0, 'month', month, 1),
+            ('completions', 'course', 1, 'day', day, 1), ('completions', 'module', 1, 'day', day, 1),
+            ('completions', 'site', 0, 'day', day, 1), ('completions', 'topic', 1, 'day', day, 1),
+        ]
+        assert db.session.execute(select(LearnerStats.__table__)).all() == [(1, 1, 1)]
+        db.session.remove()
+        db.engine.dispose()
+
+def test_migrations_create_an_empty_database_matching_the_models(tmp_path):
+    """
+    GIVEN an empty database
+    WHEN every migration is applied, the search index is built, and autogenerate compares it with the models
+    THEN no schema change is detected, not even a drop of the FTS5 search tables
+    """
+    migrations = tmp_path / 'migrations'
+    shutil.copytree(MIGRATIONS_DIR, migrations, ignore=shutil.ignore_patterns('__pycache__'))
+    config = type('MigrationConfig', (TestingConfig,), {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'empty.db'}",
+                                                         'SEARCH_BACKEND': 'fts5'})
+    app = create_app(config_class=config)
+    with app.app_context():
+        upgrade(directory=str(migrations))
+        search.search('ecg')
+        db.session.remove()
+
+        revisions = set((migrations / 'versions').glob('*.py'))
+        migrate(directory=str(migrations), message='unexpected changes')
+        assert set((migrations / 'versions').glob('*.py')) == revisions
+        db.engine.dispose()
+
+def test_flask_db_upgrade_runs_on_a_baseline_database(tmp_path):
+    """
+    GIVEN a database created from the pre-migration schema, before the app is created
+    WHEN `flask db upgrade` runs and the catalog is then searched
+    THEN app startup touches none of the newer columns, the upgrade succeeds and the search index is built on demand
+    """
+    path = tmp_path / 'old.db'
+    connection = sqlite3.connect(path)
+    connection.executescript(BASELINE_SCHEMA + """
+        INSERT INTO courses (id, name) VALUES (1, 'Medicine');
+        INSERT INTO modules (id, name, course_id) VALUES (1, 'Cardiology', 1);
+        INSERT INTO topics (id, name, module_id) VALUES (1, 'ECG', 1);
+    """)
+    connection.close()
+    config = type('MigrationConfig', (TestingConfig,), {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}",
+                                                         'SEARCH_BACKEND': 'fts5'})
+    app = create_app(config_class=config)
+
+    result = app.test_cli_runner().invoke(args=['db', 'upgrade'])
+    assert result.exit_code == 0, result.output
+
+    with app.app_context():
+        total, hits = search.search('ecg')
+        assert (total, [hit['name'] for hit in hits]) == (1, ['ECG'])
+        db.session.remove()
+        db.engine.dispose()
+
+def test_migrations_leave_a_current_database_alone(tmp_path):
+    """
+    GIVEN a database created with create_all() from the current models, minus the migrated indexes
+    WHEN the migrations are applied (twice)
+    THEN the indexes are created and nothing else fails
+    """
+    config = type('MigrationConfig', (TestingConfig,), {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'new.db'}"})
+    app = create_app(config_class=config)
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as connection:
+            for name in MIGRATED_INDEXES:
+                connection.execute(text(f'DROP INDEX {name}'))
+
+        upgrade()
+        upgrade()
+
+        inspector = inspect(db.engine)
+        indexes = {index['name'] for table in inspector.get_table_names() for index in inspector.get_indexes(table)}
+        assert indexes >= MIGRATED_INDEXES
+        db.session.remove()
+        db.engine.dispose()
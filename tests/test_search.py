@@ -0,0 +1,127 @@
+import json
+import pytest
+from backend.app import create_app, db, search
+from backend.app.models import Course, Module, Topic
+from backend.config import TestingConfig
+
+
+@pytest.fixture(params=['fts5', 'memory'])
+def search_client(request, test_client):
+    """
+    Runs each search test against both the FTS5 and the pure-Python index.
+    """
+    test_client.application.config['SEARCH_BACKEND'] = request.param
+    return test_client
+
+
+def seed_catalog():
+    course = Course(name='Pharmacology')
+    module = Module(name='Cardiology', course=course)
+    db.session.add_all([
+        course,
+        module,
+        Topic(name='Beta blockers', content='Beta blockers reduce heart rate and blood pressure.', module=module),
+        Topic(name='ACE inhibitors', content='Often combined with beta blockers in heart failure.', module=module),
+        Topic(name='Anticoagulants', content='Warfarin and heparin prevent clotting.', module=module),
+    ])
+    db.session.commit()
+    return module
+
+
+def test_search_ranks_name_matches_first(search_client, auth_headers):
+    """
+    GIVEN topics that mention a term in the name or only in the content
+    WHEN '/search' is queried
+    THEN the name match ranks first and a highlighted snippet is returned
+    """
+    seed_catalog()
+    headers = auth_headers(role='student', username='student')
+
+    response = search_client.get('/search?q=beta', headers=headers)
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['total'] == 2
+    assert data['results'][0]['name'] == 'Beta blockers'
+    assert '<mark>' in data['results'][0]['snippet']
+
+
+def test_search_prefix_and_pagination(search_client, auth_headers):
+    """
+    GIVEN a catalog of topics
+    WHEN '/search' is queried with a word prefix and a page size of one
+    THEN results are paginated and the total covers every match
+    """
+    seed_catalog()
+    headers = auth_headers(role='student', username='student')
+
+    first = json.loads(search_client.get('/search?q=bet&per_page=1', headers=headers).data)
+    second = json.loads(search_client.get('/search?q=bet&per_page=1&page=2', headers=headers).data)
+    assert first['total'] == 2
+    assert len(first['results']) == 1 and len(second['results']) == 1
+    assert first['results'][0]['id'] != second['results'][0]['id']
+
+
+def test_search_index_follows_admin_changes(search_client, auth_headers):
+    """
+    GIVEN an admin creating, renaming and deleting topics
+    WHEN '/search' is queried after each change
+    THEN the results reflect the current catalog
+    """
+    module = seed_catalog()
+    headers = auth_headers()
+
+    response = search_client.post(f'/admin/modules/{module.id}/topics', headers=headers,
+                                  data=json.dumps({'name': 'Statins', 'content': 'Lower cholesterol.'}),
+                                  content_type='application/json')
+    topic_id = json.loads(response.data)['id']
+    assert json.loads(search_client.get('/search?q=cholesterol', headers=headers).data)['total'] == 1
+
+    search_client.put(f'/admin/topics/{topic_id}', headers=headers,
+                      data=json.dumps({'content': 'Reduce LDL.'}), content_type='application/json')
+    assert json.loads(search_client.get('/search?q=cholesterol', headers=headers).data)['total'] == 0
+    assert json.loads(search_client.get('/search?q=ldl', headers=headers).data)['total'] == 1
+
+    search_client.delete(f'/admin/modules/{module.id}', headers=headers)
+    assert json.loads(search_client.get('/search?q=beta', headers=headers).data)['total'] == 0
+
+
+def test_rolled_back_changes_are_not_searchable(search_client, auth_headers):
+    """
+    GIVEN a loaded search index
+    WHEN a topic is indexed in a transaction that is rolled back
+    THEN it never shows up in the results
+    """
+    module = seed_catalog()
+    headers = auth_headers()
+    assert json.loads(search_client.get('/search?q=beta', headers=headers).data)['total'] == 2
+
+    topic = Topic(name='Statins', content='Lower cholesterol.', module=module)
+    db.session.add(topic)
+    db.session.flush()
+    search.index_topic(topic)
+    db.session.rollback()
+    assert json.loads(search_client.get('/search?q=statins', headers=headers).data)['total'] == 0
+
+
+def test_fts5_table_built_by_a_search_is_kept(tmp_path):
+    """
+    GIVEN a file database without the FTS5 table
+    WHEN it is searched several times
+    THEN the table built by the first search is committed and every search finds the topic
+    """
+    config = type('FileSearchConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'search.db'}", 'SEARCH_BACKEND': 'fts5'})
+    app = create_app(config_class=config)
+    with app.app_context():
+        db.create_all()
+        seed_catalog()
+        db.session.remove()
+    with app.test_client() as client:
+        client.post('/auth/register', json={'username': 'reader', 'email': 'reader@example.com', 'password': 'pw'})
+        token = json.loads(client.post('/auth/login', json={'username': 'reader', 'password': 'pw'}).data)
+        headers = {'Authorization': f"Bearer {token['access_token']}"}
+        totals = [json.loads(client.get('/search?q=warfarin', headers=headers).data)['total'] for _ in range(3)]
+    assert totals == [1, 1, 1]
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
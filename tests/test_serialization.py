@@ -0,0 +1,65 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from backend.app import create_app, db
+from backend.app.instrumentation import count_queries
+from backend.app.models import Course, Module, NewsArticle, Topic
+from backend.app.serialization import OrjsonProvider, StdlibJSONProvider
+from backend.config import TestingConfig
+
+
+def make_app(provider):
+    return create_app(config_class=type('JSONConfig', (TestingConfig,), {'JSON_PROVIDER': provider}))
+
+
+@pytest.mark.parametrize('provider', ['stdlib', 'orjson'])
+def test_providers_write_the_same_json(provider):
+    """
+    GIVEN either built-in JSON provider
+    WHEN a payload with datetimes, decimals and integer keys is serialized
+    THEN the output is the same sorted, ISO 8601 JSON
+    """
+    if provider == 'orjson':
+        pytest.importorskip('orjson')
+    app = make_app(provider)
+    payload = {'b': datetime(2024, 5, 1, 8, 30), 'a': Decimal('1.5'), 'c': {2: 'two', 1: 'one'}}
+
+    body = app.json.dumps(payload, separators=(',', ':'))
+    assert body == '{"a":"1.5","b":"2024-05-01T08:30:00","c":{"1":"one","2":"two"}}'
+    assert app.json.loads(body)['c'] == {'1': 'one', '2': 'two'}
+
+
+def test_auto_prefers_orjson_and_accepts_a_class_path():
+    """
+    GIVEN JSON_PROVIDER set to 'auto' or to a 'module:Class' path
+    WHEN the app is created
+    THEN orjson is used when installed, and the named class otherwise
+    """
+    pytest.importorskip('orjson')
+    # The instrumentation wraps the provider in a timing subclass
+    assert isinstance(make_app('auto').json, OrjsonProvider)
+    custom = make_app('backend.app.serialization:StdlibJSONProvider').json
+    assert isinstance(custom, StdlibJSONProvider) and not isinstance(custom, OrjsonProvider)
+
+
+def test_list_endpoints_read_only_their_fields(test_client, auth_headers):
+    """
+    GIVEN a module whose topics have long content, and a news article
+    WHEN the topic list and the news list are requested
+    THEN the topic list never reads the content column and news dates are ISO 8601
+    """
+    headers = auth_headers()
+    module = Module(name='Renal', course=Course(name='Medicine'))
+    db.session.add_all([Topic(name=f'Topic {i}', content='x' * 10000, module=module) for i in range(3)])
+    db.session.add(NewsArticle(title='Exams', content='Soon', created_at=datetime(2024, 5, 1, 8, 30)))
+    db.session.commit()
+
+    with count_queries() as queries:
+        response = test_client.get(f'/modules/{module.id}/topics', headers=headers)
+    assert json.loads(response.data) == [{'id': i, 'name': f'Topic {i - 1}'} for i in (1, 2, 3)]
+    assert not any('topics.content' in statement for statement in queries.statements)
+
+    news = json.loads(test_client.get('/news').data)
+    assert news == [{'id': 1, 'title': 'Exams', 'content': 'Soon', 'created_at': '2024-05-01T08:30:00'}]
+    assert test_client.get('/modules/999/topics', headers=headers).status_code == 404
@@ -0,0 +1,132 @@
+import json
+import os
+import pytest
+from backend.app import db
+from backend.app.models import Blob, Resource
+
+
+def test_upload_is_content_addressed(test_client, auth_headers, topic_id, tmp_path, upload):
+    """
+    GIVEN an admin uploading a PDF
+    WHEN the upload completes
+    THEN the file is stored under its SHA-256 and size, hash and MIME type are recorded
+    """
+    headers = auth_headers()
+    response = upload(test_client, headers, topic_id, b'%PDF-1.4 lecture', 'lecture.pdf')
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    sha = data['sha256']
+
+    resource = db.session.get(Resource, data['id'])
+    assert resource.size == len(b'%PDF-1.4 lecture')
+    assert resource.mime_type == 'application/pdf'
+    assert os.path.exists(tmp_path / 'objects' / sha[:2] / sha[2:4] / sha)
+
+
+def test_duplicate_uploads_share_one_file(test_client, auth_headers, topic_id, tmp_path, upload):
+    """
+    GIVEN the same content uploaded twice under different names
+    WHEN the resources are deleted one at a time
+    THEN the bytes are stored once and removed only with the last reference
+    """
+    headers = auth_headers()
+    first = json.loads(upload(test_client, headers, topic_id, b'same bytes', 'lecture.pdf').data)
+    second = json.loads(upload(test_client, headers, topic_id, b'same bytes', 'copy.pdf').data)
+    sha = first['sha256']
+    path = tmp_path / 'objects' / sha[:2] / sha[2:4] / sha
+    assert second['sha256'] == sha
+    assert db.session.get(Blob, sha).ref_count == 2
+
+    test_client.delete(f"/admin/resources/{first['id']}", headers=headers)
+    assert path.exists()
+    assert db.session.get(Blob, sha).ref_count == 1
+
+    test_client.delete(f"/admin/resources/{second['id']}", headers=headers)
+    assert not path.exists()
+    assert db.session.get(Blob, sha) is None
+
+
+def test_same_name_uploads_do_not_overwrite(test_client, auth_headers, topic_id, upload):
+    """
+    GIVEN two different files with the same name
+    WHEN both are uploaded
+    THEN each resource keeps its own content
+    """
+    headers = auth_headers()
+    first = json.loads(upload(test_client, headers, topic_id, b'version one', 'lecture.pdf').data)
+    second = json.loads(upload(test_client, headers, topic_id, b'version two', 'lecture.pdf').data)
+    assert first['sha256'] != second['sha256']
+    assert db.session.query(Blob).count() == 2
+
+
+def test_resource_content_supports_ranges(test_client, auth_headers, topic_id, upload):
+    """
+    GIVEN an uploaded file
+    WHEN its content is requested whole, by range and conditionally
+    THEN the right bytes and status codes come back
+    """
+    headers = auth_headers()
+    content = bytes(range(256)) * 40
+    data = json.loads(upload(test_client, headers, topic_id, content, 'lecture.mp4').data)
+    url = f"/resources/{data['id']}/content"
+
+    details = json.loads(test_client.get(f'/topics/{topic_id}', headers=headers).data)
+    assert details['resources'][0]['path_or_url'] == url
+
+    full = test_client.get(url, headers=headers)
+    assert full.status_code == 200
+    assert full.data == content
+    assert full.mimetype == 'video/mp4'
+    assert full.headers['ETag'] == f'"{data["sha256"]}"'
+
+    partial = test_client.get(url, headers={**headers, 'Range': 'bytes=100-199'})
+    assert partial.status_code == 206
+    assert partial.data == content[100:200]
+    assert partial.headers['Content-Range'] == f'bytes 100-199/{len(content)}'
+
+    stale = test_client.get(url, headers={**headers, 'Range': 'bytes=100-199', 'If-Range': '"other"'})
+    assert stale.status_code == 200 and stale.data == content
+
+    cached = test_client.get(url, headers={**headers, 'If-None-Match': full.headers['ETag']})
+    assert cached.status_code == 304
+
+
+def test_resource_content_accel_redirect(test_client, auth_headers, topic_id, upload):
+    """
+    GIVEN the X-Accel-Redirect sendfile mode
+    WHEN a resource's content is requested
+    THEN the response delegates the transfer to the proxy
+    """
+    test_client.application.config['RESOURCE_SENDFILE_MODE'] = 'x-accel-redirect'
+    headers = auth_headers()
+    data = json.loads(upload(test_client, headers, topic_id, b'%PDF-1.4', 'notes.pdf').data)
+    sha = data['sha256']
+
+    response = test_client.get(f"/resources/{data['id']}/content", headers=headers)
+    assert response.status_code == 200
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == f'/protected-uploads/objects/{sha[:2]}/{sha[2:4]}/{sha}'
+
+
+def test_failed_upload_leaves_no_file(test_client, auth_headers, topic_id, tmp_path, monkeypatch, upload):
+    """
+    GIVEN an upload whose request fails before its transaction commits
+    WHEN the next upload succeeds
+    THEN only the successful upload's file and blob are left
+    """
+    from backend.app import search
+
+    def fail(resource):
+        raise RuntimeError('index unavailable')
+
+    headers = auth_headers()
+    monkeypatch.setattr(search, 'index_resource', fail)
+    with pytest.raises(RuntimeError):
+        upload(test_client, headers, topic_id, b'orphan bytes', 'lecture.pdf')
+    db.session.remove()  # the request's app context teardown, which the test's own context holds back
+    monkeypatch.undo()
+
+    sha = json.loads(upload(test_client, headers, topic_id, b'kept bytes', 'notes.pdf').data)['sha256']
+    stored = [name for _, _, files in os.walk(tmp_path / 'objects') for name in files]
+    assert stored == [sha]
+    assert [blob.sha256 for blob in Blob.query.all()] == [sha]
@@ -0,0 +1,257 @@
+import json
+import os
+import threading
+import time
+from backend.app import create_app, db, suggest
+from backend.app.suggest import BULK_CHANGES, SuggestIndex
+from backend.app.instrumentation import count_queries
+from backend.app.models import Course, Module, Topic, User, user_topic_progress
+from backend.config import TestingConfig
+
+
+def suggestions(test_client, headers, prefix):
+    response = test_client.get('/search/suggest', headers=headers, query_string={'prefix': prefix})
+    assert response.status_code == 200
+    return [(s['type'], s['name']) for s in json.loads(response.data)['suggestions']]
+
+
+def seed_catalog():
+    course = Course(name='Cardiology')
+    module = Module(name='Acute cardiac care', course=course)
+    popular = Topic(name='Cardiac arrest', module=module)
+    quiet = Topic(name='Cardiomyopathy', module=module)
+    users = [User(username=f'u{i}', email=f'u{i}@example.com', password_hash='x') for i in range(3)]
+    db.session.add_all([course, popular, quiet, *users])
+    db.session.flush()
+    db.session.execute(user_topic_progress.insert(), [{'user_id': u.id, 'topic_id': popular.id} for u in users])
+    db.session.commit()
+    return course, module, popular, quiet
+
+
+def test_suggestions_match_word_prefixes_ranked_by_completions(test_client, auth_headers):
+    """
+    GIVEN a course, module and two topics, one of them completed by three users
+    WHEN names are suggested for a prefix
+    THEN names with any word starting with it are listed, most completed first, without touching the database
+    """
+    headers = auth_headers()
+    seed_catalog()
+
+    # Three completions count for the topic, its module and its course alike; names starting with the prefix win ties
+    assert suggestions(test_client, headers, 'card') == [
+        ('topic', 'Cardiac arrest'), ('course', 'Cardiology'), ('module', 'Acute cardiac care'),
+        ('topic', 'Cardiomyopathy'),
+    ]
+    assert suggestions(test_client, headers, 'CARDIAC c') == [('module', 'Acute cardiac care')]
+    assert suggestions(test_client, headers, '  ') == []
+
+    with count_queries() as queries:
+        assert suggest.suggest('cardio', limit=1) == [
+            {'type': 'course', 'id': 1, 'name': 'Cardiology', 'url': '#/courses/1', 'popularity': 3}]
+    assert queries.statements == []
+
+
+def test_committed_admin_edits_update_the_index(test_client, auth_headers):
+    """
+    GIVEN a loaded suggestion index
+    WHEN an admin renames a topic, adds a module, deletes the course, and a rolled back edit is attempted
+    THEN committed edits show up in the next suggestions and the rolled back one never does
+    """
+    headers = auth_headers()
+    course, module, popular, _ = seed_catalog()
+    assert suggestions(test_client, headers, 'arrest') == [('topic', 'Cardiac arrest')]
+
+    test_client.put(f'/admin/topics/{popular.id}', headers=headers, data=json.dumps({'name': 'Cardiac tamponade'}),
+                    content_type='application/json')
+    test_client.post(f'/admin/courses/{course.id}/modules', headers=headers, data=json.dumps({'name': 'Arrhythmias'}),
+                     content_type='application/json')
+    assert suggestions(test_client, headers, 'arr') == [('module', 'Arrhythmias')]
+    assert suggestions(test_client, headers, 'tampon') == [('topic', 'Cardiac tamponade')]
+
+    db.session.get(Module, module.id).name = 'Never saved'
+    db.session.flush()
+    db.session.rollback()
+    assert suggestions(test_client, headers, 'never') == []
+
+    test_client.delete(f'/admin/courses/{course.id}', headers=headers)
+    assert suggestions(test_client, headers, 'ca') == []
+
+
+def test_large_change_batches_are_applied_in_one_pass():
+    """
+    GIVEN an index of topics and resources
+    WHEN a batch of changes at least BULK_CHANGES long removes, renames and adds records
+    THEN the index equals one built from the resulting records, new resources inheriting their topic's popularity
+    """
+    count = BULK_CHANGES * 2
+    index = SuggestIndex([('topic', i, f'Topic {i}', 1, i) for i in range(count)])
+    changes = {('topic', i): None for i in range(0, count, 2)}
+    changes.update({('topic', i): (f'Renamed {i}', 2) for i in range(1, count, 2)})
+    changes[('resource', 1)] = ('Slides', 3)
+    index.apply(changes)
+
+    expected = SuggestIndex([('topic', i, f'Renamed {i}', 2, i) for i in range(1, count, 2)] +
+                            [('resource', 1, 'Slides', 3, 3)])
+    assert index._keys == expected._keys
+    assert index.suggest('renamed', limit=2) == expected.suggest('renamed', limit=2)
+    assert [s['name'] for s in index.suggest('topic')] == []
+    assert index.suggest('slides') == expected.suggest('slides')
+
+
+def test_new_workers_start_from_the_snapshot(tmp_path):
+    """
+    GIVEN a worker that built the index and wrote its snapshot
+    WHEN a second worker starts, and later the first one commits an edit
+    THEN the second worker serves from the snapshot without reading the catalog and picks up the edit
+    """
+    path = str(tmp_path / 'suggest.json')
+    config = type('SnapshotConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}", 'SUGGEST_SNAPSHOT_PATH': path})
+    first = create_app(config_class=config)
+    with first.app_context():
+        db.create_all()
+        seed_catalog()
+        assert [s['name'] for s in suggest.suggest('cardiom')] == ['Cardiomyopathy']
+    assert os.path.exists(path)
+
+    second = create_app(config_class=config)
+    with second.app_context(), count_queries() as queries:
+        assert [s['name'] for s in suggest.suggest('cardiom')] == ['Cardiomyopathy']
+    assert queries.statements == []
+
+    with first.app_context():
+        db.session.add(Topic(name='Cardiomegaly', module_id=1))
+        db.session.commit()
+    suggest.save_snapshot(first)  # what the save timer does
+    os.utime(path, (os.stat(path).st_atime, os.stat(path).st_mtime + 1))  # coarse filesystem clocks
+    with second.app_context():
+        assert [s['name'] for s in suggest.suggest('cardiom')] == ['Cardiomegaly', 'Cardiomyopathy']
+        db.session.remove()
+        db.engine.dispose()
+    with first.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_workers_commit_on_top_of_each_others_snapshots(tmp_path):
+    """
+    GIVEN two workers sharing a snapshot, both with the index loaded
+    WHEN each commits an edit, the second without having reloaded the snapshot in between
+    THEN the snapshot keeps both edits, and a new worker starting from it suggests both
+    """
+    path = str(tmp_path / 'suggest.json')
+    config = type('SnapshotConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}", 'SUGGEST_SNAPSHOT_PATH': path})
+    first, second = create_app(config_class=config), create_app(config_class=config)
+    with first.app_context():
+        db.create_all()
+        seed_catalog()
+        suggest.suggest('card')
+    with second.app_context():
+        suggest.suggest('card')
+
+    with first.app_context():
+        db.session.add(Topic(name='Cardiomegaly', module_id=1))
+        db.session.commit()
+    suggest.save_snapshot(first)
+    os.utime(path, (os.stat(path).st_atime, os.stat(path).st_mtime + 1))  # coarse filesystem clocks
+    with second.app_context():
+        db.session.add(Topic(name='Carditis', module_id=1))
+        db.session.commit()
+    suggest.save_snapshot(second)
+
+    third = create_app(config_class=config)
+    with third.app_context(), count_queries() as queries:
+        assert {s['name'] for s in suggest.suggest('cardi', limit=20)} >= {'Cardiomegaly', 'Carditis'}
+    assert queries.statements == []
+    for app in (first, second, third):
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+def test_snapshot_is_saved_after_the_commit_and_only_for_name_changes(tmp_path, monkeypatch):
+    """
+    GIVEN a worker with a saved snapshot
+    WHEN a topic's content is edited, and then a topic is renamed
+    THEN the content edit leaves the index and the snapshot alone, and the rename is saved once the delay passes
+    """
+    path = str(tmp_path / 'suggest.json')
+    config = type('SnapshotConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}", 'SUGGEST_SNAPSHOT_PATH': path,
+        'SUGGEST_SAVE_DELAY': 0.05})
+    app = create_app(config_class=config)
+    with app.app_context():
+        db.create_all()
+        _, _, popular, _ = seed_catalog()
+        suggest.suggest('card')
+        saved = os.stat(path).st_mtime_ns
+        applied, apply = [], SuggestIndex.apply
+        monkeypatch.setattr(SuggestIndex, 'apply',
+                            lambda self, changes: applied.append(dict(changes)) or apply(self, changes))
+
+        db.session.get(Topic, popular.id).content = 'Thick walls.'
+        db.session.commit()
+        assert applied == []
+        assert 'suggest_save_timer' not in app.extensions
+
+        db.session.get(Topic, popular.id).name = 'Cardiac tamponade'
+        db.session.commit()
+        assert applied == [{('topic', popular.id): ('Cardiac tamponade', popular.module_id)}]
+        assert os.stat(path).st_mtime_ns == saved
+        deadline = time.monotonic() + 5
+        while 'suggest_unsaved' in app.extensions and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with open(path) as f:
+            assert 'Cardiac tamponade' in f.read()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_old_index_is_served_while_rebuilt_in_the_background(tmp_path, monkeypatch):
+    """
+    GIVEN a worker whose index is older than SUGGEST_MAX_AGE, with completions recorded since it was built
+    WHEN suggestions are requested, and a topic is renamed while the rebuild is running
+    THEN the old index answers without a query, and the rebuilt one has the new counts and keeps the rename
+    """
+    config = type('RebuildConfig', (TestingConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}", 'SUGGEST_SNAPSHOT_PATH': str(tmp_path / 's.json')})
+    app = create_app(config_class=config)
+    started, read, built, release = (threading.Event() for _ in range(4))
+    build = SuggestIndex.build.__func__
+
+    def slow_build(cls):
+        started.set()
+        read.wait(5)
+        index = build(cls)
+        built.set()
+        release.wait(5)
+        return index
+
+    with app.app_context():
+        db.create_all()
+        _, _, popular, quiet = seed_catalog()
+        old = suggest.get_suggest_index()
+        db.session.execute(user_topic_progress.insert(), [{'user_id': u.id, 'topic_id': quiet.id}
+                                                          for u in User.query.all()])
+        db.session.commit()
+        old.built_at -= app.config['SUGGEST_MAX_AGE'] + 1
+        monkeypatch.setattr(SuggestIndex, 'build', classmethod(slow_build))
+
+        with count_queries() as queries:
+            assert [(s['name'], s['popularity']) for s in suggest.suggest('cardiom')] == [('Cardiomyopathy', 0)]
+            assert started.wait(5)
+        assert queries.statements == []
+        read.set()
+        assert built.wait(5)
+        db.session.get(Topic, popular.id).name = 'Cardiac tamponade'
+        db.session.commit()
+        release.set()
+
+        deadline = time.monotonic() + 5
+        while app.extensions['suggest_index'] is old and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [(s['name'], s['popularity']) for s in suggest.suggest('cardiom')] == [('Cardiomyopathy', 3)]
+        assert [s['name'] for s in suggest.suggest('tamponade')] == ['Cardiac tamponade']
+        db.session.remove()
+        db.engine.dispose()
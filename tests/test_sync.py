@@ -0,0 +1,98 @@
+import json
+from datetime import datetime
+from sqlalchemy import select, update
+from backend.app import db
+from backend.app.instrumentation import count_queries
+from backend.app.models import Event, NewsArticle, SyncChange, SyncSequence
+from backend.app.sync import encode_cursor
+
+
+def post(test_client, url, headers, body):
+    return json.loads(test_client.post(url, headers=headers, data=json.dumps(body),
+                                       content_type='application/json').data)['id']
+
+
+def pull(test_client, headers, cursor=None, limit=None):
+    params = {k: v for k, v in (('since', cursor), ('limit', limit)) if v is not None}
+    response = test_client.get('/sync', headers=headers, query_string=params)
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+
+def summary(page):
+    return [(c['type'], c['id'], c['deleted']) for c in page['changes']]
+
+
+def test_sync_returns_only_what_changed_since_the_cursor(test_client, auth_headers):
+    """
+    GIVEN a course, module and topic created by an admin and a news article
+    WHEN a client syncs from scratch, then after an edit, then after a delete
+    THEN each pull returns only the newer changes, with tombstones for deleted records
+    """
+    headers = auth_headers()
+    course_id = post(test_client, '/admin/courses', headers, {'name': 'Medicine'})
+    module_id = post(test_client, f'/admin/courses/{course_id}/modules', headers, {'name': 'Renal'})
+    topic_id = post(test_client, f'/admin/modules/{module_id}/topics', headers, {'name': 'Nephron', 'content': 'v1'})
+    db.session.add(NewsArticle(title='Exams', content='Soon'))
+    db.session.commit()
+
+    first = pull(test_client, headers)
+    assert summary(first) == [('course', course_id, False), ('module', module_id, False),
+                              ('topic', topic_id, False), ('news', 1, False)]
+    assert first['changes'][2]['data']['content'] == 'v1'
+    assert first['has_more'] is False
+    assert summary(pull(test_client, headers, first['cursor'])) == []
+
+    test_client.put(f'/admin/topics/{topic_id}', headers=headers, data=json.dumps({'content': 'v2'}),
+                    content_type='application/json')
+    edited = pull(test_client, headers, first['cursor'])
+    assert summary(edited) == [('topic', topic_id, False)]
+    assert edited['changes'][0]['data']['content'] == 'v2'
+    assert edited['changes'][0]['data']['updated_at'] is not None
+
+    test_client.delete(f'/admin/modules/{module_id}', headers=headers)
+    deleted = pull(test_client, headers, edited['cursor'])
+    assert sorted(summary(deleted)) == [('module', module_id, True), ('topic', topic_id, True)]
+    assert 'data' not in deleted['changes'][0]
+
+
+def test_sync_pages_and_costs_one_query_when_up_to_date(test_client, auth_headers):
+    """
+    GIVEN five events
+    WHEN a client pulls two at a time and then polls with the final cursor
+    THEN it gets three pages in order, and the up-to-date poll reads only the change log once
+    """
+    headers = auth_headers()
+    db.session.add_all([Event(title=f'Event {i}', description='', event_date=datetime(2025, 1, i + 1))
+                        for i in range(5)])
+    db.session.commit()
+
+    cursor, seen, pages = None, [], 0
+    while True:
+        page = pull(test_client, headers, cursor, limit=2)
+        seen += [c['id'] for c in page['changes']]
+        cursor, pages = page['cursor'], pages + 1
+        if not page['has_more']:
+            break
+    assert (seen, pages) == ([1, 2, 3, 4, 5], 3)
+
+    with count_queries() as queries:
+        assert pull(test_client, headers, cursor)['changes'] == []
+    assert [s for s in queries.statements if 'sync_changes' in s] == queries.statements[-1:]
+    assert test_client.get('/sync?since=not-a-cursor', headers=headers).status_code == 400
+
+
+def test_seqs_come_from_the_sequence_row(test_client, auth_headers):
+    """
+    GIVEN a sequence row that has already handed out seqs up to 100
+    WHEN two news articles are added in one transaction
+    THEN they get seqs 101 and 102, and a client holding cursor 100 receives both
+    """
+    headers = auth_headers()
+    db.session.execute(update(SyncSequence).values(last_seq=100))
+    db.session.add_all([NewsArticle(title='Exams', content='Soon'), NewsArticle(title='Results', content='Later')])
+    db.session.commit()
+
+    assert db.session.execute(select(SyncChange.seq).order_by(SyncChange.seq)).scalars().all() == [101, 102]
+    assert db.session.get(SyncSequence, 1).last_seq == 102
+    assert summary(pull(test_client, headers, encode_cursor(100))) == [('news', 1, False), ('news', 2, False)]